@@ -0,0 +1,88 @@
+# modules/core/loop_monitor.py
+"""
+Event loop 延遲監測
+- 每 interval 秒排一次 sleep，實際醒來時間與預期的差就是 loop 被卡住的時間
+- 記錄最近一次 / 指數平均 / 視窗內最大值，超過門檻寫 warning log
+- 數值透過 /api/dashboard/metrics 提供
+"""
+from __future__ import annotations
+
+import time
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class LoopMonitorConfig:
+    interval_sec: float = 0.25
+    warn_ms: float = 100.0        # 超過就寫 warning
+    window: int = 240             # 保留最近幾筆（0.25s × 240 = 1 分鐘）
+
+
+class LoopLagMonitor:
+    """
+    用法（在 lifespan 內）：
+        loop_monitor.start()
+        ...
+        await loop_monitor.stop()
+    """
+
+    def __init__(self, cfg: LoopMonitorConfig = LoopMonitorConfig()):
+        self.cfg = cfg
+        self._task: Optional[asyncio.Task] = None
+        self._samples: Deque[float] = deque(maxlen=cfg.window)
+        self.last_ms = 0.0
+        self.ewma_ms = 0.0
+        self.max_ms = 0.0             # 啟動以來最大值
+        self.over_threshold = 0       # 超過 warn_ms 的次數
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="LoopLagMonitor")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        interval = self.cfg.interval_sec
+        while True:
+            expected = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            lag_ms = max(0.0, (time.perf_counter() - expected) * 1000)
+            self._record(lag_ms)
+
+    def _record(self, lag_ms: float) -> None:
+        self._samples.append(lag_ms)
+        self.last_ms = lag_ms
+        self.ewma_ms = lag_ms if not self.ewma_ms else self.ewma_ms * 0.9 + lag_ms * 0.1
+        self.max_ms = max(self.max_ms, lag_ms)
+        if lag_ms > self.cfg.warn_ms:
+            self.over_threshold += 1
+            logger.warning("Event loop blocked for %.0f ms", lag_ms)
+
+    def stats(self) -> Dict[str, Any]:
+        samples = sorted(self._samples)
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))] if samples else 0.0
+        return {
+            "last_ms": round(self.last_ms, 2),
+            "ewma_ms": round(self.ewma_ms, 2),
+            "p99_ms": round(p99, 2),
+            "window_max_ms": round(samples[-1], 2) if samples else 0.0,
+            "max_ms": round(self.max_ms, 2),
+            "over_threshold": self.over_threshold,
+        }
+
+
+# 全域單例
+loop_monitor = LoopLagMonitor()
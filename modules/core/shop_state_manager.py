@@ -56,6 +56,7 @@ class ShopStateManager:
         self._state = ShopState()
         self._lock = threading.Lock()
         self._db = None  # lazy import 避免循環引用
+        self._writer = None
 
     def _get_db(self):
         """延遲載入 visitor_db 避免循環引用"""
@@ -64,18 +65,36 @@ class ShopStateManager:
             self._db = visitor_db
         return self._db
 
+    def _get_writer(self):
+        """延遲建立 write-behind 寫入器（第一次進店時才啟動背景執行緒）"""
+        if self._writer is None:
+            from modules.storage.recording_index import recording_index
+            from modules.storage.visitor_writer import VisitorWriter, VisitorWriterConfig
+            with self._lock:
+                if self._writer is None:
+                    writer = VisitorWriter(VisitorWriterConfig(), db=self._get_db(), index=recording_index)
+                    writer.start()
+                    self._writer = writer
+        return self._writer
+
     # === 更新用 API（給 YoloRuntime 呼叫）===
 
-    def record_entry(self) -> None:
-        """記錄一次進店（客流量 +1），寫入記憶體 + SQLite"""
+    def record_entry(self, camera_id: Optional[str] = None) -> None:
+        """
+        記錄一次進店（客流量 +1），更新記憶體並排入 SQLite 寫入佇列
+        有 camera_id 時一併記下當下的錄影分段與秒數（回放可直接跳到事件）
+        """
         with self._lock:
             self._state.record_entry()
 
-        # 寫入 SQLite（在 lock 外執行，避免阻塞）
-        try:
-            self._get_db().record_entry()
-        except Exception as e:
-            logger.exception("Failed to record entry to DB")
+        # write-behind：YOLO 執行緒不碰磁碟，由背景執行緒批次寫入
+        self._get_writer().submit(datetime.now(), camera_id)
+
+    def close(self) -> None:
+        """關閉時呼叫：把尚未寫入的進店事件寫完"""
+        if self._writer is not None:
+            self._writer.stop()
+            self._writer = None
 
     def set_inside_count(self, count: int) -> None:
         """直接設定店內人數（基於即時偵測數量）"""
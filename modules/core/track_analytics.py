@@ -0,0 +1,229 @@
+# modules/core/track_analytics.py
+"""
+軌跡分析（每條 track 結束時計算一次，不重播影片）
+- dwell：在店內 ROI 停留的秒數
+- time_to_enter：第一次出現在門口 → 第一次進到店內的秒數
+- door_pass：只在門口出現、沒有進店的 track（數值為在門口停留的秒數）
+
+聚合方式：
+- 每個指標每小時一個對數 bin 直方圖（相對誤差約 5%，bin 數有上限，記憶體固定）
+- 背景執行緒每 flush_interval_sec 把增量寫進 visitors.db 的 track_stats（hour / day 兩種粒度）
+- 查詢時只讀彙總 bin，不碰逐幀資料
+"""
+from __future__ import annotations
+
+import math
+import logging
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from modules.storage.visitor_db import VisitorDB, TrackStatRow
+
+logger = logging.getLogger(__name__)
+
+METRICS = ("dwell", "time_to_enter", "door_pass")
+
+# 對數 bin：bin 0 = 小於 MIN_VALUE；其後每個 bin 上界為前一個的 GAMMA 倍
+GAMMA = 1.1
+MIN_VALUE = 0.5  # 秒
+
+
+def bin_index(value: float) -> int:
+    if value < MIN_VALUE:
+        return 0
+    return 1 + max(0, math.ceil(math.log(value / MIN_VALUE, GAMMA) - 1e-9))
+
+
+def bin_value(index: int) -> float:
+    """bin 的代表值（上下界的調和中點，相對誤差 ≤ (GAMMA-1)/(GAMMA+1)）"""
+    if index <= 0:
+        return 0.0
+    upper = MIN_VALUE * GAMMA ** (index - 1)
+    return upper * 2 / (1 + GAMMA)
+
+
+def summarize_bins(bins: Dict[int, Tuple[int, float]]) -> Dict[str, Any]:
+    """{bin: (count, total)} → 筆數、平均與百分位數"""
+    count = sum(c for c, _ in bins.values())
+    if not count:
+        return {"count": 0, "mean": None, "p50": None, "p90": None, "p99": None}
+
+    total = sum(t for _, t in bins.values())
+    ordered = sorted(bins.items())
+    result: Dict[str, Any] = {"count": count, "mean": round(total / count, 1)}
+    for name, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+        rank = q * (count - 1)
+        seen = 0
+        for index, (c, _) in ordered:
+            seen += c
+            if seen > rank:
+                result[name] = round(bin_value(index), 1)
+                break
+    return result
+
+
+@dataclass
+class _Track:
+    first_ts: float
+    last_ts: float
+    last_zone: str
+    door_ts: Optional[float] = None      # 第一次在門口
+    inside_ts: Optional[float] = None    # 第一次在店內
+    zone_sec: Dict[str, float] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class TrackAnalyticsConfig:
+    camera_id: str = "cam1"
+    track_timeout_sec: float = 5.0       # 多久沒看到視為 track 結束
+    max_gap_sec: float = 2.0             # 兩次看到的間隔超過這個只算到 max_gap（偵測漏幀）
+    flush_interval_sec: float = 60.0
+    name: str = "TrackAnalytics"
+
+
+class TrackAnalytics:
+    """
+    用法（偵測執行緒）：
+        analytics.observe(ts, track_id, zone)   # 每個偵測到的物件
+        analytics.tick(ts)                      # 每幀一次，結束逾時的 track
+    """
+
+    def __init__(self, cfg: TrackAnalyticsConfig, db: "VisitorDB"):
+        self.cfg = cfg
+        self.db = db
+        self._tracks: Dict[int, _Track] = {}
+        self._last_sweep = 0.0
+        self._lock = threading.Lock()
+        # (hour 標籤, 指標, bin) → [count, total]
+        self._pending: Dict[Tuple[str, str, int], List[float]] = {}
+        self._stop = threading.Event()
+        self._t: Optional[threading.Thread] = None
+        self.tracks_ended = 0
+
+    def start(self) -> None:
+        if self._t and self._t.is_alive():
+            return
+        self._stop.clear()
+        self._t = threading.Thread(target=self._loop, name=self.cfg.name, daemon=True)
+        self._t.start()
+
+    def stop(self) -> None:
+        """結束所有進行中的 track 並寫入"""
+        self._stop.set()
+        if self._t:
+            self._t.join(timeout=10.0)
+        for track_id in list(self._tracks):
+            self._end(self._tracks.pop(track_id))
+        self._flush()
+
+    # === 偵測執行緒 ===
+
+    def observe(self, ts: float, track_id: int, zone: str) -> None:
+        track = self._tracks.get(track_id)
+        if track is None:
+            track = self._tracks[track_id] = _Track(first_ts=ts, last_ts=ts, last_zone=zone)
+        else:
+            gap = min(ts - track.last_ts, self.cfg.max_gap_sec)
+            if gap > 0:
+                track.zone_sec[track.last_zone] = track.zone_sec.get(track.last_zone, 0.0) + gap
+            track.last_ts = ts
+            track.last_zone = zone
+
+        if zone == "door" and track.door_ts is None:
+            track.door_ts = ts
+        elif zone == "inside" and track.inside_ts is None:
+            track.inside_ts = ts
+
+    def tick(self, ts: float) -> None:
+        """每秒最多掃一次逾時的 track"""
+        if ts - self._last_sweep < 1.0:
+            return
+        self._last_sweep = ts
+        cutoff = ts - self.cfg.track_timeout_sec
+        for track_id in [tid for tid, t in self._tracks.items() if t.last_ts < cutoff]:
+            self._end(self._tracks.pop(track_id))
+
+    def _end(self, track: _Track) -> None:
+        values: List[Tuple[str, float]] = []
+        if track.inside_ts is not None:
+            values.append(("dwell", track.zone_sec.get("inside", 0.0)))
+            if track.door_ts is not None and track.door_ts < track.inside_ts:
+                values.append(("time_to_enter", track.inside_ts - track.door_ts))
+        elif track.door_ts is not None:
+            values.append(("door_pass", track.zone_sec.get("door", 0.0)))
+        if not values:
+            return
+
+        hour = datetime.fromtimestamp(track.last_ts).strftime("%Y-%m-%d %H")
+        with self._lock:
+            for metric, value in values:
+                slot = self._pending.setdefault((hour, metric, bin_index(value)), [0, 0.0])
+                slot[0] += 1
+                slot[1] += value
+        self.tracks_ended += 1
+
+    # === 背景寫入 ===
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.cfg.flush_interval_sec):
+            self._flush()
+
+    def _flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        rows: List["TrackStatRow"] = []
+        per_day: Counter = Counter()
+        per_day_total: Dict[Tuple[str, str, int], float] = {}
+        for (hour, metric, index), (count, total) in pending.items():
+            rows.append(("hour", hour, self.cfg.camera_id, metric, index, int(count), total))
+            day_key = (hour[:10], metric, index)
+            per_day[day_key] += int(count)
+            per_day_total[day_key] = per_day_total.get(day_key, 0.0) + total
+        rows += [
+            ("day", day, self.cfg.camera_id, metric, index, count, per_day_total[(day, metric, index)])
+            for (day, metric, index), count in per_day.items()
+        ]
+
+        try:
+            self.db.record_track_stats(rows)
+        except Exception:
+            logger.exception("%s flush failed (%d bins)", self.cfg.name, len(rows))
+
+
+# === 查詢（只讀 track_stats 彙總，給 dashboard 用）===
+
+def summarize_range(
+    db: "VisitorDB",
+    start_date: date,
+    end_date: date,
+    camera_id: Optional[str] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """區間內各指標的筆數 / 平均 / 百分位數（讀 day 粒度）"""
+    return {
+        metric: summarize_bins(
+            db.get_track_bins(metric, "day", start_date.isoformat(), end_date.isoformat(), camera_id)
+        )
+        for metric in METRICS
+    }
+
+
+def summarize_hourly(
+    db: "VisitorDB",
+    target_date: date,
+    camera_id: Optional[str] = None,
+) -> Dict[str, Dict[int, Dict[str, Any]]]:
+    """指定日期各小時、各指標的摘要（沒有資料的小時不列出）"""
+    return {
+        metric: {
+            hour: summarize_bins(bins)
+            for hour, bins in sorted(db.get_track_hourly(metric, target_date, camera_id).items())
+        }
+        for metric in METRICS
+    }
@@ -11,7 +11,16 @@ from typing import Dict, List, Tuple, Optional
 from ultralytics import YOLO
 from modules.notifications.audio_alert import init_audio, play_alert_async
 from modules.storage.cloudflare_r2 import R2Config, CloudflareR2
+from modules.storage.r2_uploader import R2UploaderConfig, R2Uploader, UploadSpooled
+from modules.storage.upload_spool import UploadSpoolConfig, UploadSpool, MB
+from modules.storage.r2_inventory import get_r2_inventory
+from modules.storage.detection_store import DetectionStoreConfig, DetectionStore
+from modules.storage.occupancy_store import OccupancyStoreConfig, OccupancyStore
+from modules.storage.heatmap_store import HeatmapConfig, HeatmapAccumulator
+from modules.storage.visitor_db import visitor_db
+from modules.core.track_analytics import TrackAnalyticsConfig, TrackAnalytics
 from modules.video.video_recorder import RecorderConfig, VideoRecorder
+from modules.video.event_recorder import EventRecorderConfig, EventVideoRecorder
 from modules.video.recording_worker import RecordingConfig, RecordingWorker
 from modules.notifications.line_notify import LineConfig, push_message
 from modules.core.event_worker import WorkerConfig, EventWorker
@@ -34,7 +43,10 @@ from utils import (
     TRACK_HISTORY_MAX_LEN,
     RECORDER_FPS,
     RECORDER_SEGMENT_MINUTES,
+    RECORDER_PRE_ROLL_SECONDS,
+    RECORDER_POST_ROLL_SECONDS,
     EVENT_WORKER_MAX_QUEUE,
+    NOTIFY_UPLOAD_TIMEOUT_SEC,
 )
 import logging
 
@@ -97,9 +109,15 @@ class YoloRuntime:
     # 下面這些屬性會在 _init_components() 裡被設定
     rec: Optional[VideoRecorder] = None
     recording_worker: Optional[RecordingWorker] = None
+    detections: Optional[DetectionStore] = None
+    occupancy: Optional[OccupancyStore] = None
+    heatmap: Optional[HeatmapAccumulator] = None
+    analytics: Optional[TrackAnalytics] = None
     reader: Optional[RTSPReader] = field(init=False, default=None)
     worker: Optional[EventWorker] = None
     r2: Optional[CloudflareR2] = None
+    uploader: Optional[R2Uploader] = None
+    spool: Optional[UploadSpool] = None
     line_cfg: Optional[LineConfig] = None
     model: Optional[YOLO] = None
 
@@ -149,6 +167,12 @@ class YoloRuntime:
             # getattr(self.reader, "stop", None),  # 關掉 不然 WebRTC就壞了
             getattr(self.recording_worker, "stop", None),
             getattr(self.rec, "stop", None),
+            getattr(self.detections, "stop", None),
+            getattr(self.occupancy, "stop", None),
+            getattr(self.heatmap, "stop", None),
+            getattr(self.analytics, "stop", None),
+            getattr(self.uploader, "stop", None),
+            getattr(self.spool, "stop", None),
             cv2.destroyAllWindows if self.show_window else None,
         ]:
             if callable(fn):
@@ -187,24 +211,75 @@ class YoloRuntime:
             endpoint=cfg.r2_endpoint,
             public_url=cfg.r2_public_url,
         ))
+        if cfg.r2_inventory_enabled:
+            self.r2.attach_inventory(get_r2_inventory())
+        self.spool = UploadSpool(UploadSpoolConfig(
+            max_bytes=cfg.r2_spool_max_mb * MB,
+            max_age_days=cfg.r2_spool_max_age_days,
+        ), self.r2)
+        self.spool.start()
+        self.uploader = R2Uploader(R2UploaderConfig(), self.r2, spool=self.spool)
+        self.uploader.start()
 
         # --- 音效 ---
         if cfg.audio_alert_path:
             init_audio(str(cfg.audio_alert_path))
 
         # --- 錄影模組 ---
-        self.rec = VideoRecorder(RecorderConfig(
-            camera_id="cam1",  # 輸出到 recordings/cam1/{date}/
-            save_raw=True,
-            save_annot=False,
-            fps=RECORDER_FPS,
-            segment_minutes=RECORDER_SEGMENT_MINUTES,
-        ))
+        if cfg.recording_mode == "event":
+            # 事件觸發：平時只保留 pre-roll，進店 / 非營業時段偵測才寫檔
+            self.rec = EventVideoRecorder(EventRecorderConfig(
+                camera_id="cam1",
+                save_raw=True,
+                save_annot=False,
+                fps=RECORDER_FPS,
+                segment_minutes=RECORDER_SEGMENT_MINUTES,
+                pre_roll_seconds=RECORDER_PRE_ROLL_SECONDS,
+                post_roll_seconds=RECORDER_POST_ROLL_SECONDS,
+                link_visitor_entries=True,
+            ))
+        else:
+            self.rec = VideoRecorder(RecorderConfig(
+                camera_id="cam1",  # 輸出到 recordings/cam1/{date}/
+                save_raw=True,
+                save_annot=False,
+                fps=RECORDER_FPS,
+                segment_minutes=RECORDER_SEGMENT_MINUTES,
+                link_visitor_entries=True,
+            ))
         self.rec.start()
+        logger.info("Recording mode: %s", cfg.recording_mode)
 
         self.recording_worker = RecordingWorker(self.rec, RecordingConfig(fps=RECORDER_FPS))
         self.recording_worker.start()
 
+        # --- 偵測結果 sidecar ---
+        if cfg.detection_metadata_enabled:
+            self.detections = DetectionStore(DetectionStoreConfig(
+                camera_id="cam1",
+                bucket_minutes=RECORDER_SEGMENT_MINUTES,
+                keep_days=cfg.detection_metadata_keep_days,
+            ))
+            self.detections.start()
+
+        # --- 人數時間序列 ---
+        if cfg.occupancy_enabled:
+            self.occupancy = OccupancyStore(OccupancyStoreConfig(
+                camera_id="cam1",
+                raw_keep_days=cfg.occupancy_raw_keep_days,
+            ))
+            self.occupancy.start()
+
+        # --- 位置熱度圖 ---
+        if cfg.heatmap_enabled:
+            self.heatmap = HeatmapAccumulator(HeatmapConfig(camera_id="cam1"))
+            self.heatmap.start()
+
+        # --- 軌跡分析（停留時間 / 進店耗時 / 路過未進店）---
+        if cfg.track_analytics_enabled:
+            self.analytics = TrackAnalytics(TrackAnalyticsConfig(camera_id="cam1"), db=visitor_db)
+            self.analytics.start()
+
         # --- RTSP 讀取 ---
         self.reader = get_reader()
 
@@ -298,6 +373,8 @@ class YoloRuntime:
                 door_count_this_frame = 0
                 # 收集 door→inside 轉換的位置（用於客流量計數）
                 door_to_inside_positions: list[tuple[int, int]] = []
+                # 這一幀的偵測結果（寫入 sidecar）
+                frame_detections: list[tuple[int, int, int, int, int, str]] = []
 
                 # 處理每個物件
                 for obj_id, (cx, cy, w, h) in zip(ids, boxes):
@@ -343,6 +420,9 @@ class YoloRuntime:
                             )
 
                     last_zone[obj_id] = zone_now
+                    frame_detections.append((obj_id, cx, cy, int(w), int(h), zone_now))
+                    if self.analytics:
+                        self.analytics.observe(current_time, obj_id, zone_now)
 
                     # 軌跡
                     if obj_id not in track_history:
@@ -370,9 +450,16 @@ class YoloRuntime:
                         thickness=2,
                     )
 
+                if self.detections:
+                    self.detections.add_frame(current_time, frame_detections)
+                if self.heatmap:
+                    self.heatmap.add(current_time, [(d[1], d[2]) for d in frame_detections], width, height)
+
                 # === 更新狀態 ===
                 # 1. 即時人數：直接用偵測數量（不依賴 ID 穩定性）
                 self.shop_state_manager.set_inside_count(inside_count_this_frame)
+                if self.occupancy:
+                    self.occupancy.record(current_time, inside_count_this_frame, door_count_this_frame)
 
                 # 連續幀驗證：避免偵測閃爍
                 if inside_count_this_frame > 0:
@@ -387,15 +474,22 @@ class YoloRuntime:
                 # 2. 客流量：door→inside + 位置去重（避免 ID 跳動重複計數）
                 for x, y in door_to_inside_positions:
                     if self.entry_counter.try_count(x, y):
-                        self.shop_state_manager.record_entry()
+                        self.shop_state_manager.record_entry(camera_id="cam1")
+                        if self.rec:
+                            self.rec.trigger(current_time)
                         logger.debug("Entry counted at (%d, %d)", x, y)
 
                 # 3. 非營業時段逗留通知
                 total_detected = inside_count_this_frame + door_count_this_frame
                 shop_cfg = get_shop_config()
+                after_hours_detected = total_detected > 0 and shop_cfg.is_after_hours()
+
+                # 事件錄影：非營業時段有人就持續延長錄製
+                if after_hours_detected and self.rec:
+                    self.rec.trigger(current_time)
+
                 if (
-                    shop_cfg.is_after_hours()
-                    and total_detected > 0
+                    after_hours_detected
                     and current_time - last_after_hours_notify_ts > shop_cfg.after_hours_cooldown
                 ):
                     last_after_hours_notify_ts = current_time
@@ -412,12 +506,18 @@ class YoloRuntime:
             else:
                 # 這一幀完全沒偵測到人
                 self.shop_state_manager.set_inside_count(0)
+                if self.occupancy:
+                    self.occupancy.record(current_time, 0, 0)
 
                 # 連續幀驗證：避免偵測閃爍
                 empty_frame_count += 1
                 if empty_frame_count >= EMPTY_THRESHOLD:
                     prev_inside_count = 0
 
+            # 結束逾時的 track（停留時間等分析）
+            if self.analytics:
+                self.analytics.tick(current_time)
+
             # FPS 顯示
             cv2.putText(
                 img=annotated_frame,
@@ -495,7 +595,7 @@ class YoloRuntime:
             logger.debug("Mouse click coordinate: (%d, %d)", x, y)
 
     def _submit_notify_job(self, frame, msg: str = "有人進店囉"):
-        if not (self.worker and self.line_cfg and self.r2):
+        if not (self.worker and self.line_cfg and self.uploader):
             return
 
         cfg = self.settings
@@ -503,7 +603,7 @@ class YoloRuntime:
 
         snap = frame.copy()
         line_cfg = self.line_cfg
-        r2 = self.r2
+        uploader = self.uploader
 
         def notify_job():
             # 1) 語音提醒
@@ -517,24 +617,37 @@ class YoloRuntime:
                 logger.error("OpenCV cv2.imencode failed")
                 return
 
-            # 3) Cloudflare R2 上傳
+            # 3) Cloudflare R2 上傳（共用連線的上傳佇列，暫時性錯誤會重試）
+            #    網路不通時截圖進暫存區稍後補傳，通知照送、附上補傳後的網址
             key = make_datetime_key(ext=".jpg", prefix="cctv")
+            url = None
+            pending_url = None
             try:
-                url = r2.upload_bytes(
+                url = uploader.upload_bytes(
                     buf.tobytes(),
                     key=key,
                     content_type="image/jpeg",
+                    timeout=NOTIFY_UPLOAD_TIMEOUT_SEC,
                 )
+            except UploadSpooled as e:
+                logger.warning("Snapshot upload spooled for retry: %s", key)
+                pending_url = e.url
+            except TimeoutError:
+                # 仍在佇列中上傳（失敗會自動進暫存區），網址已確定
+                logger.warning("Snapshot upload slow, sending notification without image: %s", key)
+                pending_url = uploader.r2.public_url(key)
             except Exception as e:
                 logger.exception("Cloudflare upload bytes failed")
-                url = None
 
             # 4) LINE push
             now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            text = f"{now_str}\n{msg}"
+            if pending_url:
+                text += f"\n截圖稍後補傳：{pending_url}"
             try:
                 push_message(
                     cfg=line_cfg,
-                    msg=f"{now_str}\n{msg}",
+                    msg=text,
                     img_url=url,
                 )
             except Exception as e:
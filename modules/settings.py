@@ -38,6 +38,12 @@ class Settings(BaseSettings):
     r2_bucket: str
     r2_endpoint: str
     r2_public_url: str
+    # 上傳失敗時的本機暫存區（網路恢復後自動補傳）
+    r2_spool_max_mb: int = 500
+    r2_spool_max_age_days: float = 7
+    # 本機 R2 物件清單（上傳 / 刪除即時更新，定期以分頁列表對帳）
+    r2_inventory_enabled: bool = True
+    r2_inventory_reconcile_hours: float = 24
 
     # =========================
     # Cloudflare KV
@@ -83,6 +89,49 @@ class Settings(BaseSettings):
     screenshot_dir: Optional[Path] = None
     photos_dir: Optional[Path] = None
 
+    # =========================
+    # Recording
+    # =========================
+    # "continuous": 24 小時連續錄影；"event": 只在進店 / 非營業時段偵測時錄影（含 pre-roll）
+    recording_mode: str = "continuous"
+
+    # 錄影保留策略（server 內背景執行）
+    # 預設關閉：開啟後 server 會自動刪除超過天數 / 超過容量的錄影
+    # （以前只有手動執行 scripts/cleanup_recordings.py 才會刪）
+    retention_enabled: bool = False
+    retention_keep_days: int = 10               # 無活動分段保留天數
+    retention_activity_keep_days: int = 30      # 有活動分段保留天數
+    retention_max_gb_per_camera: float = 0      # 每台攝影機容量上限（0 = 不限制）
+    retention_min_free_gb: float = 5            # 磁碟至少保留的剩餘空間
+
+    # 回放多碼率：較低畫質只在有人觀看時才轉檔
+    hls_ladder_enabled: bool = True
+
+    # 每幀偵測結果寫成 Parquet sidecar（可搜尋錄影）
+    detection_metadata_enabled: bool = True
+    detection_metadata_keep_days: int = 90
+
+    # 店內 / 門口人數時間序列（1 秒資料 + 1m/15m/1h 金字塔）
+    occupancy_enabled: bool = True
+    occupancy_raw_keep_days: int = 30
+
+    # 人員位置熱度圖（每小時一個低解析度格子）
+    heatmap_enabled: bool = True
+
+    # 軌跡分析：停留時間 / 進店耗時 / 路過未進店（track 結束時計算）
+    track_analytics_enabled: bool = True
+
+    # 訪客原始事件冷熱分層：超過天數的完整月份搬到 Parquet（彙總表留在 SQLite）
+    visitor_archive_enabled: bool = True
+    visitor_archive_keep_days: int = 365
+
+    # 錄影分段異地備份到 R2（multipart、可續傳、限速）
+    recording_sync_enabled: bool = False
+    recording_sync_mode: str = "activity"       # "activity": 只備份有活動的分段；"all": 全部
+    recording_sync_max_mbps: float = 2.0        # 上傳頻寬上限（Mbit/s，0 = 不限）
+    recording_sync_concurrency: int = 3         # 同時上傳的 part 數
+    recording_sync_part_mb: int = 8
+
     # =========================
     # Notifications / Sound
     # =========================
@@ -0,0 +1,135 @@
+# modules/storage/async_access.py
+"""
+給 async 路由用的資料存取層
+- SQLite 讀取 / 寫入、檔案系統操作分別跑在各自有上限的 thread pool，不佔用 event loop
+- 讀取 pool 的每個 worker 有自己的 thread-local 連線（等同專用的讀取連線池）
+- 每次呼叫有逾時：async 端停止等待，SQLite 端由 progress handler 中斷查詢（見 query_timeout）
+- 每個 pool 同時排隊的工作數有上限，滿了直接回 503，避免 dashboard 流量堆積
+
+用法：
+    from modules.storage.async_access import data_access
+    summary = await data_access.read(visitor_db.get_summary, days)
+    path = await data_access.fs(resolve_file, camera_id, date_str, filename)
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from fastapi import HTTPException
+
+from modules.storage.query_timeout import is_interrupted, run_with_deadline
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class PoolConfig:
+    name: str
+    workers: int
+    max_pending: int        # 執行中 + 排隊中的上限
+    timeout_sec: float
+
+
+class _BoundedPool:
+    def __init__(self, cfg: PoolConfig):
+        self.cfg = cfg
+        self._executor = ThreadPoolExecutor(max_workers=cfg.workers, thread_name_prefix=cfg.name)
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    async def run(self, fn: Callable[..., T], *args: Any, timeout: Optional[float] = None, **kwargs: Any) -> T:
+        timeout = timeout or self.cfg.timeout_sec
+        with self._lock:
+            if self._pending >= self.cfg.max_pending:
+                self.rejected += 1
+                raise HTTPException(status_code=503, detail=f"{self.cfg.name} busy")
+            self._pending += 1
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, partial(run_with_deadline, timeout, fn, *args, **kwargs))
+        future.add_done_callback(self._release)
+        try:
+            # shield：逾時只是不再等待，worker 會在 progress handler 中斷後自行結束
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logger.warning("%s call timed out after %.1fs: %s", self.cfg.name, timeout, getattr(fn, "__name__", fn))
+            raise HTTPException(status_code=504, detail=f"{self.cfg.name} timeout")
+        except Exception as e:
+            if is_interrupted(e):
+                self.timeouts += 1
+                raise HTTPException(status_code=504, detail=f"{self.cfg.name} timeout")
+            raise
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self._pending -= 1
+            self.completed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = self._pending
+        return {
+            "workers": self.cfg.workers,
+            "pending": pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class AsyncDataAccess:
+    """
+    三個獨立的 pool：
+    - read：SQLite 查詢（dashboard / 錄影列表）
+    - write：SQLite 寫入（單一 worker，避免寫鎖競爭）
+    - fs：檔案系統（exists / stat / glob / 小檔讀寫）
+    """
+
+    def __init__(
+        self,
+        read: PoolConfig = PoolConfig("db-read", workers=4, max_pending=64, timeout_sec=5.0),
+        write: PoolConfig = PoolConfig("db-write", workers=1, max_pending=64, timeout_sec=10.0),
+        fs: PoolConfig = PoolConfig("fs", workers=4, max_pending=128, timeout_sec=10.0),
+    ):
+        self._read = _BoundedPool(read)
+        self._write = _BoundedPool(write)
+        self._fs = _BoundedPool(fs)
+
+    async def read(self, fn: Callable[..., T], *args: Any, timeout: Optional[float] = None, **kwargs: Any) -> T:
+        return await self._read.run(fn, *args, timeout=timeout, **kwargs)
+
+    async def write(self, fn: Callable[..., T], *args: Any, timeout: Optional[float] = None, **kwargs: Any) -> T:
+        return await self._write.run(fn, *args, timeout=timeout, **kwargs)
+
+    async def fs(self, fn: Callable[..., T], *args: Any, timeout: Optional[float] = None, **kwargs: Any) -> T:
+        return await self._fs.run(fn, *args, timeout=timeout, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "read": self._read.stats(),
+            "write": self._write.stats(),
+            "fs": self._fs.stats(),
+        }
+
+    def shutdown(self) -> None:
+        for pool in (self._read, self._write, self._fs):
+            pool.shutdown()
+
+
+# 全域單例
+data_access = AsyncDataAccess()
@@ -1,13 +1,18 @@
 # modules/storage/cloudflare_r2.py
 from __future__ import annotations
 
+import time
+import logging
+import threading
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, List, Dict, Any, Union
+from typing import Optional, List, Dict, Any, Iterator, Protocol, Union
 
 import boto3
 from botocore.client import Config
 
+logger = logging.getLogger(__name__)
+
 
 @dataclass(frozen=True)
 class R2Config:
@@ -16,28 +21,90 @@ class R2Config:
     bucket: str
     endpoint: str
     public_url: str
+    max_pool_connections: int = 16      # 連線池大小（需 >= 同時上傳數）
+    connect_timeout: float = 5.0
+    read_timeout: float = 30.0
+    max_attempts: int = 3               # botocore 內建重試（含第一次）
+
+
+class ObjectInventory(Protocol):
+    """本機物件清單（modules/storage/r2_inventory.py），上傳 / 刪除時同步更新"""
+
+    def record(self, key: str, size: int, etag: Optional[str], last_modified: float) -> None: ...
+
+    def remove(self, key: str) -> None: ...
 
 
 class CloudflareR2:
     def __init__(self, cfg: R2Config):
         self.cfg = cfg
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._inventory: Optional[ObjectInventory] = None
+
+    def attach_inventory(self, inventory: ObjectInventory) -> None:
+        self._inventory = inventory
 
     def get_client(self):
-        return boto3.client(
-            "s3",
-            endpoint_url=self.cfg.endpoint,
+        """
+        共用的 S3 client（第一次呼叫時建立）
+        boto3 client 可跨執行緒共用；重複使用才能沿用連線池裡已完成 TLS 握手的連線
+        """
+        client = self._client
+        if client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._create_client()
+                client = self._client
+        return client
+
+    def _create_client(self):
+        # 各自的 Session：預設 Session 在多執行緒同時建立 client 時不安全
+        session = boto3.session.Session(
             aws_access_key_id=self.cfg.access_key,
             aws_secret_access_key=self.cfg.secret_key,
-            config=Config(signature_version="s3v4"),
+        )
+        return session.client(
+            "s3",
+            endpoint_url=self.cfg.endpoint,
+            config=Config(
+                signature_version="s3v4",
+                max_pool_connections=self.cfg.max_pool_connections,
+                connect_timeout=self.cfg.connect_timeout,
+                read_timeout=self.cfg.read_timeout,
+                retries={"max_attempts": self.cfg.max_attempts, "mode": "standard"},
+                tcp_keepalive=True,
+                # 只在 API 要求時計算 checksum：上傳 body 只讀一次（分段上傳限速才準確）
+                request_checksum_calculation="when_required",
+            ),
             region_name="auto",
         )
 
-    def list_files(self, prefix: Optional[str] = None) -> List[Dict[str, Any]]:
-        s3 = self.get_client()
-        return s3.list_objects_v2(
+    def public_url(self, key: str) -> str:
+        return f"{self.cfg.public_url}/{key}"
+
+    def iter_pages(self, prefix: Optional[str] = None, page_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+        """逐頁列出物件（每頁最多 page_size 筆），不會停在第一頁的 1000 筆"""
+        paginator = self.get_client().get_paginator("list_objects_v2")
+        for page in paginator.paginate(
             Bucket=self.cfg.bucket,
-            Prefix=prefix or ""
-        ).get("Contents", [])
+            Prefix=prefix or "",
+            PaginationConfig={"PageSize": page_size},
+        ):
+            yield page.get("Contents", [])
+
+    def iter_files(self, prefix: Optional[str] = None, page_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        for page in self.iter_pages(prefix, page_size):
+            yield from page
+
+    def list_files(self, prefix: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """列出 prefix 下的物件（limit = None 時列出全部；大量物件請用 iter_files）"""
+        files: List[Dict[str, Any]] = []
+        for obj in self.iter_files(prefix, page_size=min(limit or 1000, 1000)):
+            files.append(obj)
+            if limit is not None and len(files) >= limit:
+                break
+        return files
 
     def upload_file(self, filepath: Union[str, Path], key: str) -> str:
         """
@@ -52,7 +119,9 @@ class CloudflareR2:
             Key=key,
             ExtraArgs={"ACL": "public-read"},
         )
-        return f"{self.cfg.public_url}/{key}"
+        # upload_file 不回傳 ETag，由下次對帳補上
+        self.index_object(key, filepath.stat().st_size)
+        return self.public_url(key)
 
     def upload_bytes(self, data: bytes, key: str, content_type: Optional[str] = None) -> str:
         s3 = self.get_client()
@@ -60,13 +129,26 @@ class CloudflareR2:
         if content_type:
             extra["ContentType"] = content_type
 
-        s3.put_object(
+        resp = s3.put_object(
             Bucket=self.cfg.bucket,
             Key=key,
             Body=data,
             **extra,
         )
-        return f"{self.cfg.public_url}/{key}"
+        self.index_object(key, len(data), resp.get("ETag"))
+        return self.public_url(key)
+
+    def index_object(self, key: str, size: int, etag: Optional[str] = None) -> None:
+        """
+        上傳完成後記進本機物件清單（multipart 等不經過 upload_* 的上傳也要呼叫）
+        清單寫入失敗只記 log：上傳本身已成功，漏記的物件由定期對帳補上
+        """
+        if self._inventory is None:
+            return
+        try:
+            self._inventory.record(key, size, etag.strip('"') if etag else None, time.time())
+        except Exception:
+            logger.exception("R2 inventory record failed: %s", key)
 
     def file_exists(self, key: str) -> bool:
         s3 = self.get_client()
@@ -77,15 +159,22 @@ class CloudflareR2:
             return False
 
     def folder_exists(self, prefix: str) -> bool:
-        files = self.list_files(prefix)
-        return len(files) > 0
+        s3 = self.get_client()
+        resp = s3.list_objects_v2(Bucket=self.cfg.bucket, Prefix=prefix, MaxKeys=1)
+        return resp.get("KeyCount", 0) > 0
 
     def create_folder(self, prefix: str) -> None:
         if not prefix.endswith("/"):
             prefix += "/"
         s3 = self.get_client()
-        s3.put_object(Bucket=self.cfg.bucket, Key=prefix)
+        resp = s3.put_object(Bucket=self.cfg.bucket, Key=prefix)
+        self.index_object(prefix, 0, resp.get("ETag"))
 
     def delete_file(self, key: str) -> None:
         s3 = self.get_client()
         s3.delete_object(Bucket=self.cfg.bucket, Key=key)
+        if self._inventory is not None:
+            try:
+                self._inventory.remove(key)
+            except Exception:
+                logger.exception("R2 inventory remove failed: %s", key)
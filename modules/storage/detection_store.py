@@ -0,0 +1,240 @@
+# modules/storage/detection_store.py
+"""
+偵測結果 sidecar（Parquet，欄式儲存）
+- 偵測執行緒只把每幀結果 append 到記憶體，不碰磁碟
+- 每個時間區塊（與錄影分段同長）結束時由背景執行緒寫成一個 Parquet 檔
+  （沒有人之後不會再收到新的幀 → 背景執行緒每分鐘檢查，區塊時間過了就寫出）
+- 查詢時用 polars lazy scan 只讀需要的日期 / 欄位，回傳符合條件的時間區間
+
+檔案結構（與錄影分開存放，錄影被保留策略刪掉後仍可搜尋）：
+data/detections/{camera_id}/{YYYYMMDD}/{HHMMSS}.parquet
+
+欄位：ts (epoch 秒), track_id, cx, cy, w, h, zone
+"""
+from __future__ import annotations
+
+import shutil
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from queue import Queue, Empty
+from typing import List, Optional, Sequence, Tuple
+
+import polars as pl
+
+logger = logging.getLogger(__name__)
+
+DETECTIONS_DIR = Path(__file__).parent.parent.parent / "data" / "detections"
+ZONES = ["none", "door", "inside"]
+
+SCHEMA = {
+    "ts": pl.Float64,
+    "track_id": pl.Int32,
+    "cx": pl.Int16,
+    "cy": pl.Int16,
+    "w": pl.Int16,
+    "h": pl.Int16,
+    "zone": pl.Enum(ZONES),
+}
+
+# (track_id, cx, cy, w, h, zone)
+Detection = Tuple[int, int, int, int, int, str]
+
+
+@dataclass(frozen=True)
+class DetectionStoreConfig:
+    camera_id: str = "cam1"
+    root: Path = DETECTIONS_DIR
+    bucket_minutes: int = 3          # 每個檔案涵蓋的時間（與錄影分段同長）
+    flush_check_sec: float = 60.0    # 多久檢查一次已結束但還在記憶體的區塊
+    keep_days: int = 90              # sidecar 保留天數（遠比影片小，可以留比較久）
+    name: str = "DetectionStore"
+
+
+@dataclass(frozen=True)
+class DetectionRange:
+    start: float        # epoch 秒
+    end: float
+    peak_count: int     # 區間內單幀最多符合的人數
+    frames: int
+
+
+class DetectionStore:
+    """
+    用法：
+        store = DetectionStore(DetectionStoreConfig(camera_id="cam1"))
+        store.start()
+        store.add_frame(ts, [(track_id, cx, cy, w, h, zone), ...])
+        ...
+        store.stop()
+    """
+
+    def __init__(self, cfg: DetectionStoreConfig):
+        self.cfg = cfg
+        self._lock = threading.Lock()
+        self._rows: List[Tuple[float, int, int, int, int, int, str]] = []
+        self._bucket_start: Optional[float] = None
+        self._q: "Queue[Optional[list]]" = Queue()
+        self._t: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._t and self._t.is_alive():
+            return
+        self._t = threading.Thread(target=self._writer_loop, name=self.cfg.name, daemon=True)
+        self._t.start()
+
+    def stop(self) -> None:
+        self._flush()
+        self._q.put(None)
+        if self._t:
+            self._t.join(timeout=10.0)
+
+    # === 寫入 ===
+
+    def add_frame(self, ts: float, detections: Sequence[Detection]) -> None:
+        """偵測執行緒每幀呼叫一次（沒偵測到人的幀不需要呼叫）"""
+        bucket_sec = self.cfg.bucket_minutes * 60
+        with self._lock:
+            if self._bucket_start is None:
+                self._bucket_start = ts
+            elif int(ts // bucket_sec) != int(self._bucket_start // bucket_sec):
+                self._q.put(self._rows)
+                self._rows = []
+                self._bucket_start = ts
+            self._rows.extend((ts, *d) for d in detections)
+
+    def _flush(self) -> None:
+        with self._lock:
+            if self._rows:
+                self._q.put(self._rows)
+            self._rows = []
+            self._bucket_start = None
+
+    def _flush_expired(self, now: float) -> None:
+        """目前的區塊時間已過（最後一個人離開後不會再有 add_frame）→ 送去寫檔，夜間事件不必等到下一個人出現"""
+        bucket_sec = self.cfg.bucket_minutes * 60
+        with self._lock:
+            if self._bucket_start is None or int(now // bucket_sec) == int(self._bucket_start // bucket_sec):
+                return
+            if self._rows:
+                self._q.put(self._rows)
+            self._rows = []
+            self._bucket_start = None
+
+    def _writer_loop(self) -> None:
+        last_prune = 0.0
+        while True:
+            try:
+                rows = self._q.get(timeout=self.cfg.flush_check_sec)
+            except Empty:
+                rows = []
+            if rows is None:
+                break
+            if rows:
+                try:
+                    self._write(rows)
+                except Exception:
+                    logger.exception("%s write failed (%d rows)", self.cfg.name, len(rows))
+
+            now = datetime.now().timestamp()
+            self._flush_expired(now)
+            if now - last_prune > 3600:
+                last_prune = now
+                self._prune()
+
+    def _write(self, rows: list) -> Path:
+        df = pl.DataFrame(rows, schema=SCHEMA, orient="row")
+        first = datetime.fromtimestamp(rows[0][0])
+        out_dir = self.cfg.root / self.cfg.camera_id / first.strftime("%Y%m%d")
+        out_dir.mkdir(parents=True, exist_ok=True)
+        out_path = out_dir / f"{first.strftime('%H%M%S')}.parquet"
+
+        tmp_path = out_path.with_suffix(".parquet.tmp")
+        df.write_parquet(tmp_path, compression="zstd", statistics=True)
+        tmp_path.replace(out_path)
+        logger.debug("Detection sidecar written: %s (%d rows)", out_path.name, len(df))
+        return out_path
+
+    def _prune(self) -> None:
+        """刪除超過保留天數的日期目錄"""
+        cam_dir = self.cfg.root / self.cfg.camera_id
+        if not cam_dir.is_dir():
+            return
+        cutoff = (datetime.now() - timedelta(days=self.cfg.keep_days)).strftime("%Y%m%d")
+        for date_dir in cam_dir.iterdir():
+            if date_dir.is_dir() and date_dir.name < cutoff:
+                shutil.rmtree(date_dir, ignore_errors=True)
+
+
+# === 查詢 ===
+
+def sidecar_files(camera_id: str, start: datetime, end: datetime, root: Path = DETECTIONS_DIR) -> List[Path]:
+    """列出可能包含 [start, end) 資料的 Parquet 檔（依日期目錄篩選）"""
+    cam_dir = root / camera_id
+    files: List[Path] = []
+    day = start.date()
+    while day <= end.date():
+        date_dir = cam_dir / day.strftime("%Y%m%d")
+        if date_dir.is_dir():
+            files.extend(sorted(date_dir.glob("*.parquet")))
+        day += timedelta(days=1)
+    return files
+
+
+def query_ranges(
+    camera_id: str,
+    start: datetime,
+    end: datetime,
+    zone: Optional[str] = None,
+    min_count: int = 1,
+    min_duration: float = 0.0,
+    max_gap: float = 1.0,
+    root: Path = DETECTIONS_DIR,
+) -> List[DetectionRange]:
+    """
+    找出符合條件的時間區間，例如：
+    - zone="door"                 門口有人
+    - zone="inside", min_count=2  店內至少兩人
+    相鄰符合幀間隔不超過 max_gap 秒視為同一區間；短於 min_duration 的區間捨棄。
+    """
+    if zone is not None and zone not in ZONES:
+        raise ValueError(f"Unknown zone: {zone}")
+
+    files = sidecar_files(camera_id, start, end, root)
+    if not files:
+        return []
+
+    lf = pl.scan_parquet(files).filter(
+        pl.col("ts").is_between(start.timestamp(), end.timestamp(), closed="left")
+    )
+    if zone is not None:
+        lf = lf.filter(pl.col("zone") == zone)
+
+    ranges = (
+        lf.group_by("ts")
+        .agg(pl.len().alias("count"))
+        .filter(pl.col("count") >= min_count)
+        .sort("ts")
+        .with_columns((pl.col("ts").diff().fill_null(0.0) > max_gap).cum_sum().alias("run"))
+        .group_by("run")
+        .agg(
+            pl.col("ts").min().alias("start"),
+            pl.col("ts").max().alias("end"),
+            pl.col("count").max().alias("peak_count"),
+            pl.len().alias("frames"),
+        )
+        .filter((pl.col("end") - pl.col("start")) >= min_duration)
+        .sort("start")
+        .collect()
+    )
+    return [
+        DetectionRange(
+            start=row["start"],
+            end=row["end"],
+            peak_count=row["peak_count"],
+            frames=row["frames"],
+        )
+        for row in ranges.iter_rows(named=True)
+    ]
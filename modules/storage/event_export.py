@@ -0,0 +1,133 @@
+# modules/storage/event_export.py
+"""
+訪客事件匯出編碼（CSV / Parquet）
+- 每次餵一批 EntryRecord，回傳這批編碼後可以直接送出的位元組
+- 整份匯出不會同時放在記憶體裡，給 StreamingResponse 邊查邊送
+
+Parquet 需要 pyarrow（選用相依，沒裝時 parquet_available() 為 False）；
+每批寫成一個 row group，檔尾 footer 在 close() 時送出
+"""
+from __future__ import annotations
+
+import io
+import csv
+from typing import List, Optional
+
+from modules.storage.visitor_db import EntryRecord
+
+EXPORT_COLUMNS = ["id", "entry_time", "camera_id", "segment_file", "offset_sec"]
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class CsvEventWriter:
+    def __init__(self):
+        self._header_sent = False
+
+    def write(self, entries: List[EntryRecord]) -> bytes:
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        if not self._header_sent:
+            writer.writerow(EXPORT_COLUMNS)
+            self._header_sent = True
+        writer.writerows(
+            (e.id, e.entry_time.isoformat(), e.camera_id or "", e.segment_file or "",
+             "" if e.offset_sec is None else e.offset_sec)
+            for e in entries
+        )
+        return buf.getvalue().encode("utf-8")
+
+    def close(self) -> bytes:
+        # 沒有任何事件時仍回傳標頭列
+        return b"" if self._header_sent else self.write([])
+
+
+class _ChunkSink:
+    """給 ParquetWriter 的只寫檔案物件：寫入的位元組暫存到被 drain() 取走為止"""
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._pos = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self._buf += data
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def drain(self) -> bytes:
+        data = bytes(self._buf)
+        self._buf.clear()
+        return data
+
+
+class ParquetEventWriter:
+    def __init__(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._schema = pa.schema([
+            ("id", pa.int64()),
+            ("entry_time", pa.timestamp("ms")),   # 本地時間
+            ("camera_id", pa.string()),
+            ("segment_file", pa.string()),
+            ("offset_sec", pa.float64()),
+        ])
+        self._sink = _ChunkSink()
+        self._writer: Optional["pq.ParquetWriter"] = pq.ParquetWriter(
+            self._sink, self._schema, compression="zstd",
+        )
+
+    def write(self, entries: List[EntryRecord]) -> bytes:
+        if not entries:
+            return b""
+        pa = self._pa
+        table = pa.table(
+            [
+                pa.array([e.id for e in entries], pa.int64()),
+                pa.array([e.entry_time for e in entries], pa.timestamp("ms")),
+                pa.array([e.camera_id for e in entries], pa.string()),
+                pa.array([e.segment_file for e in entries], pa.string()),
+                pa.array([e.offset_sec for e in entries], pa.float64()),
+            ],
+            schema=self._schema,
+        )
+        self._writer.write_table(table)
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        return self._sink.drain()
+
+
+def make_event_writer(fmt: str):
+    if fmt == "csv":
+        return CsvEventWriter()
+    if fmt == "parquet":
+        return ParquetEventWriter()
+    raise ValueError(f"Unsupported export format: {fmt}")
@@ -0,0 +1,258 @@
+# modules/storage/heatmap_store.py
+"""
+人員位置熱度圖
+- 偵測執行緒每幀把追蹤點（cx, cy）加進低解析度格子（預設 96×54），只做幾次整數累加
+- 背景執行緒每 flush_interval_sec 把增量加進當小時的檔案（uint32，壓縮後每小時數 KB）
+- 讀取時把時間範圍內各小時的格子相加，再渲染成半透明 PNG overlay（結果快取在磁碟）
+
+檔案結構：
+data/heatmaps/{camera_id}/{YYYYMMDD}/{HH}.npz
+data/heatmaps/{camera_id}/_render/*.png     # 渲染快取
+"""
+from __future__ import annotations
+
+import shutil
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+HEATMAPS_DIR = Path(__file__).parent.parent.parent / "data" / "heatmaps"
+RENDER_CACHE_DIRNAME = "_render"
+RENDER_CACHE_MAX_FILES = 200
+
+
+@dataclass(frozen=True)
+class HeatmapConfig:
+    camera_id: str = "cam1"
+    root: Path = HEATMAPS_DIR
+    cols: int = 96                   # 格子解析度（與畫面解析度無關）
+    rows: int = 54
+    flush_interval_sec: float = 60.0
+    keep_days: int = 180
+    name: str = "HeatmapAccumulator"
+
+
+class HeatmapAccumulator:
+    """
+    用法：
+        heatmap = HeatmapAccumulator(HeatmapConfig(camera_id="cam1"))
+        heatmap.start()
+        heatmap.add(ts, [(cx, cy), ...], width, height)   # 每幀
+        ...
+        heatmap.stop()
+    """
+
+    def __init__(self, cfg: HeatmapConfig):
+        self.cfg = cfg
+        self._lock = threading.Lock()
+        self._hour: Optional[int] = None        # 目前格子對應的小時（epoch 秒 // 3600）
+        self._grid = self._new_grid()
+        self._dirty = False
+        self._pending: List[Tuple[int, np.ndarray]] = []   # 已換小時、等待寫入的格子
+        self._stop = threading.Event()
+        self._t: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._t and self._t.is_alive():
+            return
+        self._stop.clear()
+        self._t = threading.Thread(target=self._loop, name=self.cfg.name, daemon=True)
+        self._t.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._t:
+            self._t.join(timeout=10.0)
+        self._flush()
+
+    # === 寫入（偵測執行緒）===
+
+    def add(self, ts: float, points: Sequence[Tuple[int, int]], width: int, height: int) -> None:
+        if not points:
+            return
+        hour = int(ts) // 3600
+        cols, rows = self.cfg.cols, self.cfg.rows
+        with self._lock:
+            if hour != self._hour:
+                # 換小時：舊格子交給背景執行緒寫，這裡不碰磁碟
+                if self._dirty:
+                    self._pending.append((self._hour, self._grid))
+                    self._grid = self._new_grid()
+                    self._dirty = False
+                self._hour = hour
+            grid = self._grid
+            for cx, cy in points:
+                if 0 <= cx < width and 0 <= cy < height:
+                    grid[cy * rows // height, cx * cols // width] += 1
+            self._dirty = True
+
+    def _new_grid(self) -> np.ndarray:
+        return np.zeros((self.cfg.rows, self.cfg.cols), dtype=np.uint32)
+
+    # === 背景寫入 ===
+
+    def _loop(self) -> None:
+        last_prune = 0.0
+        while not self._stop.wait(self.cfg.flush_interval_sec):
+            self._flush()
+            now = datetime.now().timestamp()
+            if now - last_prune > 3600:
+                last_prune = now
+                self._prune()
+
+    def _flush(self) -> None:
+        """把累積的增量加進各小時檔（換一個新格子後就放開鎖，檔案讀寫不擋偵測執行緒）"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if self._dirty:
+                pending.append((self._hour, self._grid))
+                self._grid = self._new_grid()
+                self._dirty = False
+
+        for hour, delta in pending:
+            try:
+                _add_to_hour_file(hour_path(self.cfg.root, self.cfg.camera_id, hour), delta)
+            except Exception:
+                logger.exception("%s flush failed", self.cfg.name)
+
+    def _prune(self) -> None:
+        cam_dir = self.cfg.root / self.cfg.camera_id
+        if not cam_dir.is_dir():
+            return
+        cutoff = (datetime.now() - timedelta(days=self.cfg.keep_days)).strftime("%Y%m%d")
+        for date_dir in cam_dir.iterdir():
+            if date_dir.is_dir() and date_dir.name.isdigit() and date_dir.name < cutoff:
+                shutil.rmtree(date_dir, ignore_errors=True)
+
+
+def hour_path(root: Path, camera_id: str, hour: int) -> Path:
+    start = datetime.fromtimestamp(hour * 3600)
+    return root / camera_id / start.strftime("%Y%m%d") / f"{start:%H}.npz"
+
+
+def _add_to_hour_file(path: Path, delta: np.ndarray) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    grid = delta
+    if path.exists():
+        existing = _load_grid(path)
+        if existing is not None and existing.shape == delta.shape:
+            grid = existing + delta
+    tmp_path = path.with_name(path.stem + ".tmp.npz")
+    np.savez_compressed(tmp_path, grid=grid)
+    tmp_path.replace(path)
+
+
+def _load_grid(path: Path) -> Optional[np.ndarray]:
+    try:
+        with np.load(path) as data:
+            return data["grid"]
+    except (OSError, ValueError, KeyError):
+        logger.warning("Unreadable heatmap file: %s", path)
+        return None
+
+
+# === 讀取 ===
+
+def hour_files(camera_id: str, start: datetime, end: datetime, root: Path = HEATMAPS_DIR) -> List[Path]:
+    """列出與 [start, end) 重疊的小時檔"""
+    files: List[Path] = []
+    hour = int(start.timestamp()) // 3600
+    last = (int(end.timestamp()) - 1) // 3600
+    while hour <= last:
+        path = hour_path(root, camera_id, hour)
+        if path.exists():
+            files.append(path)
+        hour += 1
+    return files
+
+
+def load_heatmap(
+    camera_id: str,
+    start: datetime,
+    end: datetime,
+    root: Path = HEATMAPS_DIR,
+) -> Optional[np.ndarray]:
+    """把範圍內各小時的格子相加；沒有資料時回傳 None"""
+    total: Optional[np.ndarray] = None
+    for path in hour_files(camera_id, start, end, root):
+        grid = _load_grid(path)
+        if grid is None:
+            continue
+        if total is None:
+            total = grid.astype(np.uint64)
+        elif grid.shape == total.shape:
+            total += grid
+    return total
+
+
+def render_overlay(grid: np.ndarray, width: int, height: int) -> bytes:
+    """渲染成 BGRA PNG：log 正規化 + 色階，沒人去過的格子完全透明"""
+    values = np.log1p(grid.astype(np.float32))
+    peak = float(values.max())
+    norm = values / peak if peak > 0 else values
+
+    norm = cv2.resize(norm, (width, height), interpolation=cv2.INTER_CUBIC)
+    norm = cv2.GaussianBlur(np.clip(norm, 0.0, 1.0), (0, 0), sigmaX=max(width, height) / 200)
+    u8 = (norm * 255).astype(np.uint8)
+
+    color = cv2.applyColorMap(u8, cv2.COLORMAP_JET)
+    alpha = np.clip(u8.astype(np.uint16) * 3 // 2, 0, 200).astype(np.uint8)
+    ok, buf = cv2.imencode(".png", np.dstack([color, alpha]))
+    if not ok:
+        raise RuntimeError("PNG encode failed")
+    return buf.tobytes()
+
+
+def render_heatmap_png(
+    camera_id: str,
+    start: datetime,
+    end: datetime,
+    width: int = 960,
+    height: int = 540,
+    root: Path = HEATMAPS_DIR,
+) -> Optional[Path]:
+    """
+    取得範圍內的熱度圖 PNG 路徑（有快取就直接回傳）。
+    快取比所有來源小時檔都新才算有效 → 目前小時的資料更新後會自動重新渲染。
+    """
+    files = hour_files(camera_id, start, end, root)
+    if not files:
+        return None
+
+    # 資料是小時粒度 → 以涵蓋的小時當 key，同一小時內的不同起訖共用快取
+    first_hour = int(start.timestamp()) // 3600
+    last_hour = (int(end.timestamp()) - 1) // 3600
+    key = f"{camera_id}|{first_hour}|{last_hour}|{width}x{height}"
+    cache_dir = root / camera_id / RENDER_CACHE_DIRNAME
+    cache_path = cache_dir / f"{hashlib.sha1(key.encode()).hexdigest()[:16]}.png"
+
+    newest_source = max(p.stat().st_mtime for p in files)
+    if cache_path.exists() and cache_path.stat().st_mtime >= newest_source:
+        return cache_path
+
+    grid = load_heatmap(camera_id, start, end, root)
+    if grid is None:
+        return None
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_suffix(".png.tmp")
+    tmp_path.write_bytes(render_overlay(grid, width, height))
+    tmp_path.replace(cache_path)
+    _prune_render_cache(cache_dir)
+    return cache_path
+
+
+def _prune_render_cache(cache_dir: Path) -> None:
+    cached = sorted(cache_dir.glob("*.png"), key=lambda p: p.stat().st_mtime)
+    for path in cached[:-RENDER_CACHE_MAX_FILES]:
+        path.unlink(missing_ok=True)
+
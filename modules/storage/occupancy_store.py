@@ -0,0 +1,335 @@
+# modules/storage/occupancy_store.py
+"""
+店內 / 門口人數時間序列（Parquet，欄式儲存）
+- 偵測執行緒每幀呼叫 record()，只更新「目前這一秒」的最大值，跨秒時 append 一筆 tuple
+- 每 block_minutes 由背景執行緒寫成一個只追加的 1 秒資料區塊
+- 同時把區塊聚合進當天的 1m / 15m / 1h 金字塔（sum / samples / max 可以直接相加合併）
+- 查詢依時間範圍自動挑解析度，一次 scan 讀完
+
+檔案結構：
+data/occupancy/{camera_id}/{YYYYMMDD}/
+├── raw-143000.parquet    # 1 秒資料區塊（只追加，較早刪除）
+├── 1m.parquet            # 金字塔：每個 bucket 一列 / zone
+├── 15m.parquet
+└── 1h.parquet
+
+1 秒資料：ts (epoch 秒), zone, count（該秒內單幀最大人數）
+金字塔：ts (bucket 起點), zone, sum, samples, max → 平均 = sum / samples
+"""
+from __future__ import annotations
+
+import shutil
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from queue import Queue, Empty
+from typing import Dict, List, Optional, Tuple
+
+import polars as pl
+
+logger = logging.getLogger(__name__)
+
+OCCUPANCY_DIR = Path(__file__).parent.parent.parent / "data" / "occupancy"
+ZONES = ["inside", "door"]
+
+RAW_SCHEMA = {
+    "ts": pl.Int64,
+    "zone": pl.Enum(ZONES),
+    "count": pl.Int16,
+}
+
+# 解析度（秒）→ 金字塔層名稱；1 秒為原始資料
+LEVELS: Dict[int, str] = {60: "1m", 900: "15m", 3600: "1h"}
+RESOLUTIONS = [1, *LEVELS]
+
+# (epoch 秒, inside, door)
+Sample = Tuple[int, int, int]
+
+
+@dataclass(frozen=True)
+class OccupancyStoreConfig:
+    camera_id: str = "cam1"
+    root: Path = OCCUPANCY_DIR
+    block_minutes: int = 5           # 1 秒資料多久寫一個區塊
+    raw_keep_days: int = 30          # 1 秒資料保留天數
+    keep_days: int = 730             # 金字塔保留天數
+    name: str = "OccupancyStore"
+
+
+@dataclass(frozen=True)
+class OccupancyPoint:
+    ts: int             # bucket 起點（epoch 秒）
+    zone: str
+    avg: float
+    max: int
+
+
+class OccupancyStore:
+    """
+    用法：
+        store = OccupancyStore(OccupancyStoreConfig(camera_id="cam1"))
+        store.start()
+        store.record(ts, inside=3, door=1)   # 每幀
+        ...
+        store.stop()
+    """
+
+    def __init__(self, cfg: OccupancyStoreConfig):
+        self.cfg = cfg
+        self._lock = threading.Lock()
+        self._second: Optional[int] = None
+        self._inside = 0
+        self._door = 0
+        self._samples: List[Sample] = []
+        self._q: "Queue[Optional[List[Sample]]]" = Queue()
+        self._t: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._t and self._t.is_alive():
+            return
+        self._t = threading.Thread(target=self._writer_loop, name=self.cfg.name, daemon=True)
+        self._t.start()
+
+    def stop(self) -> None:
+        self._flush()
+        self._q.put(None)
+        if self._t:
+            self._t.join(timeout=10.0)
+
+    # === 寫入（偵測執行緒）===
+
+    def record(self, ts: float, inside: int, door: int) -> None:
+        """每幀呼叫一次；同一秒內取最大值"""
+        second = int(ts)
+        with self._lock:
+            if second == self._second:
+                if inside > self._inside:
+                    self._inside = inside
+                if door > self._door:
+                    self._door = door
+                return
+
+            if self._second is not None:
+                self._samples.append((self._second, self._inside, self._door))
+                block_sec = self.cfg.block_minutes * 60
+                if second // block_sec != self._second // block_sec:
+                    self._q.put(self._samples)
+                    self._samples = []
+            self._second = second
+            self._inside = inside
+            self._door = door
+
+    def _flush(self) -> None:
+        with self._lock:
+            if self._second is not None:
+                self._samples.append((self._second, self._inside, self._door))
+            if self._samples:
+                self._q.put(self._samples)
+            self._samples = []
+            self._second = None
+
+    # === 背景寫入 ===
+
+    def _writer_loop(self) -> None:
+        last_prune = 0.0
+        while True:
+            try:
+                samples = self._q.get(timeout=60.0)
+            except Empty:
+                samples = []
+            if samples is None:
+                break
+            if samples:
+                try:
+                    self._write(samples)
+                except Exception:
+                    logger.exception("%s write failed (%d samples)", self.cfg.name, len(samples))
+
+            now = datetime.now().timestamp()
+            if now - last_prune > 3600:
+                last_prune = now
+                self._prune()
+
+    def _write(self, samples: List[Sample]) -> None:
+        raw = pl.DataFrame(
+            {
+                "ts": [s[0] for s in samples] * 2,
+                "zone": ["inside"] * len(samples) + ["door"] * len(samples),
+                "count": [s[1] for s in samples] + [s[2] for s in samples],
+            },
+            schema=RAW_SCHEMA,
+        )
+
+        # 區塊可能跨日（午夜前後）→ 依日期分開寫
+        for day_start, part in _split_by_day(raw):
+            day_dir = self.cfg.root / self.cfg.camera_id / day_start.strftime("%Y%m%d")
+            day_dir.mkdir(parents=True, exist_ok=True)
+            first = datetime.fromtimestamp(part["ts"].min())
+            _write_atomic(part.sort("ts", "zone"), day_dir / f"raw-{first.strftime('%H%M%S')}.parquet")
+
+            # 金字塔：每一層由上一層的新資料聚合，再併入當天檔案
+            level_rows = _aggregate(
+                part.select("ts", "zone", pl.col("count").cast(pl.Int32).alias("sum"),
+                            pl.lit(1, pl.Int32).alias("samples"), pl.col("count").alias("max")),
+                60,
+            )
+            for seconds, name in LEVELS.items():
+                if seconds != 60:
+                    level_rows = _aggregate(level_rows, seconds)
+                _merge_level(day_dir / f"{name}.parquet", level_rows)
+
+        logger.debug("Occupancy block written: %d seconds", len(samples))
+
+    def _prune(self) -> None:
+        """1 秒資料保留 raw_keep_days，整個日期目錄保留 keep_days"""
+        cam_dir = self.cfg.root / self.cfg.camera_id
+        if not cam_dir.is_dir():
+            return
+        now = datetime.now()
+        raw_cutoff = (now - timedelta(days=self.cfg.raw_keep_days)).strftime("%Y%m%d")
+        cutoff = (now - timedelta(days=self.cfg.keep_days)).strftime("%Y%m%d")
+        for date_dir in cam_dir.iterdir():
+            if not date_dir.is_dir():
+                continue
+            if date_dir.name < cutoff:
+                shutil.rmtree(date_dir, ignore_errors=True)
+            elif date_dir.name < raw_cutoff:
+                for raw_file in date_dir.glob("raw-*.parquet"):
+                    raw_file.unlink(missing_ok=True)
+
+
+def _split_by_day(df: pl.DataFrame) -> List[Tuple[datetime, pl.DataFrame]]:
+    days = df["ts"].map_elements(
+        lambda ts: datetime.fromtimestamp(ts).strftime("%Y%m%d"), return_dtype=pl.String,
+    )
+    return [
+        (datetime.strptime(key[0], "%Y%m%d"), part.drop("_day"))
+        for key, part in df.with_columns(days.alias("_day")).group_by("_day", maintain_order=True)
+    ]
+
+
+def _aggregate(df: pl.DataFrame, seconds: int) -> pl.DataFrame:
+    """把 (ts, zone, sum, samples, max) 聚合到較粗的 bucket（bucket 以本地時間對齊）"""
+    offset = _utc_offset_sec(int(df["ts"].min()))
+    return (
+        df.with_columns(((pl.col("ts") + offset) // seconds * seconds - offset).alias("ts"))
+        .group_by("ts", "zone")
+        .agg(
+            pl.col("sum").sum().cast(pl.Int32),
+            pl.col("samples").sum().cast(pl.Int32),
+            pl.col("max").max(),
+        )
+    )
+
+
+def _merge_level(path: Path, rows: pl.DataFrame) -> None:
+    if path.exists():
+        rows = pl.concat([pl.read_parquet(path), rows]).pipe(_aggregate, 1)
+    _write_atomic(rows.sort("ts", "zone"), path)
+
+
+def _write_atomic(df: pl.DataFrame, path: Path) -> None:
+    tmp_path = path.with_suffix(".parquet.tmp")
+    df.write_parquet(tmp_path, compression="zstd", statistics=True)
+    tmp_path.replace(path)
+
+
+def _utc_offset_sec(ts: int) -> int:
+    offset = datetime.fromtimestamp(ts).astimezone().utcoffset()
+    return int(offset.total_seconds()) if offset else 0
+
+
+# === 查詢 ===
+
+def pick_resolution(start: datetime, end: datetime, max_points: int) -> int:
+    """挑最細、且點數不超過 max_points 的解析度（秒）"""
+    span = (end - start).total_seconds()
+    for seconds in RESOLUTIONS:
+        if span / seconds <= max_points:
+            return seconds
+    return RESOLUTIONS[-1]
+
+
+def level_files(
+    camera_id: str,
+    start: datetime,
+    end: datetime,
+    resolution: int,
+    root: Path = OCCUPANCY_DIR,
+) -> List[Path]:
+    """列出某解析度涵蓋 [start, end) 的檔案（1 秒資料依區塊起點篩選）"""
+    cam_dir = root / camera_id
+    files: List[Path] = []
+    day = start.date()
+    while day <= end.date():
+        date_dir = cam_dir / day.strftime("%Y%m%d")
+        if date_dir.is_dir():
+            if resolution == 1:
+                files.extend(_raw_blocks(date_dir, start, end))
+            else:
+                level_file = date_dir / f"{LEVELS[resolution]}.parquet"
+                if level_file.exists():
+                    files.append(level_file)
+        day += timedelta(days=1)
+    return files
+
+
+def _raw_blocks(date_dir: Path, start: datetime, end: datetime) -> List[Path]:
+    # 區塊長度不固定（停止時會提早寫出），保守地往前多取一個區塊
+    blocks = sorted(date_dir.glob("raw-*.parquet"))
+    day = datetime.strptime(date_dir.name, "%Y%m%d")
+    starts = [
+        datetime.combine(day.date(), datetime.strptime(p.stem[4:], "%H%M%S").time())
+        for p in blocks
+    ]
+    selected = []
+    for i, (path, block_start) in enumerate(zip(blocks, starts)):
+        next_start = starts[i + 1] if i + 1 < len(starts) else None
+        if block_start < end and (next_start is None or next_start > start):
+            selected.append(path)
+    return selected
+
+
+def query_occupancy(
+    camera_id: str,
+    start: datetime,
+    end: datetime,
+    zone: Optional[str] = None,
+    max_points: int = 1500,
+    resolution: Optional[int] = None,
+    root: Path = OCCUPANCY_DIR,
+) -> Tuple[int, List[OccupancyPoint]]:
+    """
+    取得 [start, end) 的人數時間序列，回傳 (解析度秒數, 資料點)
+    未指定 resolution 時依 max_points 自動挑選
+    """
+    if zone is not None and zone not in ZONES:
+        raise ValueError(f"Unknown zone: {zone}")
+    if resolution is None:
+        resolution = pick_resolution(start, end, max_points)
+    elif resolution not in RESOLUTIONS:
+        raise ValueError(f"Unsupported resolution: {resolution}")
+
+    files = level_files(camera_id, start, end, resolution, root)
+    if not files:
+        return resolution, []
+
+    # 包含與 start 重疊的第一個 bucket
+    lf = pl.scan_parquet(files).filter(
+        pl.col("ts").is_between(int(start.timestamp()) - resolution + 1, int(end.timestamp()), closed="left")
+    )
+    if zone is not None:
+        lf = lf.filter(pl.col("zone") == zone)
+
+    if resolution == 1:
+        lf = lf.select("ts", "zone", pl.col("count").cast(pl.Float64).alias("avg"), pl.col("count").alias("max"))
+    else:
+        lf = lf.select("ts", "zone", (pl.col("sum") / pl.col("samples")).alias("avg"), "max")
+
+    df = lf.sort("ts", "zone").collect()
+    return resolution, [
+        OccupancyPoint(ts=row["ts"], zone=row["zone"], avg=round(row["avg"], 2), max=row["max"])
+        for row in df.iter_rows(named=True)
+    ]
@@ -0,0 +1,168 @@
+# modules/storage/query_cache.py
+"""
+Dashboard 查詢結果快取
+- key = (端點, 參數)，每筆記錄結果涵蓋的日期區間 [first, last]
+- 歷史區間（last < 今天）資料不會再變 → 不過期，只受 LRU 上限淘汰
+- 含今天的區間有 TTL，主要靠寫入時精準失效（只丟掉涵蓋該日期的 key）
+- single-flight：同一個 key 同時只跑一次查詢，其餘請求等同一個結果
+
+用法：
+    hourly = await query_cache.get_or_load(
+        ("hourly", d), d, d,
+        lambda: data_access.read(visitor_db.get_hourly_distribution, d),
+    )
+"""
+from __future__ import annotations
+
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class QueryCacheConfig:
+    max_entries: int = 512
+    live_ttl_sec: float = 300.0    # 含今天的結果最長保留時間（另一個行程寫入時的保險）
+
+
+@dataclass
+class _Entry:
+    value: Any
+    first: date
+    last: date
+    expires_at: Optional[float]    # None = 不過期
+
+
+class QueryCache:
+    """
+    get_or_load 只在 event loop 上呼叫；invalidate_dates / clear 可從任何執行緒呼叫
+    （VisitorDB 的寫入在 VisitorWriter 背景執行緒）
+    """
+
+    def __init__(self, cfg: QueryCacheConfig = QueryCacheConfig()):
+        self.cfg = cfg
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        # 每個日期最後一次失效時的 generation；查詢期間被失效的結果不寫入快取
+        self._generation = 0
+        self._invalidated: Dict[date, int] = {}
+        self._cleared_at = 0
+        self.hits = 0
+        self.misses = 0
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        first: date,
+        last: date,
+        loader: Callable[[], Awaitable[T]],
+    ) -> T:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry.expires_at is None or entry.expires_at > now):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+            self.misses += 1
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, first, last, loader))
+            self._inflight[key] = task
+        # shield：某個請求中斷不會取消其他人在等的查詢
+        return await asyncio.shield(task)
+
+    async def _load(
+        self,
+        key: Hashable,
+        first: date,
+        last: date,
+        loader: Callable[[], Awaitable[T]],
+    ) -> T:
+        with self._lock:
+            generation = self._generation
+        try:
+            value = await loader()
+        finally:
+            self._inflight.pop(key, None)
+
+        live = last >= date.today()
+        with self._lock:
+            if not self._touched_since(generation, first, last):
+                self._entries[key] = _Entry(
+                    value=value,
+                    first=first,
+                    last=last,
+                    expires_at=time.monotonic() + self.cfg.live_ttl_sec if live else None,
+                )
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.cfg.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def _touched_since(self, generation: int, first: date, last: date) -> bool:
+        if self._generation == generation:
+            return False
+        if self._cleared_at > generation:
+            return True
+        return any(g > generation and first <= d <= last for d, g in self._invalidated.items())
+
+    # === 失效 ===
+
+    def invalidate_dates(self, dates: Optional[Iterable[date]]) -> int:
+        """丟掉涵蓋任一日期的結果；dates=None 代表全部。回傳丟掉的筆數"""
+        if dates is None:
+            return self.clear()
+
+        dates = set(dates)
+        if not dates:
+            return 0
+        with self._lock:
+            self._generation += 1
+            for d in dates:
+                self._invalidated[d] = self._generation
+            stale = [
+                key for key, e in self._entries.items()
+                if any(e.first <= d <= e.last for d in dates)
+            ]
+            for key in stale:
+                del self._entries[key]
+            self._prune_invalidated()
+        return len(stale)
+
+    def clear(self) -> int:
+        with self._lock:
+            self._generation += 1
+            self._cleared_at = self._generation
+            self._invalidated.clear()
+            dropped = len(self._entries)
+            self._entries.clear()
+        return dropped
+
+    def _prune_invalidated(self) -> None:
+        """失效紀錄只需要保留到進行中的查詢結束；超過上限時丟掉最舊的"""
+        if len(self._invalidated) > 1024:
+            for d, _ in sorted(self._invalidated.items(), key=lambda kv: kv[1])[:512]:
+                del self._invalidated[d]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "inflight": len(self._inflight),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# 全域單例
+query_cache = QueryCache()        # 訪客統計（進店事件寫入時失效）
+paths_cache = QueryCache(QueryCacheConfig(max_entries=128))  # 軌跡分析（track_stats 寫入時失效）
@@ -0,0 +1,42 @@
+# modules/storage/query_timeout.py
+"""
+SQLite 查詢逾時
+- 連線上掛 progress handler，每 PROGRESS_HANDLER_OPS 個 VM 指令檢查一次期限
+- 期限是 thread-local 的：只有經由 run_with_deadline 呼叫的查詢會被中斷
+  （sqlite3.OperationalError: interrupted），背景執行緒的批次工作不受影響
+"""
+from __future__ import annotations
+
+import time
+import sqlite3
+import threading
+from typing import Any, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+PROGRESS_HANDLER_OPS = 10_000
+
+_deadline = threading.local()
+
+
+def install_query_timeout(conn: sqlite3.Connection) -> None:
+    """在連線上掛 progress handler（建立連線時呼叫一次）"""
+    conn.set_progress_handler(_check_deadline, PROGRESS_HANDLER_OPS)
+
+
+def _check_deadline() -> int:
+    deadline = getattr(_deadline, "value", None)
+    return 1 if deadline is not None and time.monotonic() > deadline else 0
+
+
+def run_with_deadline(timeout: Optional[float], fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """在目前執行緒設定期限後呼叫 fn；期限到時進行中的查詢會被中斷"""
+    _deadline.value = time.monotonic() + timeout if timeout else None
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _deadline.value = None
+
+
+def is_interrupted(exc: BaseException) -> bool:
+    return isinstance(exc, sqlite3.OperationalError) and "interrupted" in str(exc)
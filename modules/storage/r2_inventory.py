@@ -0,0 +1,325 @@
+# modules/storage/r2_inventory.py
+"""
+R2 物件清單（本機 SQLite）
+- CloudflareR2 上傳 / 刪除時即時更新（attach_inventory 之後）
+- 背景定期以分頁列表對帳：補上漏記的物件（其他程式上傳、upload_file 沒有 ETag），移除已不存在的
+- 管理工具 / 保留策略可以直接查 prefix 的物件數、容量、舊物件，不必每次掃整個 bucket
+"""
+from __future__ import annotations
+
+import time
+import sqlite3
+import logging
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from contextlib import contextmanager
+
+from modules.storage.cloudflare_r2 import CloudflareR2
+from modules.storage.query_timeout import install_query_timeout
+
+logger = logging.getLogger(__name__)
+
+# 專案根目錄的 data/r2_inventory.db
+DB_PATH = Path(__file__).parent.parent.parent / "data" / "r2_inventory.db"
+
+_PREFIX_END = "\U0010ffff"   # prefix 範圍查詢的上界（走 PRIMARY KEY 索引，不用 LIKE）
+
+
+@dataclass
+class R2Object:
+    key: str
+    size: int
+    etag: Optional[str]
+    last_modified: float      # unix timestamp
+
+
+class R2Inventory:
+    """
+    用法：
+        inventory = get_r2_inventory()
+        r2.attach_inventory(inventory)              # 上傳 / 刪除即時記錄
+        inventory.reconcile(r2, "recordings/")      # 與 bucket 對帳
+        inventory.usage("recordings/cam1/")
+    """
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = db_path or DB_PATH
+        self._local = threading.local()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._init_schema()
+
+    @contextmanager
+    def _get_conn(self):
+        """取得 thread-local 的資料庫連線"""
+        if not hasattr(self._local, "conn") or self._local.conn is None:
+            self._local.conn = sqlite3.connect(
+                str(self.db_path),
+                check_same_thread=False
+            )
+            self._local.conn.row_factory = sqlite3.Row
+            self._local.conn.execute("PRAGMA journal_mode=WAL")
+            install_query_timeout(self._local.conn)
+        try:
+            yield self._local.conn
+        except Exception:
+            self._local.conn.rollback()
+            raise
+
+    def _init_schema(self) -> None:
+        with self._get_conn() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS r2_objects (
+                    key TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    etag TEXT,
+                    last_modified REAL NOT NULL,
+                    indexed_at REAL NOT NULL     -- 最後一次上傳 / 對帳看到的時間
+                ) WITHOUT ROWID;
+
+                CREATE INDEX IF NOT EXISTS idx_r2_objects_modified
+                    ON r2_objects(last_modified);
+
+                CREATE TABLE IF NOT EXISTS r2_reconciles (
+                    prefix TEXT PRIMARY KEY,
+                    finished_at REAL NOT NULL,
+                    objects INTEGER NOT NULL,
+                    bytes INTEGER NOT NULL,
+                    added INTEGER NOT NULL,
+                    removed INTEGER NOT NULL
+                );
+            """)
+            conn.commit()
+
+    # === 即時更新（CloudflareR2 呼叫）===
+
+    def record(self, key: str, size: int, etag: Optional[str], last_modified: float) -> None:
+        with self._get_conn() as conn:
+            conn.execute("""
+                INSERT INTO r2_objects (key, size, etag, last_modified, indexed_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    size = excluded.size,
+                    etag = excluded.etag,
+                    last_modified = excluded.last_modified,
+                    indexed_at = excluded.indexed_at
+            """, (key, size, etag, last_modified, time.time()))
+            conn.commit()
+
+    def remove(self, key: str) -> None:
+        with self._get_conn() as conn:
+            conn.execute("DELETE FROM r2_objects WHERE key = ?", (key,))
+            conn.commit()
+
+    # === 對帳 ===
+
+    def reconcile(self, r2: CloudflareR2, prefix: str = "") -> Dict[str, int]:
+        """
+        以分頁列表掃一次 prefix，逐頁寫入（不把整個清單放進記憶體）
+        掃描期間才上傳的物件 indexed_at 較新，不會被當成已刪除，也不會被舊的列表結果覆蓋
+        """
+        started = time.time()
+        before = self._count(prefix)
+        objects = total_bytes = 0
+        for page in r2.iter_pages(prefix):
+            rows = [
+                (obj["Key"], obj["Size"], obj.get("ETag", "").strip('"') or None,
+                 obj["LastModified"].timestamp(), started)
+                for obj in page
+            ]
+            if not rows:
+                continue
+            with self._get_conn() as conn:
+                conn.executemany("""
+                    INSERT INTO r2_objects (key, size, etag, last_modified, indexed_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET
+                        size = excluded.size,
+                        etag = excluded.etag,
+                        last_modified = excluded.last_modified,
+                        indexed_at = excluded.indexed_at
+                    WHERE r2_objects.indexed_at < excluded.indexed_at
+                """, rows)
+                conn.commit()
+            objects += len(rows)
+            total_bytes += sum(r[1] for r in rows)
+
+        added = max(0, self._count(prefix) - before)
+        with self._get_conn() as conn:
+            cur = conn.execute("""
+                DELETE FROM r2_objects
+                WHERE key >= ? AND key < ? AND indexed_at < ?
+            """, (prefix, prefix + _PREFIX_END, started))
+            removed = cur.rowcount
+            conn.execute("""
+                INSERT OR REPLACE INTO r2_reconciles (prefix, finished_at, objects, bytes, added, removed)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (prefix, time.time(), objects, total_bytes, added, removed))
+            conn.commit()
+
+        logger.info("R2 inventory reconciled %r: %d objects, %d added, %d removed (%.1fs)",
+                    prefix, objects, added, removed, time.time() - started)
+        return {"objects": objects, "bytes": total_bytes, "added": added, "removed": removed}
+
+    def _count(self, prefix: str) -> int:
+        with self._get_conn() as conn:
+            return conn.execute("""
+                SELECT COUNT(*) FROM r2_objects WHERE key >= ? AND key < ?
+            """, (prefix, prefix + _PREFIX_END)).fetchone()[0]
+
+    # === 查詢 API ===
+
+    def get(self, key: str) -> Optional[R2Object]:
+        with self._get_conn() as conn:
+            row = conn.execute("SELECT * FROM r2_objects WHERE key = ?", (key,)).fetchone()
+        return _row_to_object(row) if row else None
+
+    def exists(self, prefix: str) -> bool:
+        with self._get_conn() as conn:
+            row = conn.execute("""
+                SELECT 1 FROM r2_objects WHERE key >= ? AND key < ? LIMIT 1
+            """, (prefix, prefix + _PREFIX_END)).fetchone()
+        return row is not None
+
+    def list_objects(self, prefix: str = "", after: Optional[str] = None, limit: int = 1000) -> List[R2Object]:
+        """依 key 排序分頁（after = 上一頁最後一個 key）"""
+        with self._get_conn() as conn:
+            rows = conn.execute("""
+                SELECT * FROM r2_objects
+                WHERE key >= ? AND key < ? AND key > ?
+                ORDER BY key
+                LIMIT ?
+            """, (prefix, prefix + _PREFIX_END, after or "", limit)).fetchall()
+        return [_row_to_object(r) for r in rows]
+
+    def older_than(self, prefix: str, before_ts: float, limit: int = 1000) -> List[R2Object]:
+        """last_modified 早於 before_ts 的物件（由舊到新，給保留策略用）"""
+        with self._get_conn() as conn:
+            rows = conn.execute("""
+                SELECT * FROM r2_objects
+                WHERE last_modified < ? AND key >= ? AND key < ?
+                ORDER BY last_modified
+                LIMIT ?
+            """, (before_ts, prefix, prefix + _PREFIX_END, limit)).fetchall()
+        return [_row_to_object(r) for r in rows]
+
+    def usage(self, prefix: str = "", delimiter: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+        """
+        prefix 下的物件數與容量
+        delimiter = "/" 時依下一層「資料夾」分組（例如 usage("recordings/", "/") → 各攝影機）
+        """
+        start = len(prefix) + 1
+        if delimiter:
+            group = """
+                CASE WHEN instr(substr(key, ?), ?) > 0
+                     THEN substr(key, 1, ? - 1 + instr(substr(key, ?), ?))
+                     ELSE key END
+            """
+            params: Tuple[Any, ...] = (start, delimiter, start, start, delimiter)
+        else:
+            group, params = "?", (prefix,)
+        with self._get_conn() as conn:
+            rows = conn.execute(f"""
+                SELECT {group} AS folder, COUNT(*) AS objects, COALESCE(SUM(size), 0) AS bytes
+                FROM r2_objects
+                WHERE key >= ? AND key < ?
+                GROUP BY folder
+                ORDER BY folder
+            """, params + (prefix, prefix + _PREFIX_END)).fetchall()
+        return {r["folder"]: {"objects": r["objects"], "bytes": r["bytes"]} for r in rows}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._get_conn() as conn:
+            row = conn.execute("SELECT COUNT(*) AS n, COALESCE(SUM(size), 0) AS b FROM r2_objects").fetchone()
+            scans = conn.execute("SELECT * FROM r2_reconciles ORDER BY prefix").fetchall()
+        return {
+            "objects": row["n"],
+            "bytes": row["b"],
+            "reconciled": {
+                s["prefix"]: {
+                    "age_sec": round(time.time() - s["finished_at"]),
+                    "objects": s["objects"],
+                    "added": s["added"],
+                    "removed": s["removed"],
+                }
+                for s in scans
+            },
+        }
+
+
+def _row_to_object(row: sqlite3.Row) -> R2Object:
+    return R2Object(
+        key=row["key"],
+        size=row["size"],
+        etag=row["etag"],
+        last_modified=row["last_modified"],
+    )
+
+
+@dataclass(frozen=True)
+class R2ReconcilerConfig:
+    prefixes: Sequence[str] = ("",)      # 對帳範圍（預設整個 bucket）
+    interval_sec: float = 24 * 3600
+    name: str = "R2Reconciler"
+
+
+class R2Reconciler:
+    """
+    用法：
+        reconciler = R2Reconciler(R2ReconcilerConfig(interval_sec=6 * 3600), r2)
+        reconciler.start()
+        ...
+        reconciler.stop()
+    """
+
+    def __init__(self, cfg: R2ReconcilerConfig, r2: CloudflareR2, inventory: Optional[R2Inventory] = None):
+        self.cfg = cfg
+        self.r2 = r2
+        self.inventory = inventory or get_r2_inventory()
+        self._stop = threading.Event()
+        self._t: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._t and self._t.is_alive():
+            return
+        self._stop.clear()
+        self._t = threading.Thread(target=self._loop, name=self.cfg.name, daemon=True)
+        self._t.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._t:
+            self._t.join(timeout=10.0)
+
+    def _loop(self) -> None:
+        # 啟動後稍等，避開開機時的索引補建
+        if self._stop.wait(120.0):
+            return
+        while not self._stop.is_set():
+            self._stop.wait(self.run_once())
+
+    def run_once(self) -> float:
+        """對帳到期的 prefix，回傳距離下一次到期的秒數"""
+        last = self.inventory.stats()["reconciled"]
+        wait = self.cfg.interval_sec
+        for prefix in self.cfg.prefixes:
+            if self._stop.is_set():
+                break
+            age = last[prefix]["age_sec"] if prefix in last else None
+            if age is not None and age < self.cfg.interval_sec:
+                wait = min(wait, self.cfg.interval_sec - age)
+                continue
+            try:
+                self.inventory.reconcile(self.r2, prefix)
+            except Exception:
+                logger.exception("%s reconcile failed: %r", self.cfg.name, prefix)
+                wait = min(wait, 3600.0)
+        return max(wait, 60.0)
+
+
+@lru_cache
+def get_r2_inventory() -> R2Inventory:
+    # 第一次使用時才建立（r2_inventory_enabled=False 時不會產生 data/r2_inventory.db）
+    return R2Inventory()
@@ -0,0 +1,306 @@
+# modules/storage/r2_uploader.py
+"""
+R2 上傳佇列
+- 固定數量的 worker 執行緒共用同一個 CloudflareR2 client（連線池 + keep-alive，不重複 TLS 握手）
+- submit_* 立即回傳 Future，呼叫端可以不等（fire-and-forget）或等 URL（通知要附圖）
+- 暫時性錯誤（連線中斷、逾時、5xx、429）以指數退避 + jitter 重試；4xx / 設定錯誤直接失敗
+- 有設定暫存區時，重試用完 / 佇列滿 / 已知離線的上傳改寫進磁碟暫存區，之後自動補傳
+- 每次上傳的延遲 / 重試次數記在 upload_metrics，/api/dashboard/metrics 可查
+"""
+from __future__ import annotations
+
+import time
+import queue
+import random
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from botocore.exceptions import (
+    ClientError,
+    ConnectionClosedError,
+    ConnectTimeoutError,
+    EndpointConnectionError,
+    ReadTimeoutError,
+)
+
+from modules.storage.cloudflare_r2 import CloudflareR2
+from modules.storage.upload_spool import UploadSpool
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {408, 429}
+
+# 網路層的暫時性錯誤；憑證 / 參數 / 設定錯誤（其他 BotoCoreError）重試也不會好，直接失敗
+RETRYABLE_ERRORS = (
+    EndpointConnectionError,
+    ConnectionClosedError,
+    ReadTimeoutError,
+    ConnectTimeoutError,
+)
+
+
+class UploadSpooled(Exception):
+    """上傳沒有立即完成，已寫進暫存區；url 為補傳後的網址"""
+
+    def __init__(self, url: str):
+        super().__init__(f"Upload spooled for retry: {url}")
+        self.url = url
+
+
+@dataclass(frozen=True)
+class R2UploaderConfig:
+    max_concurrency: int = 4             # 同時上傳數（R2Config.max_pool_connections 需 >= 此值）
+    max_queue: int = 64                  # 佇列上限，滿了直接失敗（不阻塞偵測 / 通知執行緒）
+    max_attempts: int = 4                # 含第一次；botocore 內部重試之外再包一層
+    backoff_base_sec: float = 0.5
+    backoff_max_sec: float = 8.0
+    name: str = "R2Uploader"
+
+
+class UploadMetrics:
+    """上傳延遲 / 成功率（所有 uploader 共用）"""
+
+    def __init__(self, window: int = 500):
+        self._lock = threading.Lock()
+        self._latencies: deque = deque(maxlen=window)   # 成功上傳的總耗時（含重試）
+        self.uploaded = 0
+        self.failed = 0
+        self.dropped = 0      # 佇列滿且沒能寫進暫存區（真的遺失）
+        self.spooled = 0
+        self.retries = 0
+        self.bytes = 0
+        self.pending = 0
+        self._spool: Optional[UploadSpool] = None
+
+    def attach_spool(self, spool: UploadSpool) -> None:
+        self._spool = spool
+
+    def submitted(self) -> None:
+        with self._lock:
+            self.pending += 1
+
+    def record(self, ok: bool, latency_sec: float, attempts: int, size: int) -> None:
+        with self._lock:
+            self.pending -= 1
+            self.retries += attempts - 1
+            if ok:
+                self.uploaded += 1
+                self.bytes += size
+                self._latencies.append(latency_sec)
+            else:
+                self.failed += 1
+
+    def record_dropped(self) -> None:
+        with self._lock:
+            self.dropped += 1
+
+    def record_spooled(self) -> None:
+        with self._lock:
+            self.spooled += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            result: Dict[str, Any] = {
+                "uploaded": self.uploaded,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "spooled": self.spooled,
+                "retries": self.retries,
+                "bytes": self.bytes,
+                "pending": self.pending,
+            }
+        if latencies:
+            result["latency_ms"] = {
+                "p50": round(latencies[len(latencies) // 2] * 1000, 1),
+                "p95": round(latencies[int(len(latencies) * 0.95)] * 1000, 1),
+                "max": round(latencies[-1] * 1000, 1),
+            }
+        if self._spool is not None:
+            result["spool"] = self._spool.stats()
+        return result
+
+
+# (上傳函式, 大小, future, 寫進暫存區的函式)
+_Job = Tuple[Callable[[], str], int, Future, Callable[[UploadSpool], str]]
+
+
+class R2Uploader:
+    """
+    用法：
+        uploader = R2Uploader(R2UploaderConfig(), r2)
+        uploader.start()
+        url = uploader.upload_bytes(jpg, key, "image/jpeg", timeout=15)   # 等結果
+        uploader.submit_file(path, key)                                   # 不等
+        ...
+        uploader.stop()
+    """
+
+    def __init__(
+        self,
+        cfg: R2UploaderConfig,
+        r2: CloudflareR2,
+        metrics: Optional[UploadMetrics] = None,
+        spool: Optional[UploadSpool] = None,
+    ):
+        self.cfg = cfg
+        self.r2 = r2
+        self.metrics = metrics or upload_metrics
+        self.spool = spool
+        if spool is not None:
+            self.metrics.attach_spool(spool)
+        self._q: "queue.Queue[Optional[_Job]]" = queue.Queue(maxsize=cfg.max_queue)
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        if any(t.is_alive() for t in self._threads):
+            return
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"{self.cfg.name}-{i}", daemon=True)
+            for i in range(self.cfg.max_concurrency)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """送完佇列中的上傳再停（最多等 timeout 秒）"""
+        deadline = time.monotonic() + timeout
+        for _ in self._threads:
+            try:
+                self._q.put(None, timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Full:
+                break
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout=max(0.0, deadline - time.monotonic()))
+
+    # === 提交 ===
+
+    def submit_bytes(self, data: bytes, key: str, content_type: Optional[str] = None) -> "Future[str]":
+        return self._submit(
+            lambda: self.r2.upload_bytes(data, key=key, content_type=content_type),
+            len(data),
+            lambda spool: spool.put_bytes(data, key, content_type),
+        )
+
+    def submit_file(self, filepath: Union[str, Path], key: str) -> "Future[str]":
+        filepath = Path(filepath)
+        return self._submit(
+            lambda: self.r2.upload_file(filepath, key),
+            filepath.stat().st_size,
+            lambda spool: spool.put_file(filepath, key),
+        )
+
+    def upload_bytes(
+        self,
+        data: bytes,
+        key: str,
+        content_type: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> str:
+        """
+        排入佇列並等待完成，回傳 public url
+        失敗時拋出最後一次的例外；改寫進暫存區時拋出 UploadSpooled（帶補傳後的 url）
+        逾時拋出 TimeoutError，上傳仍在背景繼續
+        """
+        return self.submit_bytes(data, key, content_type).result(timeout=timeout)
+
+    def _submit(self, fn: Callable[[], str], size: int, to_spool: Callable[[UploadSpool], str]) -> "Future[str]":
+        future: "Future[str]" = Future()
+        if self._stop.is_set():
+            return self._fallback(future, to_spool, RuntimeError(f"{self.cfg.name} stopped"))
+        if self.spool is not None and self.spool.offline():
+            # 補傳還在退避 → 網路多半還沒恢復，直接寫暫存區，不佔 worker 等逾時
+            return self._fallback(future, to_spool, RuntimeError("R2 offline"))
+        try:
+            self._q.put_nowait((fn, size, future, to_spool))
+        except queue.Full:
+            return self._fallback(future, to_spool, RuntimeError(f"{self.cfg.name} queue full"), dropped=True)
+        self.metrics.submitted()
+        return future
+
+    def _fallback(
+        self,
+        future: "Future[str]",
+        to_spool: Callable[[UploadSpool], str],
+        error: Exception,
+        dropped: bool = False,
+    ) -> "Future[str]":
+        """
+        沒辦法（或不必）在佇列裡上傳：有暫存區就寫進去，否則以 error 結束
+        dropped=True（佇列滿）時，只有沒寫進暫存區才計為丟棄
+        """
+        spooled = False
+        if self.spool is not None:
+            try:
+                error = UploadSpooled(to_spool(self.spool))
+                self.metrics.record_spooled()
+                spooled = True
+            except Exception:
+                logger.exception("%s spool write failed", self.cfg.name)
+        if dropped and not spooled:
+            self.metrics.record_dropped()
+        if future.set_running_or_notify_cancel():
+            future.set_exception(error)
+        return future
+
+    # === worker ===
+
+    def _worker(self) -> None:
+        try:
+            self.r2.get_client()   # 預先建立共用 client，第一次上傳不必等
+        except Exception:
+            logger.exception("%s client init failed", self.cfg.name)
+
+        while True:
+            job = self._q.get()
+            if job is None:
+                return
+            fn, size, future, to_spool = job
+            if future.cancelled():
+                self.metrics.record(False, 0.0, 1, size)
+                continue
+
+            t0 = time.perf_counter()
+            attempt = 0
+            while True:
+                attempt += 1
+                try:
+                    url = fn()
+                except Exception as e:
+                    if attempt < self.cfg.max_attempts and _is_retryable(e) and not self._stop.is_set():
+                        delay = min(self.cfg.backoff_max_sec, self.cfg.backoff_base_sec * 2 ** (attempt - 1))
+                        time.sleep(delay * random.uniform(0.5, 1.0))
+                        continue
+                    self.metrics.record(False, time.perf_counter() - t0, attempt, size)
+                    logger.warning("%s upload failed after %d attempt(s): %s", self.cfg.name, attempt, e)
+                    if _is_retryable(e):
+                        self._fallback(future, to_spool, e)
+                    elif future.set_running_or_notify_cancel():
+                        future.set_exception(e)
+                else:
+                    self.metrics.record(True, time.perf_counter() - t0, attempt, size)
+                    if future.set_running_or_notify_cancel():
+                        future.set_result(url)
+                break
+
+
+def _is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, ClientError):
+        status = exc.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+        return status >= 500 or status in RETRYABLE_STATUS
+    if isinstance(exc, RETRYABLE_ERRORS):
+        return True
+    # 本機檔案錯誤（檔案不存在 / 權限）重試也沒用；其餘 OSError 多半是連線被重置
+    return isinstance(exc, OSError) and not isinstance(exc, (FileNotFoundError, PermissionError, IsADirectoryError))
+
+
+# 全域單例
+upload_metrics = UploadMetrics()
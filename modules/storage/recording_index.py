@@ -0,0 +1,530 @@
+# modules/storage/recording_index.py
+from __future__ import annotations
+
+import re
+import json
+import sqlite3
+import subprocess
+import threading
+import logging
+from pathlib import Path
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Tuple
+from dataclasses import dataclass
+from contextlib import contextmanager
+
+from modules.storage.query_timeout import install_query_timeout
+
+logger = logging.getLogger(__name__)
+
+# 專案根目錄的 data/recordings.db
+DB_PATH = Path(__file__).parent.parent.parent / "data" / "recordings.db"
+
+SEGMENT_FILENAME_PATTERN = re.compile(r"^(\d{8})_(\d{6})_raw\.mp4$")
+DATE_DIR_PATTERN = re.compile(r"^\d{8}$")
+
+
+@dataclass
+class RecordingSegment:
+    id: int
+    camera_id: str
+    date: str                 # YYYYMMDD（目錄名）
+    filename: str
+    path: str
+    start_time: datetime
+    end_time: Optional[datetime]
+    duration_seconds: Optional[float]
+    size_bytes: Optional[int]
+    hls_bytes: Optional[int]
+    codec: Optional[str]
+    status: str               # recording / closed
+    hls_status: str           # pending / ready / failed / none
+    has_activity: bool = False  # 分段期間有進店 / 非營業時段偵測
+    thumbnails: Optional[Dict[str, Any]] = None  # sprite 索引（見 modules/video/thumbnails.py）
+    remote_status: Optional[str] = None  # R2 異地備份：None / uploading / synced / failed / missing
+
+
+class RecordingIndex:
+    """
+    錄影分段目錄（catalog）
+    - 錄影器開檔 / 關檔、後處理完成時更新
+    - 列表查詢改用索引，不必每次 glob + stat 整個日期目錄
+    """
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = db_path or DB_PATH
+        self._local = threading.local()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._init_schema()
+
+    @contextmanager
+    def _get_conn(self):
+        """取得 thread-local 的資料庫連線"""
+        if not hasattr(self._local, "conn") or self._local.conn is None:
+            self._local.conn = sqlite3.connect(
+                str(self.db_path),
+                check_same_thread=False
+            )
+            self._local.conn.row_factory = sqlite3.Row
+            install_query_timeout(self._local.conn)
+        try:
+            yield self._local.conn
+        except Exception:
+            self._local.conn.rollback()
+            raise
+
+    def _init_schema(self) -> None:
+        with self._get_conn() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS recording_segments (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    camera_id TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    path TEXT NOT NULL UNIQUE,
+                    start_ts REAL NOT NULL,
+                    end_ts REAL,
+                    duration_seconds REAL,
+                    size_bytes INTEGER,
+                    hls_bytes INTEGER,
+                    codec TEXT,
+                    status TEXT NOT NULL DEFAULT 'recording',
+                    hls_status TEXT NOT NULL DEFAULT 'pending',
+                    has_activity INTEGER NOT NULL DEFAULT 0,
+                    thumbnails TEXT,
+                    remote_status TEXT,
+                    remote_key TEXT,
+                    remote_upload_id TEXT,
+                    remote_bytes INTEGER,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+
+                CREATE INDEX IF NOT EXISTS idx_segments_camera_start
+                    ON recording_segments(camera_id, start_ts);
+
+                CREATE INDEX IF NOT EXISTS idx_segments_camera_date
+                    ON recording_segments(camera_id, date);
+            """)
+            self._ensure_columns(conn, {
+                "has_activity": "INTEGER NOT NULL DEFAULT 0",
+                "hls_bytes": "INTEGER",
+                "thumbnails": "TEXT",
+                "remote_status": "TEXT",
+                "remote_key": "TEXT",
+                "remote_upload_id": "TEXT",       # 進行中的 multipart upload（重啟後續傳）
+                "remote_bytes": "INTEGER",        # 已上傳位元組
+            })
+            conn.commit()
+
+    @staticmethod
+    def _ensure_columns(conn: sqlite3.Connection, columns: dict[str, str]) -> None:
+        """舊版資料庫補上新增的欄位"""
+        existing = {r["name"] for r in conn.execute("PRAGMA table_info(recording_segments)")}
+        for name, decl in columns.items():
+            if name not in existing:
+                conn.execute(f"ALTER TABLE recording_segments ADD COLUMN {name} {decl}")
+
+    # === 寫入 API（給錄影器 / 後處理呼叫）===
+
+    def segment_opened(self, camera_id: str, path: Path, start_time: datetime, codec: str) -> None:
+        """錄影器開新分段"""
+        with self._get_conn() as conn:
+            conn.execute("""
+                INSERT INTO recording_segments
+                    (camera_id, date, filename, path, start_ts, codec)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(path) DO UPDATE SET
+                    start_ts = excluded.start_ts,
+                    codec = excluded.codec,
+                    status = 'recording',
+                    hls_status = 'pending',
+                    updated_at = CURRENT_TIMESTAMP
+            """, (
+                camera_id,
+                path.parent.name,
+                path.name,
+                _path_key(path),
+                start_time.timestamp(),
+                codec,
+            ))
+            conn.commit()
+
+    def segment_closed(
+        self,
+        path: Path,
+        duration_seconds: float,
+        size_bytes: int,
+        has_activity: bool = False,
+    ) -> None:
+        """錄影器關檔（duration 為實際寫入幀數 / fps）"""
+        with self._get_conn() as conn:
+            conn.execute("""
+                UPDATE recording_segments SET
+                    end_ts = start_ts + ?,
+                    duration_seconds = ?,
+                    size_bytes = ?,
+                    has_activity = ?,
+                    status = 'closed',
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE path = ?
+            """, (duration_seconds, duration_seconds, size_bytes, int(has_activity), _path_key(path)))
+            conn.commit()
+
+    def segment_processed(
+        self,
+        path: Path,
+        hls_status: str,
+        size_bytes: Optional[int] = None,
+        hls_bytes: Optional[int] = None,
+    ) -> None:
+        """faststart / HLS 後處理完成（size 會因 faststart 重寫而略有變動）"""
+        with self._get_conn() as conn:
+            conn.execute("""
+                UPDATE recording_segments SET
+                    hls_status = ?,
+                    size_bytes = COALESCE(?, size_bytes),
+                    hls_bytes = COALESCE(?, hls_bytes),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE path = ?
+            """, (hls_status, size_bytes, hls_bytes, _path_key(path)))
+            conn.commit()
+
+    def set_thumbnails(self, path: Path, thumbnails: Dict[str, Any]) -> None:
+        """記錄時間軸縮圖索引"""
+        with self._get_conn() as conn:
+            conn.execute("""
+                UPDATE recording_segments SET
+                    thumbnails = ?,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE path = ?
+            """, (json.dumps(thumbnails), _path_key(path)))
+            conn.commit()
+
+    def set_remote_state(
+        self,
+        path: Path,
+        status: Optional[str],
+        remote_key: Optional[str] = None,
+        upload_id: Optional[str] = None,
+        uploaded_bytes: Optional[int] = None,
+    ) -> None:
+        """R2 異地備份進度（upload_id 只在 uploading 時保留）"""
+        with self._get_conn() as conn:
+            conn.execute("""
+                UPDATE recording_segments SET
+                    remote_status = ?,
+                    remote_key = COALESCE(?, remote_key),
+                    remote_upload_id = ?,
+                    remote_bytes = COALESCE(?, remote_bytes),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE path = ?
+            """, (status, remote_key, upload_id, uploaded_bytes, _path_key(path)))
+            conn.commit()
+
+    def get_remote_state(self, path: Path) -> Optional[Tuple[Optional[str], Optional[str], Optional[int]]]:
+        """(remote_key, remote_upload_id, remote_bytes)"""
+        with self._get_conn() as conn:
+            row = conn.execute("""
+                SELECT remote_key, remote_upload_id, remote_bytes
+                FROM recording_segments WHERE path = ?
+            """, (_path_key(path),)).fetchone()
+        return (row["remote_key"], row["remote_upload_id"], row["remote_bytes"]) if row else None
+
+    # === 查詢 API ===
+
+    def get_segment(self, path: Path) -> Optional[RecordingSegment]:
+        with self._get_conn() as conn:
+            row = conn.execute(
+                "SELECT * FROM recording_segments WHERE path = ?",
+                (_path_key(path),)
+            ).fetchone()
+        return _row_to_segment(row) if row else None
+
+    def list_by_date(self, camera_id: str, date_str: str, hls_only: bool = True) -> List[RecordingSegment]:
+        """列出某攝影機某日期（YYYYMMDD）的分段"""
+        sql = """
+            SELECT * FROM recording_segments
+            WHERE camera_id = ? AND date = ?
+        """
+        if hls_only:
+            sql += " AND hls_status = 'ready'"
+        sql += " ORDER BY start_ts"
+
+        with self._get_conn() as conn:
+            rows = conn.execute(sql, (camera_id, date_str)).fetchall()
+        return [_row_to_segment(r) for r in rows]
+
+    def list_range(
+        self,
+        camera_id: str,
+        start: datetime,
+        end: datetime,
+        hls_only: bool = True,
+    ) -> List[RecordingSegment]:
+        """列出與 [start, end) 重疊的分段（可跨多天）"""
+        sql = """
+            SELECT * FROM recording_segments
+            WHERE camera_id = ?
+              AND start_ts < ?
+              AND COALESCE(end_ts, start_ts) >= ?
+        """
+        if hls_only:
+            sql += " AND hls_status = 'ready'"
+        sql += " ORDER BY start_ts"
+
+        with self._get_conn() as conn:
+            rows = conn.execute(sql, (camera_id, end.timestamp(), start.timestamp())).fetchall()
+        return [_row_to_segment(r) for r in rows]
+
+    def locate(self, camera_id: str, ts: datetime) -> Optional[Tuple[RecordingSegment, float]]:
+        """
+        找出包含時間點 ts 的分段，回傳 (分段, 分段內秒數)
+        錄影中的分段 end_ts 還是 NULL，以開始後一小時為上限，避免異常中斷的分段一直被命中
+        """
+        t = ts.timestamp()
+        with self._get_conn() as conn:
+            row = conn.execute("""
+                SELECT * FROM recording_segments
+                WHERE camera_id = ?
+                  AND start_ts <= ?
+                  AND COALESCE(end_ts, start_ts + 3600) > ?
+                ORDER BY start_ts DESC
+                LIMIT 1
+            """, (camera_id, t, t)).fetchone()
+        if not row:
+            return None
+        seg = _row_to_segment(row)
+        return seg, t - row["start_ts"]
+
+    def list_missing_thumbnails(self, limit: int = 1000) -> List[RecordingSegment]:
+        """已關檔但還沒有縮圖的分段（補產生用）"""
+        with self._get_conn() as conn:
+            rows = conn.execute("""
+                SELECT * FROM recording_segments
+                WHERE status = 'closed' AND thumbnails IS NULL
+                ORDER BY start_ts
+                LIMIT ?
+            """, (limit,)).fetchall()
+        return [_row_to_segment(r) for r in rows]
+
+    def list_sync_candidates(
+        self,
+        limit: int,
+        activity_only: bool = False,
+        retry_failed: bool = True,
+    ) -> List[RecordingSegment]:
+        """
+        待備份到 R2 的分段：已關檔且後處理結束（檔案不會再被改寫）
+        續傳中的優先，其次由舊到新；失敗的排最後
+        """
+        sql = """
+            SELECT * FROM recording_segments
+            WHERE status = 'closed' AND hls_status != 'pending'
+              AND (remote_status IS NULL OR remote_status = 'uploading'{failed})
+        """.format(failed=" OR remote_status = 'failed'" if retry_failed else "")
+        if activity_only:
+            sql += " AND has_activity = 1"
+        sql += """
+            ORDER BY CASE remote_status WHEN 'uploading' THEN 0 WHEN 'failed' THEN 2 ELSE 1 END, start_ts
+            LIMIT ?
+        """
+        with self._get_conn() as conn:
+            rows = conn.execute(sql, (limit,)).fetchall()
+        return [_row_to_segment(r) for r in rows]
+
+    def camera_usage(self) -> dict[str, int]:
+        """各攝影機已索引錄影的總大小（MP4 + HLS，bytes）"""
+        with self._get_conn() as conn:
+            rows = conn.execute("""
+                SELECT camera_id,
+                       COALESCE(SUM(size_bytes), 0) + COALESCE(SUM(hls_bytes), 0) AS total
+                FROM recording_segments
+                GROUP BY camera_id
+            """).fetchall()
+        return {r["camera_id"]: r["total"] for r in rows}
+
+    def retention_candidates(
+        self,
+        limit: int,
+        camera_id: Optional[str] = None,
+        before: Optional[datetime] = None,
+        has_activity: Optional[bool] = None,
+        activity_weight_sec: float = 0.0,
+        require_synced: bool = False,
+        sync_activity_only: bool = False,
+    ) -> List[RecordingSegment]:
+        """
+        可刪除的分段：已關檔且後處理結束，依時間由舊到新。
+        activity_weight_sec：有活動的分段排序時當作晚了這麼多秒
+        （例如保留天數的差距，剛錄完的無活動分段不會比一個月前的活動錄影先刪）
+        require_synced：只挑已備份到 R2 的分段；sync_activity_only 時無活動的分段本來就不備份，不受限制
+        """
+        sql = """
+            SELECT * FROM recording_segments
+            WHERE status = 'closed' AND hls_status != 'pending'
+        """
+        params: list = []
+        if camera_id is not None:
+            sql += " AND camera_id = ?"
+            params.append(camera_id)
+        if before is not None:
+            sql += " AND start_ts < ?"
+            params.append(before.timestamp())
+        if has_activity is not None:
+            sql += " AND has_activity = ?"
+            params.append(int(has_activity))
+        if require_synced:
+            sql += " AND (remote_status = 'synced'{unsynced})".format(
+                unsynced=" OR has_activity = 0" if sync_activity_only else "",
+            )
+        sql += " ORDER BY start_ts + has_activity * ? LIMIT ?"
+        params += [activity_weight_sec, limit]
+
+        with self._get_conn() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [_row_to_segment(r) for r in rows]
+
+    def delete_segment(self, path: Path) -> None:
+        with self._get_conn() as conn:
+            conn.execute("DELETE FROM recording_segments WHERE path = ?", (_path_key(path),))
+            conn.commit()
+
+    # === 維護 ===
+
+    def close_interrupted(self, before: datetime) -> int:
+        """
+        上次程式中斷時還在錄的分段：不會再收到 closed 通知 → 標成已關檔、HLS 失敗
+        只處理 before 之前開始的分段；server 在開始錄影前同步呼叫，不會碰到這次啟動的分段
+        回傳處理筆數
+        """
+        with self._get_conn() as conn:
+            cur = conn.execute("""
+                UPDATE recording_segments SET status = 'closed', hls_status = 'failed'
+                WHERE status = 'recording' AND start_ts < ?
+            """, (before.timestamp(),))
+            conn.commit()
+            return cur.rowcount
+
+    def backfill(self, root: Path, default_camera_id: str = "cam1") -> int:
+        """
+        掃描既有錄影目錄，把尚未建立索引的分段補進來。
+        支援 recordings/{camera_id}/{date}/ 與舊結構 recordings/{date}/。
+        回傳新增筆數。
+        """
+        if not root.exists():
+            return 0
+
+        with self._get_conn() as conn:
+            known = {r["path"] for r in conn.execute("SELECT path FROM recording_segments")}
+
+        added = 0
+        for camera_id, date_dir in _iter_date_dirs(root, default_camera_id):
+            for f in sorted(date_dir.glob("*_raw.mp4")):
+                m = SEGMENT_FILENAME_PATTERN.match(f.name)
+                if not m or _path_key(f) in known:
+                    continue
+                try:
+                    start_time = datetime.strptime(f"{m.group(1)}_{m.group(2)}", "%Y%m%d_%H%M%S")
+                except ValueError:
+                    continue
+
+                duration = probe_duration(f)
+                hls_dir = f.with_suffix("")
+                hls_ready = (hls_dir / "playlist.m3u8").exists()
+
+                with self._get_conn() as conn:
+                    conn.execute("""
+                        INSERT OR IGNORE INTO recording_segments
+                            (camera_id, date, filename, path, start_ts, end_ts,
+                             duration_seconds, size_bytes, hls_bytes, status, hls_status)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'closed', ?)
+                    """, (
+                        camera_id,
+                        date_dir.name,
+                        f.name,
+                        _path_key(f),
+                        start_time.timestamp(),
+                        start_time.timestamp() + duration if duration is not None else None,
+                        duration,
+                        f.stat().st_size,
+                        dir_size(hls_dir),
+                        "ready" if hls_ready else "failed",
+                    ))
+                    conn.commit()
+                added += 1
+
+        if added:
+            logger.info("Recording index backfilled %d segments from %s", added, root)
+        return added
+
+
+# === 輔助函式 ===
+
+def _path_key(path: Path) -> str:
+    return str(Path(path).resolve())
+
+
+def _row_to_segment(row: sqlite3.Row) -> RecordingSegment:
+    return RecordingSegment(
+        id=row["id"],
+        camera_id=row["camera_id"],
+        date=row["date"],
+        filename=row["filename"],
+        path=row["path"],
+        start_time=datetime.fromtimestamp(row["start_ts"]),
+        end_time=datetime.fromtimestamp(row["end_ts"]) if row["end_ts"] is not None else None,
+        duration_seconds=row["duration_seconds"],
+        size_bytes=row["size_bytes"],
+        hls_bytes=row["hls_bytes"],
+        codec=row["codec"],
+        status=row["status"],
+        hls_status=row["hls_status"],
+        has_activity=bool(row["has_activity"]),
+        thumbnails=json.loads(row["thumbnails"]) if row["thumbnails"] else None,
+        remote_status=row["remote_status"],
+    )
+
+
+def _iter_date_dirs(root: Path, default_camera_id: str):
+    """產生 (camera_id, date_dir)"""
+    for p in sorted(root.iterdir()):
+        if not p.is_dir():
+            continue
+        if DATE_DIR_PATTERN.match(p.name):
+            # 舊結構：只對應預設攝影機
+            yield default_camera_id, p
+            continue
+        for date_dir in sorted(p.iterdir()):
+            if date_dir.is_dir() and DATE_DIR_PATTERN.match(date_dir.name):
+                yield p.name, date_dir
+
+
+def dir_size(path: Path) -> int:
+    """目錄內檔案總大小（不存在回傳 0）"""
+    if not path.is_dir():
+        return 0
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def probe_duration(path: Path) -> Optional[float]:
+    """用 ffprobe 讀取影片長度（秒），失敗回傳 None"""
+    try:
+        result = subprocess.run(
+            [
+                "ffprobe", "-v", "error",
+                "-show_entries", "format=duration",
+                "-of", "json",
+                str(path),
+            ],
+            capture_output=True,
+            timeout=10,
+        )
+        if result.returncode != 0:
+            return None
+        return float(json.loads(result.stdout)["format"]["duration"])
+    except (subprocess.TimeoutExpired, OSError, KeyError, ValueError):
+        return None
+
+
+# 全域單例
+recording_index = RecordingIndex()
@@ -0,0 +1,314 @@
+# modules/storage/recording_sync.py
+"""
+錄影分段異地備份（R2 multipart upload）
+- 只處理已關檔、後處理結束的分段（可設定只備份有活動的分段）
+- 每段切成 part_size 的 part，以 concurrency 個執行緒平行上傳
+- upload_id / 進度記在 recording_index，重啟後以 list_parts 對帳，只補還沒上傳的 part
+- 全部上傳共用一個 token bucket 限速，避免塞滿上行頻寬影響 WebRTC 即時畫面
+
+R2 物件：recordings/{camera_id}/{YYYYMMDD}/{filename}
+"""
+from __future__ import annotations
+
+import io
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from botocore.exceptions import ClientError
+
+from modules.storage.cloudflare_r2 import CloudflareR2
+from modules.storage.recording_index import RecordingIndex, RecordingSegment, recording_index
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 ** 2
+MIN_PART_SIZE = 5 * MB  # S3 / R2 規定：除了最後一個 part 以外不得小於 5 MB
+
+
+@dataclass(frozen=True)
+class RecordingSyncConfig:
+    activity_only: bool = True           # 只備份有活動（進店 / 非營業時段偵測）的分段
+    max_mbps: float = 2.0                # 上傳頻寬上限（Mbit/s，0 = 不限）
+    part_size: int = 8 * MB
+    concurrency: int = 3                 # 同一段同時上傳的 part 數
+    batch_size: int = 10                 # 每輪最多處理段數
+    interval_sec: float = 60.0           # 沒有待備份分段時的檢查間隔
+    retry_sec: float = 300.0             # 上傳失敗後等多久再試
+    key_prefix: str = "recordings"
+    name: str = "RecordingSync"
+
+
+class TokenBucket:
+    """執行緒安全的 token bucket（1 token = 1 byte）"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst or max(rate, 256 * 1024)
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, n: int, stop: Optional[threading.Event] = None) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= n:
+                    self._tokens -= n
+                    return
+                wait = (n - self._tokens) / self.rate
+            if stop is not None:
+                if stop.wait(wait):
+                    return
+            else:
+                time.sleep(wait)
+
+
+class _ThrottledReader(io.RawIOBase):
+    """上傳 body：讀出的資料先向 token bucket 取得額度（停止中就不再等）"""
+
+    CHUNK = 64 * 1024
+
+    def __init__(self, data: bytes, bucket: TokenBucket, stop: threading.Event):
+        self._buf = io.BytesIO(data)
+        self._size = len(data)
+        self._bucket = bucket
+        self._stop = stop
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self._buf.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._buf.tell()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._buf.read(-1 if size is None else size)
+        for i in range(0, len(data), self.CHUNK):
+            self._bucket.consume(min(self.CHUNK, len(data) - i), self._stop)
+        return data
+
+    def __len__(self) -> int:
+        return self._size
+
+
+class RecordingSync:
+    """
+    用法：
+        sync = RecordingSync(RecordingSyncConfig(max_mbps=2.0), r2)
+        sync.start()
+        ...
+        sync.stop()
+    """
+
+    def __init__(self, cfg: RecordingSyncConfig, r2: CloudflareR2, index: Optional[RecordingIndex] = None):
+        if cfg.part_size < MIN_PART_SIZE:
+            raise ValueError(f"part_size must be >= {MIN_PART_SIZE}")
+        self.cfg = cfg
+        self.r2 = r2
+        self.index = index or recording_index
+        self.bucket = TokenBucket(cfg.max_mbps * 1_000_000 / 8)
+        self._stop = threading.Event()
+        self._t: Optional[threading.Thread] = None
+        self.synced = 0
+        self.failed = 0
+        self.bytes_sent = 0
+
+    def start(self) -> None:
+        if self._t and self._t.is_alive():
+            return
+        self._stop.clear()
+        self._t = threading.Thread(target=self._loop, name=self.cfg.name, daemon=True)
+        self._t.start()
+
+    def stop(self) -> None:
+        """中斷進行中的上傳（已完成的 part 保留，下次啟動續傳）"""
+        self._stop.set()
+        if self._t:
+            self._t.join(timeout=10.0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"synced": self.synced, "failed": self.failed, "bytes_sent": self.bytes_sent}
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                ok, processed = self.run_once()
+            except Exception:
+                logger.exception("%s run failed", self.cfg.name)
+                ok, processed = False, 0
+            if not ok:
+                wait = self.cfg.retry_sec
+            elif processed >= self.cfg.batch_size:
+                wait = 0.0
+            else:
+                wait = self.cfg.interval_sec
+            self._stop.wait(wait)
+
+    def run_once(self) -> tuple:
+        """備份一批分段，回傳 (是否都成功, 處理段數)；遇到失敗就停下這一輪（多半是網路問題）"""
+        segments = self.index.list_sync_candidates(self.cfg.batch_size, activity_only=self.cfg.activity_only)
+        for i, seg in enumerate(segments):
+            if self._stop.is_set():
+                return True, i
+            if not self.sync_segment(seg):
+                return False, i + 1
+        return True, len(segments)
+
+    # === 單一分段 ===
+
+    def remote_key(self, seg: RecordingSegment) -> str:
+        return f"{self.cfg.key_prefix}/{seg.camera_id}/{seg.date}/{seg.filename}"
+
+    def sync_segment(self, seg: RecordingSegment) -> bool:
+        path = Path(seg.path)
+        if not path.exists():
+            # 已被保留策略刪除
+            self._abort(seg)
+            self.index.set_remote_state(path, "missing")
+            return True
+
+        key = self.remote_key(seg)
+        size = path.stat().st_size
+        t0 = time.perf_counter()
+        try:
+            upload_id, done = self._resume_or_create(seg, key)
+            parts = self._upload_parts(path, key, upload_id, size, done)
+            if parts is None:
+                return True  # 停止中，下次續傳
+            resp = self.r2.get_client().complete_multipart_upload(
+                Bucket=self.r2.cfg.bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+            self.r2.index_object(key, size, resp.get("ETag"))
+        except FileNotFoundError:
+            self._abort(seg)
+            self.index.set_remote_state(path, "missing")
+            return True
+        except Exception:
+            logger.exception("%s upload failed: %s", self.cfg.name, key)
+            self.failed += 1
+            # 保留 upload_id，下次從已完成的 part 接著傳
+            state = self.index.get_remote_state(path)
+            self.index.set_remote_state(path, "failed", upload_id=state[1] if state else None)
+            return False
+
+        self.index.set_remote_state(path, "synced", uploaded_bytes=size)
+        self.synced += 1
+        elapsed = time.perf_counter() - t0
+        logger.info("%s synced %s (%.1f MB in %.1fs)", self.cfg.name, key, size / MB, elapsed)
+        return True
+
+    def _resume_or_create(self, seg: RecordingSegment, key: str):
+        """回傳 (upload_id, {part_number: etag})；之前的 upload 還在就沿用已完成的 part"""
+        s3 = self.r2.get_client()
+        path = Path(seg.path)
+        state = self.index.get_remote_state(path)
+        if state and state[0] == key and state[1]:
+            upload_id = state[1]
+            try:
+                done = self._list_parts(key, upload_id)
+                logger.info("%s resuming %s (%d parts done)", self.cfg.name, key, len(done))
+                return upload_id, done
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") != "NoSuchUpload":
+                    raise
+                # 已過期 / 被清掉 → 重新開始
+
+        upload_id = s3.create_multipart_upload(
+            Bucket=self.r2.cfg.bucket, Key=key, ContentType="video/mp4",
+        )["UploadId"]
+        self.index.set_remote_state(path, "uploading", remote_key=key, upload_id=upload_id, uploaded_bytes=0)
+        return upload_id, {}
+
+    def _list_parts(self, key: str, upload_id: str) -> Dict[int, Dict[str, Any]]:
+        s3 = self.r2.get_client()
+        done: Dict[int, Dict[str, Any]] = {}
+        kwargs: Dict[str, Any] = {"Bucket": self.r2.cfg.bucket, "Key": key, "UploadId": upload_id}
+        while True:
+            resp = s3.list_parts(**kwargs)
+            for part in resp.get("Parts", []):
+                done[part["PartNumber"]] = {"ETag": part["ETag"], "Size": part["Size"]}
+            if not resp.get("IsTruncated"):
+                return done
+            kwargs["PartNumberMarker"] = resp["NextPartNumberMarker"]
+
+    def _upload_parts(
+        self,
+        path: Path,
+        key: str,
+        upload_id: str,
+        size: int,
+        done: Dict[int, Dict[str, Any]],
+    ) -> Optional[List[Dict[str, Any]]]:
+        """平行上傳還沒完成的 part；回傳 complete 用的 part 清單（停止中回傳 None）"""
+        part_size = self.cfg.part_size
+        count = max(1, -(-size // part_size))
+        etags: Dict[int, str] = {}
+        todo = []
+        for number in range(1, count + 1):
+            expected = min(part_size, size - (number - 1) * part_size)
+            prev = done.get(number)
+            if prev and prev["Size"] == expected:
+                etags[number] = prev["ETag"]
+            else:
+                todo.append(number)
+
+        lock = threading.Lock()
+        uploaded = [sum(done[n]["Size"] for n in etags)]
+        s3 = self.r2.get_client()
+
+        def upload(number: int) -> None:
+            if self._stop.is_set():
+                return
+            with path.open("rb") as f:
+                f.seek((number - 1) * part_size)
+                data = f.read(part_size)
+            resp = s3.upload_part(
+                Bucket=self.r2.cfg.bucket,
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=number,
+                Body=_ThrottledReader(data, self.bucket, self._stop),
+                ContentLength=len(data),
+            )
+            with lock:
+                etags[number] = resp["ETag"]
+                uploaded[0] += len(data)
+                self.bytes_sent += len(data)
+                progress = uploaded[0]
+            self.index.set_remote_state(path, "uploading", upload_id=upload_id, uploaded_bytes=progress)
+
+        with ThreadPoolExecutor(max_workers=self.cfg.concurrency, thread_name_prefix=self.cfg.name) as pool:
+            for future in [pool.submit(upload, n) for n in todo]:
+                future.result()
+
+        if self._stop.is_set() or len(etags) < count:
+            return None
+        return [{"PartNumber": n, "ETag": etags[n]} for n in sorted(etags)]
+
+    def _abort(self, seg: RecordingSegment) -> None:
+        state = self.index.get_remote_state(Path(seg.path))
+        if not state or not state[1]:
+            return
+        try:
+            self.r2.get_client().abort_multipart_upload(
+                Bucket=self.r2.cfg.bucket, Key=state[0], UploadId=state[1],
+            )
+        except Exception:
+            logger.warning("%s abort failed for %s", self.cfg.name, state[0])
@@ -0,0 +1,226 @@
+# modules/storage/retention.py
+"""
+錄影保留策略（在 server 內背景執行，取代外部排程的 cleanup_recordings.py）
+- 每台攝影機有總容量上限，超過就從最舊的分段開始刪
+- 無活動的分段保留 keep_days，有活動（進店 / 非營業時段偵測）保留 activity_keep_days
+- 磁碟剩餘空間低於 min_free_bytes 時，不論天數都刪最舊的
+- 有開 R2 備份時，到期 / 超過容量只刪已備份的分段；磁碟空間不足時例外（避免錄影寫不進去）
+- 容量 / 磁碟空間不足時依時間排序，有活動的分段視為晚了兩種保留天數的差距
+- 每輪最多刪 batch_size 段，每段之間暫停一下，避免 I/O 尖峰
+- 整天播放清單在一輪刪完後，每個日期目錄只重建一次
+"""
+from __future__ import annotations
+
+import shutil
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional, Set
+
+from modules.storage.recording_index import RecordingIndex, RecordingSegment, recording_index
+from modules.storage.visitor_db import VisitorDB, visitor_db
+from modules.video.hls_playlist import rebuild_day_playlist
+
+logger = logging.getLogger(__name__)
+
+GB = 1024 ** 3
+
+
+@dataclass(frozen=True)
+class RetentionConfig:
+    root: Path                            # recordings 根目錄（用來查磁碟剩餘空間）
+    keep_days: int = 10                   # 無活動分段保留天數
+    activity_keep_days: int = 30          # 有活動分段保留天數
+    max_bytes_per_camera: int = 0         # 每台攝影機容量上限（0 = 不限制）
+    min_free_bytes: int = 5 * GB          # 磁碟至少保留的剩餘空間
+    interval_sec: float = 300.0           # 檢查間隔
+    batch_size: int = 20                  # 每輪最多刪除段數
+    batch_pause_sec: float = 0.2          # 每段刪除之間的暫停
+    require_synced: bool = False          # 到期 / 超過容量只刪已備份到 R2 的分段
+    sync_activity_only: bool = False      # R2 只備份有活動的分段（無活動的分段不必等備份）
+    name: str = "RetentionManager"
+
+
+class RetentionManager:
+    """
+    用法：
+        mgr = RetentionManager(RetentionConfig(root=Path("recordings")))
+        mgr.start()
+        ...
+        mgr.stop()
+    """
+
+    def __init__(
+        self,
+        cfg: RetentionConfig,
+        index: Optional[RecordingIndex] = None,
+        db: Optional[VisitorDB] = None,
+    ):
+        self.cfg = cfg
+        self.index = index or recording_index
+        self.db = db or visitor_db
+        self._stop = threading.Event()
+        self._t: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._t and self._t.is_alive():
+            return
+        self._stop.clear()
+        self._t = threading.Thread(target=self._loop, name=self.cfg.name, daemon=True)
+        self._t.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._t:
+            self._t.join(timeout=5.0)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                deleted = self.run_once()
+            except Exception:
+                logger.exception("%s run failed", self.cfg.name)
+                deleted = 0
+
+            # 還有沒刪完的就很快再跑一輪，否則等下一個週期
+            wait = self.cfg.batch_pause_sec if deleted >= self.cfg.batch_size else self.cfg.interval_sec
+            self._stop.wait(wait)
+
+    # === 策略 ===
+
+    def run_once(self) -> int:
+        """執行一輪保留策略，回傳刪除段數（最多 batch_size）"""
+        budget = self.cfg.batch_size
+        deleted = 0
+        date_dirs: Set[Path] = set()
+
+        try:
+            for picker in (self._pick_low_disk, self._pick_over_quota, self._pick_expired):
+                if deleted >= budget:
+                    break
+                for seg in picker(budget - deleted):
+                    if self._stop.is_set():
+                        return deleted
+                    date_dir = self._delete_segment(seg)
+                    if date_dir is not None:
+                        date_dirs.add(date_dir)
+                    deleted += 1
+                    self._stop.wait(self.cfg.batch_pause_sec)
+        finally:
+            for date_dir in date_dirs:
+                _refresh_date_dir(date_dir)
+
+        if deleted:
+            logger.info("Retention deleted %d segments", deleted)
+        return deleted
+
+    def _pick_low_disk(self, limit: int) -> List[RecordingSegment]:
+        """磁碟空間不足：估算需要釋放多少，挑最舊的（緊急狀況，不等 R2 備份）"""
+        if not self.cfg.min_free_bytes or not self.cfg.root.exists():
+            return []
+        free = shutil.disk_usage(self.cfg.root).free
+        need = self.cfg.min_free_bytes - free
+        if need <= 0:
+            return []
+
+        logger.warning(
+            "Disk free %.1f GB below %.1f GB, freeing recordings",
+            free / GB, self.cfg.min_free_bytes / GB,
+        )
+        return _take_until(
+            self.index.retention_candidates(limit, activity_weight_sec=self._activity_weight_sec()),
+            need,
+        )
+
+    def _pick_over_quota(self, limit: int) -> List[RecordingSegment]:
+        """單一攝影機超過容量上限"""
+        if not self.cfg.max_bytes_per_camera:
+            return []
+
+        picked: List[RecordingSegment] = []
+        for camera_id, used in self.index.camera_usage().items():
+            over = used - self.cfg.max_bytes_per_camera
+            if over <= 0 or len(picked) >= limit:
+                continue
+            candidates = self.index.retention_candidates(
+                limit - len(picked),
+                camera_id=camera_id,
+                activity_weight_sec=self._activity_weight_sec(),
+                require_synced=self.cfg.require_synced,
+                sync_activity_only=self.cfg.sync_activity_only,
+            )
+            picked.extend(_take_until(candidates, over))
+        return picked
+
+    def _activity_weight_sec(self) -> float:
+        return max(0, self.cfg.activity_keep_days - self.cfg.keep_days) * 86400.0
+
+    def _pick_expired(self, limit: int) -> List[RecordingSegment]:
+        """超過保留天數（有活動的分段保留較久）"""
+        now = datetime.now()
+        picked = self.index.retention_candidates(
+            limit,
+            before=now - timedelta(days=self.cfg.keep_days),
+            has_activity=False,
+            require_synced=self.cfg.require_synced,
+            sync_activity_only=self.cfg.sync_activity_only,
+        )
+        if len(picked) < limit:
+            picked += self.index.retention_candidates(
+                limit - len(picked),
+                before=now - timedelta(days=self.cfg.activity_keep_days),
+                has_activity=True,
+                require_synced=self.cfg.require_synced,
+                sync_activity_only=self.cfg.sync_activity_only,
+            )
+        return picked
+
+    # === 刪除 ===
+
+    def _delete_segment(self, seg: RecordingSegment) -> Optional[Path]:
+        """刪除 MP4 + 同名 HLS 目錄，並移出索引；回傳需要重建播放清單的日期目錄（刪除失敗回傳 None）"""
+        mp4_path = Path(seg.path)
+        hls_dir = mp4_path.with_suffix("")
+        try:
+            mp4_path.unlink(missing_ok=True)
+            if hls_dir.is_dir():
+                shutil.rmtree(hls_dir)
+        except OSError:
+            logger.exception("Retention failed to delete %s", mp4_path)
+            return None
+
+        self.index.delete_segment(mp4_path)
+        logger.debug("Retention deleted %s (activity=%s)", seg.filename, seg.has_activity)
+
+        # 進店事件不再指向已刪除的分段
+        try:
+            self.db.clear_recording_links(
+                seg.camera_id, seg.filename, seg.start_time, seg.end_time or datetime.max,
+            )
+        except Exception:
+            logger.exception("Retention failed to unlink visitor entries: %s", seg.filename)
+        return mp4_path.parent
+
+
+def _refresh_date_dir(date_dir: Path) -> None:
+    """整天播放清單移除已刪分段；日期目錄清空後一併移除"""
+    try:
+        rebuild_day_playlist(date_dir)
+        if date_dir.is_dir() and not any(date_dir.iterdir()):
+            date_dir.rmdir()
+    except OSError:
+        pass
+
+
+def _take_until(segments: List[RecordingSegment], need_bytes: int) -> List[RecordingSegment]:
+    """依序取分段，直到累計大小 >= need_bytes"""
+    picked: List[RecordingSegment] = []
+    freed = 0
+    for seg in segments:
+        if freed >= need_bytes:
+            break
+        picked.append(seg)
+        freed += (seg.size_bytes or 0) + (seg.hls_bytes or 0)
+    return picked
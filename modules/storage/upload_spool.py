@@ -0,0 +1,242 @@
+# modules/storage/upload_spool.py
+"""
+R2 離線上傳暫存區（磁碟）
+- 上傳佇列重試用完、或已知網路中斷時，把內容寫進本機目錄，不丟掉截圖
+- 背景執行緒分批補傳：成功就刪檔，一失敗就停下這批並指數退避（網路通常還沒恢復）
+- 有總大小與保存天數上限，超過時從最舊的開始丟
+- key 在進暫存區時就決定 → public url 立刻可知，補傳後同一個網址即可開啟
+
+檔案結構（每筆兩個檔，.json 存在才算寫完整）：
+data/upload_spool/
+├── 1760000000123-3f2a9c1b.bin
+└── 1760000000123-3f2a9c1b.json    # {"key", "content_type", "created", "attempts"}
+"""
+from __future__ import annotations
+
+import json
+import time
+import uuid
+import shutil
+import logging
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from modules.storage.cloudflare_r2 import CloudflareR2
+
+logger = logging.getLogger(__name__)
+
+SPOOL_DIR = Path(__file__).parent.parent.parent / "data" / "upload_spool"
+MB = 1024 ** 2
+
+
+@dataclass(frozen=True)
+class UploadSpoolConfig:
+    root: Path = SPOOL_DIR
+    max_bytes: int = 500 * MB            # 暫存區總大小上限
+    max_age_days: float = 7              # 超過就放棄補傳
+    batch_size: int = 20                 # 每輪最多補傳筆數
+    retry_base_sec: float = 30.0         # 補傳失敗後的等待（每次失敗加倍）
+    retry_max_sec: float = 900.0
+    idle_sec: float = 60.0               # 暫存區空的時候多久檢查一次
+    name: str = "UploadSpool"
+
+
+class UploadSpool:
+    """
+    用法：
+        spool = UploadSpool(UploadSpoolConfig(), r2)
+        spool.start()
+        url = spool.put_bytes(jpg, key, "image/jpeg")   # 之後自動補傳
+        ...
+        spool.stop()
+    """
+
+    def __init__(self, cfg: UploadSpoolConfig, r2: CloudflareR2):
+        self.cfg = cfg
+        self.r2 = r2
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._t: Optional[threading.Thread] = None
+        self._backoff = 0.0
+        self._last_failure = 0.0             # monotonic；0 = 最近一次補傳成功
+        self.uploaded = 0
+        self.expired = 0
+        self.evicted = 0
+        self.cfg.root.mkdir(parents=True, exist_ok=True)
+
+    def start(self) -> None:
+        if self._t and self._t.is_alive():
+            return
+        self._stop.clear()
+        self._t = threading.Thread(target=self._loop, name=self.cfg.name, daemon=True)
+        self._t.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._t:
+            self._t.join(timeout=10.0)
+
+    # === 寫入 ===
+
+    def put_bytes(self, data: bytes, key: str, content_type: Optional[str] = None) -> str:
+        """寫進暫存區，回傳補傳後的 public url"""
+        def write(path: Path) -> None:
+            path.write_bytes(data)
+        return self._put(write, len(data), key, content_type)
+
+    def put_file(self, filepath: Union[str, Path], key: str) -> str:
+        filepath = Path(filepath)
+        return self._put(lambda path: shutil.copyfile(filepath, path), filepath.stat().st_size, key, None)
+
+    def _put(self, write, size: int, key: str, content_type: Optional[str]) -> str:
+        if size > self.cfg.max_bytes:
+            raise ValueError(f"Spool item too large: {size} bytes")
+        stem = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+        data_path = self.cfg.root / f"{stem}.bin"
+        meta_path = self.cfg.root / f"{stem}.json"
+        with self._lock:
+            self._make_room(size)
+            tmp_path = data_path.with_suffix(".bin.tmp")
+            write(tmp_path)
+            tmp_path.replace(data_path)
+            _write_meta(meta_path, {
+                "key": key,
+                "content_type": content_type,
+                "created": time.time(),
+                "attempts": 0,
+            })
+        logger.info("%s queued %s (%d bytes)", self.cfg.name, key, size)
+        if not self.offline():   # 退避中就等時間到，不因新項目提早重試
+            self._wake.set()
+        return self.r2.public_url(key)
+
+    def _make_room(self, size: int) -> None:
+        """持鎖時呼叫：超過總大小時從最舊的開始丟"""
+        entries = self._entries()
+        total = sum(p.stat().st_size for p, _ in entries)
+        for data_path, meta_path in entries:
+            if total + size <= self.cfg.max_bytes:
+                break
+            total -= data_path.stat().st_size
+            self._remove(data_path, meta_path)
+            self.evicted += 1
+            logger.warning("%s full, dropped %s", self.cfg.name, data_path.name)
+
+    # === 狀態 ===
+
+    def offline(self) -> bool:
+        """最近補傳失敗、且還在退避中 → 呼叫端可以直接寫暫存區，不必再等逾時"""
+        return self._last_failure > 0 and time.monotonic() - self._last_failure < self._backoff
+
+    def stats(self) -> Dict[str, Any]:
+        entries = self._entries()
+        oldest = entries[0][0].stem.split("-")[0] if entries else None
+        return {
+            "depth": len(entries),
+            "bytes": sum(p.stat().st_size for p, _ in entries if p.exists()),
+            "oldest_age_sec": round(time.time() - int(oldest) / 1000) if oldest else None,
+            "offline": self.offline(),
+            "uploaded": self.uploaded,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+    def _entries(self) -> List[Tuple[Path, Path]]:
+        """完整寫入的項目（舊 → 新）"""
+        return [
+            (meta_path.with_suffix(".bin"), meta_path)
+            for meta_path in sorted(self.cfg.root.glob("*.json"))
+            if meta_path.with_suffix(".bin").exists()
+        ]
+
+    @staticmethod
+    def _remove(data_path: Path, meta_path: Path) -> None:
+        meta_path.unlink(missing_ok=True)
+        data_path.unlink(missing_ok=True)
+
+    # === 補傳 ===
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                remaining = self.drain_once()
+            except Exception:
+                logger.exception("%s drain failed", self.cfg.name)
+                remaining = 0
+            if self._last_failure:
+                wait = self._backoff
+            elif remaining:
+                wait = 0.0
+            else:
+                wait = self.cfg.idle_sec
+            self._wake.wait(wait)
+            self._wake.clear()
+
+    def drain_once(self) -> int:
+        """補傳一批，回傳剩餘筆數"""
+        entries = self._entries()
+        self._expire(entries)
+        entries = self._entries()
+
+        for data_path, meta_path in entries[:self.cfg.batch_size]:
+            if self._stop.is_set():
+                break
+            try:
+                meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                logger.warning("%s unreadable entry, dropped: %s", self.cfg.name, meta_path.name)
+                self._remove(data_path, meta_path)
+                continue
+
+            try:
+                if meta.get("content_type"):
+                    self.r2.upload_bytes(data_path.read_bytes(), key=meta["key"], content_type=meta["content_type"])
+                else:
+                    self.r2.upload_file(data_path, key=meta["key"])
+            except Exception as e:
+                meta["attempts"] = meta.get("attempts", 0) + 1
+                _write_meta(meta_path, meta)
+                self._backoff = min(self.cfg.retry_max_sec, max(self.cfg.retry_base_sec, self._backoff * 2))
+                self._last_failure = time.monotonic()
+                logger.warning("%s retry failed (%s), next in %.0fs: %s",
+                               self.cfg.name, meta["key"], self._backoff, e)
+                return len(entries)
+
+            with self._lock:
+                self._remove(data_path, meta_path)
+            self.uploaded += 1
+            self._backoff = 0.0
+            self._last_failure = 0.0
+            logger.info("%s uploaded %s (after %d failed attempt(s))",
+                        self.cfg.name, meta["key"], meta.get("attempts", 0))
+
+        return max(0, len(entries) - self.cfg.batch_size)
+
+    def _expire(self, entries: List[Tuple[Path, Path]]) -> None:
+        # 寫到一半中斷留下的檔案
+        stale = time.time() - 600
+        for path in self.cfg.root.glob("*.tmp"):
+            if path.stat().st_mtime < stale:
+                path.unlink(missing_ok=True)
+        for path in self.cfg.root.glob("*.bin"):
+            if not path.with_suffix(".json").exists() and path.stat().st_mtime < stale:
+                path.unlink(missing_ok=True)
+
+        cutoff_ms = (time.time() - self.cfg.max_age_days * 86400) * 1000
+        for data_path, meta_path in entries:
+            if int(data_path.stem.split("-")[0]) >= cutoff_ms:
+                break
+            with self._lock:
+                self._remove(data_path, meta_path)
+            self.expired += 1
+            logger.warning("%s expired %s", self.cfg.name, data_path.name)
+
+
+def _write_meta(path: Path, meta: Dict[str, Any]) -> None:
+    tmp_path = path.with_suffix(".json.tmp")
+    tmp_path.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+    tmp_path.replace(path)
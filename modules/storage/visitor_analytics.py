@@ -0,0 +1,211 @@
+# modules/storage/visitor_analytics.py
+"""
+長區間訪客分析（polars 向量化）
+- 以「月」為分區，第一次用到時從 visitor_entries 載入成 DataFrame 並快取
+- 已結束的月份不會再變；有新事件寫入時只丟掉該日期所在的分區
+- 分區數 / 總筆數有上限，超過時淘汰最久沒用的分區（LRU）
+- 週間型態、時段型態、年同期比較都是對快取分區做 group_by，不逐筆建 Row
+
+用法：
+    from modules.storage.visitor_analytics import visitor_analytics
+    visitor_analytics.weekly_pattern(date(2025, 1, 1), date(2025, 12, 31))
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import polars as pl
+
+from modules.storage.visitor_db import VisitorDB, visitor_db
+
+logger = logging.getLogger(__name__)
+
+PARTITION_SCHEMA = {
+    "ts": pl.Datetime("us"),
+    "camera_id": pl.String,
+}
+
+Partition = Tuple[int, int]  # (year, month)
+
+
+class VisitorAnalytics:
+    def __init__(
+        self,
+        db: VisitorDB,
+        max_partitions: int = 60,      # 5 年份的月分區
+        max_rows: int = 5_000_000,     # 所有快取分區的總筆數上限
+    ):
+        self.db = db
+        self.max_partitions = max_partitions
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._frames: "OrderedDict[Partition, pl.DataFrame]" = OrderedDict()
+        self._rows = 0
+        self._invalidated: Dict[Partition, int] = {}   # 分區被丟掉的次數（載入期間被寫入就不放進快取）
+        self.loads = 0
+        db.add_write_listener(self.invalidate_dates)
+
+    # === 分區快取 ===
+
+    def frame(self, start: date, end: date) -> pl.DataFrame:
+        """[start, end] 的事件（ts 為本地時間），由各月分區串接後篩選"""
+        parts = [self._partition(p) for p in _months(start, end)]
+        df = pl.concat(parts, rechunk=False) if parts else pl.DataFrame(schema=PARTITION_SCHEMA)
+        return df.filter(pl.col("ts").is_between(
+            datetime.combine(start, datetime.min.time()),
+            datetime.combine(end + timedelta(days=1), datetime.min.time()),
+            closed="left",
+        ))
+
+    def _partition(self, key: Partition) -> pl.DataFrame:
+        with self._lock:
+            df = self._frames.get(key)
+            if df is not None:
+                self._frames.move_to_end(key)
+                return df
+
+        # 同時只載入一個分區，避免多個請求重複讀同一個月
+        with self._load_lock:
+            with self._lock:
+                df = self._frames.get(key)
+                if df is not None:
+                    return df
+                generation = self._invalidated.get(key, 0)
+            df = self._load(key)
+            with self._lock:
+                if self._invalidated.get(key, 0) == generation:
+                    self._frames[key] = df
+                    self._rows += df.height
+                    self._evict()
+        return df
+
+    def _load(self, key: Partition) -> pl.DataFrame:
+        year, month = key
+        start = datetime(year, month, 1)
+        end = datetime(year + month // 12, month % 12 + 1, 1)
+        rows = self.db.get_entry_rows(start, end)
+        self.loads += 1
+        logger.debug("Visitor analytics partition %04d-%02d loaded: %d rows", year, month, len(rows))
+        if not rows:
+            return pl.DataFrame(schema=PARTITION_SCHEMA)
+
+        times, cameras = zip(*rows)
+        return pl.DataFrame({
+            # ISO 字串前 19 碼固定為 YYYY-MM-DDTHH:MM:SS（本地時間），小數秒不需要
+            "ts": pl.Series(times, dtype=pl.String).str.slice(0, 19).str.strptime(
+                pl.Datetime("us"), "%Y-%m-%dT%H:%M:%S"
+            ),
+            "camera_id": pl.Series(cameras, dtype=pl.String),
+        })
+
+    def _evict(self) -> None:
+        """持鎖時呼叫；至少保留最新載入的分區"""
+        while len(self._frames) > 1 and (len(self._frames) > self.max_partitions or self._rows > self.max_rows):
+            _, old = self._frames.popitem(last=False)
+            self._rows -= old.height
+
+    def invalidate_dates(self, dates: Optional[Iterable[date]]) -> None:
+        """VisitorDB 寫入通知：丟掉受影響的月分區（None = 全部）"""
+        with self._lock:
+            keys = set(self._frames) | set(self._invalidated) if dates is None else {(d.year, d.month) for d in dates}
+            for key in keys:
+                self._invalidated[key] = self._invalidated.get(key, 0) + 1
+                old = self._frames.pop(key, None)
+                if old is not None:
+                    self._rows -= old.height
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"partitions": len(self._frames), "rows": self._rows, "loads": self.loads}
+
+    # === 分析查詢 ===
+
+    def weekly_pattern(self, start: date, end: date, camera_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        週間 × 時段型態（平均每天的人次）
+        - weekday: 週一..週日 平均每天人次
+        - hour: 0..23 點平均每天人次
+        - matrix: [weekday][hour] 平均人次
+        平均的分母是區間內該星期幾的「日曆天數」（沒人來的日子也算）
+        """
+        df = self._filter_camera(self.frame(start, end), camera_id)
+        days = pl.date_range(start, end, "1d", eager=True)
+        days_per_weekday = [0] * 7
+        for wd, n in days.dt.weekday().value_counts().iter_rows():
+            days_per_weekday[wd - 1] = n
+        total_days = len(days)
+
+        counts = (
+            df.group_by(
+                (pl.col("ts").dt.weekday() - 1).alias("weekday"),
+                pl.col("ts").dt.hour().alias("hour"),
+            )
+            .len()
+        )
+        matrix = [[0.0] * 24 for _ in range(7)]
+        by_weekday = [0] * 7
+        by_hour = [0] * 24
+        for wd, hour, n in counts.iter_rows():
+            matrix[wd][hour] = round(n / days_per_weekday[wd], 2) if days_per_weekday[wd] else 0.0
+            by_weekday[wd] += n
+            by_hour[hour] += n
+
+        return {
+            "weekday": [round(n / d, 1) if d else 0.0 for n, d in zip(by_weekday, days_per_weekday)],
+            "hour": [round(n / total_days, 2) if total_days else 0.0 for n in by_hour],
+            "matrix": matrix,
+        }
+
+    def year_over_year(
+        self,
+        years: int = 2,
+        granularity: str = "month",
+        today: Optional[date] = None,
+        camera_id: Optional[str] = None,
+    ) -> Dict[int, List[int]]:
+        """
+        近 N 年（含今年）每月 / 每 ISO 週的人次，{year: [count, ...]}
+        month → 12 格；week → 53 格（ISO 週數）
+        """
+        if granularity not in ("month", "week"):
+            raise ValueError(f"Unsupported granularity: {granularity}")
+        today = today or date.today()
+        first_year = today.year - years + 1
+        df = self._filter_camera(self.frame(date(first_year, 1, 1), today), camera_id)
+
+        if granularity == "month":
+            period = pl.col("ts").dt.month().alias("period")
+            year = pl.col("ts").dt.year().alias("year")
+            slots = 12
+        else:
+            period = pl.col("ts").dt.week().alias("period")
+            year = pl.col("ts").dt.iso_year().alias("year")
+            slots = 53
+
+        result = {y: [0] * slots for y in range(first_year, today.year + 1)}
+        for y, p, n in df.group_by(year, period).len().iter_rows():
+            if y in result:
+                result[y][p - 1] = n
+        return result
+
+    @staticmethod
+    def _filter_camera(df: pl.DataFrame, camera_id: Optional[str]) -> pl.DataFrame:
+        return df if camera_id is None else df.filter(pl.col("camera_id") == camera_id)
+
+
+def _months(start: date, end: date) -> List[Partition]:
+    months = []
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+# 全域單例
+visitor_analytics = VisitorAnalytics(visitor_db)
@@ -0,0 +1,231 @@
+# modules/storage/visitor_archive.py
+"""
+訪客事件冷熱分層
+- 超過 keep_days 的完整月份，把 visitor_entries 原始事件搬到每月一個 zstd Parquet 檔
+- 彙總表（visitor_rollups / daily_stats）留在 SQLite，dashboard 不受影響
+- 搬完後以 incremental vacuum 分批把空間還給檔案系統，visitors.db 維持在熱資料的大小
+- VisitorDB 的原始事件查詢（依日期 / 分頁 / 匯出 / 長區間分析）自動合併已封存月份
+
+檔案結構：
+data/archive/visitors/entries-2024-01.parquet
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import polars as pl
+
+from modules.storage.visitor_db import ColdEntryRow, EntryCursor, VisitorDB, to_epoch_ms, visitor_db
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = Path(__file__).parent.parent.parent / "data" / "archive" / "visitors"
+
+ARCHIVE_SCHEMA = {
+    "id": pl.Int64,
+    "entry_time": pl.String,      # 與 SQLite 相同的本地時間 ISO 字串（排序 / 游標分頁一致）
+    "entry_ts": pl.Int64,
+    "camera_id": pl.String,
+    "segment_file": pl.String,
+    "offset_sec": pl.Float64,
+    "zone": pl.String,
+}  # 欄位順序同 ARCHIVE_COLUMNS
+
+
+class VisitorArchive:
+    """封存檔讀寫（ColdEntryReader 實作）"""
+
+    def __init__(self, db: VisitorDB, root: Path = ARCHIVE_DIR):
+        self.db = db
+        self.root = root
+        db.attach_archive(self)
+
+    def month_path(self, month: str) -> Path:
+        return self.root / f"entries-{month}.parquet"
+
+    # === 讀取（VisitorDB 查詢時呼叫）===
+
+    def read_entries(
+        self,
+        months: Sequence[str],
+        start: datetime,
+        end: datetime,
+        camera_id: Optional[str] = None,
+        after: Optional[EntryCursor] = None,
+        limit: Optional[int] = None,
+        by_ts: bool = False,
+    ) -> List[ColdEntryRow]:
+        """by_ts=True 時以 (entry_ts, id) 篩選 / 排序，第一欄回傳 entry_ts（與熱資料的整數游標一致）"""
+        files = [p for p in map(self.month_path, months) if p.exists()]
+        if not files:
+            return []
+
+        key = "entry_ts" if by_ts else "entry_time"
+        lo, hi = (to_epoch_ms(start), to_epoch_ms(end)) if by_ts else (start.isoformat(), end.isoformat())
+        lf = pl.scan_parquet(files).filter((pl.col(key) >= lo) & (pl.col(key) < hi))
+        if camera_id is not None:
+            lf = lf.filter(pl.col("camera_id") == camera_id)
+        if after is not None:
+            lf = lf.filter(
+                (pl.col(key) > after[0])
+                | ((pl.col(key) == after[0]) & (pl.col("id") > after[1]))
+            )
+        lf = lf.sort(key, "id")
+        if limit is not None:
+            lf = lf.head(limit)
+        return lf.select(key, "camera_id", "segment_file", "offset_sec", "id").collect().rows()
+
+    def rollup_rows(self, months: Sequence[str]) -> List[Tuple[str, str, str, int]]:
+        """封存事件在各粒度彙總表的 (granularity, bucket, camera_id, count)，重建彙總表用"""
+        files = [p for p in map(self.month_path, months) if p.exists()]
+        if not files:
+            return []
+
+        ts = pl.col("entry_time").str.slice(0, 19).str.strptime(pl.Datetime("us"), "%Y-%m-%dT%H:%M:%S")
+        day = ts.dt.date()
+        buckets = {
+            "hour": ts.dt.strftime("%Y-%m-%d %H"),
+            "day": day.dt.strftime("%Y-%m-%d"),
+            "week": (day - pl.duration(days=ts.dt.weekday() - 1)).dt.strftime("%Y-%m-%d"),
+            "month": ts.dt.strftime("%Y-%m"),
+            "month_hour": ts.dt.strftime("%Y-%m %H"),
+        }
+        df = pl.scan_parquet(files).select(
+            pl.col("camera_id").fill_null(""),
+            **{name: expr for name, expr in buckets.items()},
+        ).collect()
+
+        rows: List[Tuple[str, str, str, int]] = []
+        for granularity in buckets:
+            counts = df.group_by(granularity, "camera_id").len()
+            rows += [(granularity, bucket, cam, n) for bucket, cam, n in counts.iter_rows()]
+        return rows
+
+    # === 封存 ===
+
+    def archive_month(self, month: str) -> int:
+        """把某月份的熱資料併進封存檔（先寫檔、再刪熱資料），回傳搬移筆數"""
+        rows = self.db.get_month_rows(month)
+        if not rows:
+            return 0
+        # entry_ts 還沒補齊的列在這裡換算，封存檔一律有 entry_ts（整數游標分頁用）
+        rows = [
+            r if r[2] is not None else (r[0], r[1], to_epoch_ms(datetime.fromisoformat(r[1])), *r[3:])
+            for r in rows
+        ]
+
+        df = pl.DataFrame(rows, schema=ARCHIVE_SCHEMA, orient="row")
+        path = self.month_path(month)
+        if path.exists():
+            # 之前封存過（之後又匯入了該月的舊資料）→ 合併；id 重複表示上次刪除前中斷
+            df = pl.concat([pl.read_parquet(path), df]).unique("id", keep="last")
+        df = df.sort("entry_time", "id")
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".parquet.tmp")
+        df.write_parquet(tmp_path, compression="zstd", compression_level=9, statistics=True)
+        if pl.scan_parquet(tmp_path).select(pl.len()).collect().item() != df.height:
+            tmp_path.unlink(missing_ok=True)
+            raise RuntimeError(f"Archive verification failed: {path}")
+        tmp_path.replace(path)
+
+        deleted = self.db.complete_archive(month, max_id=max(r[0] for r in rows), rows=df.height)
+        logger.info("Visitor entries %s archived: %d rows (%d KB)", month, deleted, path.stat().st_size // 1024)
+        return deleted
+
+    def stats(self) -> Dict[str, Any]:
+        files = sorted(self.root.glob("entries-*.parquet")) if self.root.is_dir() else []
+        return {
+            "months": len(files),
+            "bytes": sum(p.stat().st_size for p in files),
+        }
+
+
+@dataclass(frozen=True)
+class VisitorArchiverConfig:
+    keep_days: int = 365                 # 原始事件在 SQLite 保留天數（以完整月份為單位搬移）
+    interval_sec: float = 6 * 3600       # 檢查間隔
+    vacuum_pages: int = 2000             # 每次 incremental vacuum 釋放的頁數（4KB/頁）
+    vacuum_pause_sec: float = 0.5
+    name: str = "VisitorArchiver"
+
+
+class VisitorArchiver:
+    """
+    用法：
+        archiver = VisitorArchiver(VisitorArchiverConfig(keep_days=365))
+        archiver.start()
+        ...
+        archiver.stop()
+    """
+
+    def __init__(self, cfg: VisitorArchiverConfig, archive: Optional[VisitorArchive] = None):
+        self.cfg = cfg
+        self.archive = archive or visitor_archive
+        self._stop = threading.Event()
+        self._t: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._t and self._t.is_alive():
+            return
+        self._stop.clear()
+        self._t = threading.Thread(target=self._loop, name=self.cfg.name, daemon=True)
+        self._t.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._t:
+            self._t.join(timeout=10.0)
+
+    def _loop(self) -> None:
+        # 啟動後稍等，避開開機時的索引補建
+        if self._stop.wait(60.0):
+            return
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("%s run failed", self.cfg.name)
+            self._stop.wait(self.cfg.interval_sec)
+
+    def run_once(self, today: Optional[date] = None) -> int:
+        """封存到期的月份並釋放空間，回傳搬移筆數"""
+        cutoff = (today or date.today()) - timedelta(days=self.cfg.keep_days)
+        moved = 0
+        for month in self.archive.db.archive_candidates(cutoff):
+            if self._stop.is_set():
+                return moved
+            moved += self.archive.archive_month(month)
+        if moved:
+            self.vacuum()
+        return moved
+
+    def vacuum(self) -> int:
+        """分批 incremental vacuum（每批之間暫停，不長時間擋寫入），回傳釋放頁數"""
+        if not self.archive.db.incremental_vacuum_enabled():
+            # 完整 VACUUM 會鎖住整個資料庫，只能離線轉換
+            logger.info(
+                "%s skipped space reclaim: visitors.db is not in incremental auto-vacuum mode "
+                "(run scripts/archive_visitors.py --convert-vacuum with the server stopped)",
+                self.cfg.name,
+            )
+            return 0
+        freed = 0
+        while not self._stop.is_set():
+            pages = self.archive.db.incremental_vacuum(self.cfg.vacuum_pages)
+            freed += pages
+            if pages < self.cfg.vacuum_pages:
+                break
+            self._stop.wait(self.cfg.vacuum_pause_sec)
+        if freed:
+            logger.info("%s vacuum freed %d pages", self.cfg.name, freed)
+        return freed
+
+
+# 全域單例（載入時掛到 visitor_db，查詢即可讀到封存資料）
+visitor_archive = VisitorArchive(visitor_db)
@@ -1,14 +1,21 @@
 # modules/storage/visitor_db.py
 from __future__ import annotations
 
+import time
 import sqlite3
 import threading
 import logging
 from pathlib import Path
 from datetime import datetime, date, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable, Iterable, Iterator, Protocol, Sequence, Tuple, Union, TYPE_CHECKING
 from dataclasses import dataclass
 from contextlib import contextmanager
+from collections import Counter
+
+from modules.storage.query_timeout import install_query_timeout
+
+if TYPE_CHECKING:
+    from modules.storage.recording_index import RecordingIndex
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +23,146 @@ logger = logging.getLogger(__name__)
 DB_PATH = Path(__file__).parent.parent.parent / "data" / "visitors.db"
 
 
+# 彙總表 bucket 的 SQL 寫法（重建用，需與 rollup_buckets() 一致）
+ROLLUP_SQL_BUCKETS = {
+    "hour": "strftime('%Y-%m-%d %H', entry_time)",
+    "day": "date(entry_time)",
+    "week": "date(entry_time, '-6 days', 'weekday 1')",  # 該週週一
+    "month": "strftime('%Y-%m', entry_time)",
+    "month_hour": "strftime('%Y-%m %H', entry_time)",  # 每月各「幾點」加總（尖峰小時用）
+}
+
+# 彙總表待重建的標記列（升級前的資料庫）；重建時與整張表一起刪除，查詢不會讀到這個粒度
+ROLLUP_PENDING = ("rebuild", "pending", "")
+
+
+# 時間策略：entry_ts 為 UTC epoch 毫秒（不受時區 / 夏令時間影響）；
+# entry_time 保留本地時間 ISO 字串，相容舊查詢與彙總表的本地日期 bucket
+SCHEMA_VERSION = 3
+
+
+def to_epoch_ms(ts: datetime) -> int:
+    """本地時間（naive）或帶時區的 datetime → UTC epoch 毫秒"""
+    return round(ts.timestamp() * 1000)
+
+
+def from_epoch_ms(ms: int) -> datetime:
+    """UTC epoch 毫秒 → 本地時間（naive，與 entry_time 一致）"""
+    return datetime.fromtimestamp(ms / 1000)
+
+
+# 分頁游標：(entry_ts epoch 毫秒, id)；entry_ts 補齊前為 (entry_time ISO 字串, id)
+EntryCursor = Tuple[Union[int, str], int]
+
+
+def entry_cursor(entry: "EntryRecord") -> EntryCursor:
+    """分頁游標：有 entry_ts 時用整數時間戳，否則用與資料庫內 entry_time 字串相同的 isoformat"""
+    if entry.entry_ts is not None:
+        return entry.entry_ts, entry.id
+    return entry.entry_time.isoformat(), entry.id
+
+
+def _convert_cursor(cursor: EntryCursor, by_ts: bool) -> EntryCursor:
+    """entry_ts 補齊前後發出的游標互相換算（遷移期間翻頁不中斷）"""
+    value, row_id = cursor
+    if by_ts and isinstance(value, str):
+        return to_epoch_ms(datetime.fromisoformat(value)), row_id
+    if not by_ts and not isinstance(value, str):
+        return from_epoch_ms(value).isoformat(), row_id
+    return cursor
+
+
+def rollup_buckets(ts: datetime) -> Dict[str, str]:
+    """事件時間 → 各粒度的 bucket 標籤"""
+    day = ts.date()
+    return {
+        "hour": ts.strftime("%Y-%m-%d %H"),
+        "day": day.isoformat(),
+        "week": (day - timedelta(days=day.weekday())).isoformat(),
+        "month": ts.strftime("%Y-%m"),
+        "month_hour": ts.strftime("%Y-%m %H"),
+    }
+
+
+def _bucket_span(granularity: str, first: str, last: str) -> Tuple[datetime, datetime]:
+    """bucket 標籤範圍 [first, last] → 涵蓋的本地時間區間 [start, end)"""
+    if granularity == "hour":
+        return datetime.strptime(first, "%Y-%m-%d %H"), datetime.strptime(last, "%Y-%m-%d %H") + timedelta(hours=1)
+    if granularity in ("day", "week"):
+        span = timedelta(days=7 if granularity == "week" else 1)
+        return datetime.fromisoformat(first), datetime.fromisoformat(last) + span
+    # month / month_hour：以整月為範圍
+    start = datetime.strptime(first[:7], "%Y-%m")
+    end = datetime.strptime(last[:7], "%Y-%m")
+    return start, end.replace(year=end.year + end.month // 12, month=end.month % 12 + 1)
+
+
+def _bucket_label(granularity: str, day: date) -> str:
+    if granularity == "day":
+        return day.isoformat()
+    if granularity == "week":
+        return (day - timedelta(days=day.weekday())).isoformat()
+    return day.strftime("%Y-%m")
+
+
+def _hour_of_day_spans(start_date: date, end_date: date) -> List[Tuple[str, str, str]]:
+    """
+    把 [start_date, end_date] 拆成 (granularity, first_bucket, last_bucket)：
+    完整的月份用 month_hour，頭尾零碎的天用 hour
+    """
+    first_full = start_date if start_date.day == 1 else (start_date.replace(day=28) + timedelta(days=4)).replace(day=1)
+    next_month = (end_date.replace(day=28) + timedelta(days=4)).replace(day=1)
+    last_full_end = end_date if end_date + timedelta(days=1) == next_month else end_date.replace(day=1) - timedelta(days=1)
+
+    if first_full > last_full_end:
+        return [("hour", f"{start_date.isoformat()} 00", f"{end_date.isoformat()} 23")]
+
+    spans = [("month_hour", f"{first_full:%Y-%m} 00", f"{last_full_end:%Y-%m} 23")]
+    if start_date < first_full:
+        spans.append(("hour", f"{start_date.isoformat()} 00", f"{first_full - timedelta(days=1)} 23"))
+    if last_full_end < end_date:
+        spans.append(("hour", f"{last_full_end + timedelta(days=1)} 00", f"{end_date.isoformat()} 23"))
+    return spans
+
+
+# (entry_time, camera_id, segment_file, offset_sec)
+PendingEntry = Tuple[datetime, Optional[str], Optional[str], Optional[float]]
+
+# (granularity, bucket, camera_id, metric, bin, count, total) — 見 modules/core/track_analytics.py
+TrackStatRow = Tuple[str, str, str, str, int, int, float]
+
+# 封存（冷資料）的事件列：(entry_time ISO 字串或 entry_ts, camera_id, segment_file, offset_sec, id)
+ColdEntryRow = Tuple[str, Optional[str], Optional[str], Optional[float], int]
+
+
+class ColdEntryReader(Protocol):
+    """封存事件的讀取端（實作見 modules/storage/visitor_archive.py）"""
+
+    def read_entries(
+        self,
+        months: Sequence[str],
+        start: datetime,
+        end: datetime,
+        camera_id: Optional[str] = None,
+        after: Optional[EntryCursor] = None,
+        limit: Optional[int] = None,
+        by_ts: bool = False,
+    ) -> List[ColdEntryRow]: ...
+
+    def rollup_rows(self, months: Sequence[str]) -> List[Tuple[str, str, str, int]]: ...
+
+
+def month_labels(start: datetime, end: datetime) -> List[str]:
+    """與 [start, end) 重疊的月份（YYYY-MM）"""
+    last = end - timedelta(microseconds=1)
+    labels = []
+    year, month = start.year, start.month
+    while (year, month) <= (last.year, last.month):
+        labels.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return labels
+
+
 @dataclass
 class HourlyData:
     hour: int
@@ -28,10 +175,18 @@ class DailyData:
     count: int
 
 
+# visitor_entries 封存到 Parquet 的欄位
+ARCHIVE_COLUMNS = ("id", "entry_time", "entry_ts", "camera_id", "segment_file", "offset_sec", "zone")
+
+
 @dataclass
 class EntryRecord:
     id: int
     entry_time: datetime
+    camera_id: Optional[str] = None
+    segment_file: Optional[str] = None  # 事件所在的錄影分段（檔名）
+    offset_sec: Optional[float] = None  # 事件在分段內的秒數
+    entry_ts: Optional[int] = None      # epoch 毫秒（分頁游標用；entry_ts 補齊前為 None）
 
 
 class VisitorDB:
@@ -45,6 +200,12 @@ class VisitorDB:
     def __init__(self, db_path: Optional[Path] = None):
         self.db_path = db_path or DB_PATH
         self._local = threading.local()
+        self._ts_ready = False  # entry_ts 是否已全部補齊（schema v3）
+        self._rollups_ready = True  # 彙總表是否可用（升級前的資料庫由 ensure_rollups() 重建）
+        self._write_listeners: List[Callable[[Optional[Iterable[date]]], None]] = []
+        self._track_stats_listeners: List[Callable[[Optional[Iterable[date]]], None]] = []
+        self._archive: Optional[ColdEntryReader] = None
+        self._archived: Optional[set] = None  # 已封存月份（YYYY-MM）快取
         self._ensure_db_dir()
         self._init_schema()
 
@@ -61,6 +222,10 @@ class VisitorDB:
                 check_same_thread=False
             )
             self._local.conn.row_factory = sqlite3.Row
+            install_query_timeout(self._local.conn)
+            # WAL 下 NORMAL 只在 checkpoint 時 fsync；斷電最多遺失最後幾筆，不會損毀資料庫
+            self._local.conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn.execute("PRAGMA busy_timeout=5000")
         try:
             yield self._local.conn
         except Exception:
@@ -70,6 +235,10 @@ class VisitorDB:
     def _init_schema(self) -> None:
         """初始化資料表"""
         with self._get_conn() as conn:
+            # 新資料庫直接用 incremental vacuum（封存後可分批釋放空間）；舊資料庫在第一次封存時轉換
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            # WAL：寫入不擋讀取（dashboard 查詢），且 commit 不必每次 fsync
+            conn.execute("PRAGMA journal_mode=WAL")
             conn.executescript("""
                 CREATE TABLE IF NOT EXISTS visitor_entries (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -86,119 +255,579 @@ class VisitorDB:
 
                 CREATE INDEX IF NOT EXISTS idx_entry_time
                     ON visitor_entries(entry_time);
+
+                -- 彙總表：每次寫入時增量更新，dashboard 查詢只讀這張表
+                -- granularity: hour (YYYY-MM-DD HH) / day (YYYY-MM-DD)
+                --              week (該週週一 YYYY-MM-DD) / month (YYYY-MM)
+                --              month_hour (YYYY-MM HH，尖峰小時用)
+                CREATE TABLE IF NOT EXISTS visitor_rollups (
+                    granularity TEXT NOT NULL,
+                    bucket TEXT NOT NULL,
+                    camera_id TEXT NOT NULL DEFAULT '',
+                    count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (granularity, bucket, camera_id)
+                ) WITHOUT ROWID;
+
+                -- 軌跡分析直方圖：每個 (時段, 指標) 一組對數 bin，增量累加
+                -- granularity: hour (YYYY-MM-DD HH) / day (YYYY-MM-DD)
+                CREATE TABLE IF NOT EXISTS track_stats (
+                    granularity TEXT NOT NULL,
+                    bucket TEXT NOT NULL,
+                    camera_id TEXT NOT NULL DEFAULT '',
+                    metric TEXT NOT NULL,
+                    bin INTEGER NOT NULL,
+                    count INTEGER NOT NULL DEFAULT 0,
+                    total REAL NOT NULL DEFAULT 0,
+                    PRIMARY KEY (granularity, metric, bucket, camera_id, bin)
+                ) WITHOUT ROWID;
+
+                -- 已搬到 Parquet 的月份（原始事件在封存檔，彙總表仍在這裡）
+                CREATE TABLE IF NOT EXISTS archived_months (
+                    month TEXT PRIMARY KEY,
+                    rows INTEGER NOT NULL DEFAULT 0,
+                    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
             """)
+            self._migrate(conn)
+
+            # 升級前的資料庫：彙總表是空的 → 先寫入待重建標記，由背景的 ensure_rollups() 重建
+            # （標記存在資料庫裡，重建前新寫入的彙總列或重啟都不會讓它被誤判成已完成）
+            has_rollups = conn.execute("SELECT 1 FROM visitor_rollups LIMIT 1").fetchone()
+            has_entries = conn.execute("SELECT 1 FROM visitor_entries LIMIT 1").fetchone()
+            if has_entries and not has_rollups:
+                conn.execute(
+                    "INSERT INTO visitor_rollups (granularity, bucket, camera_id, count) VALUES (?, ?, ?, 0)",
+                    ROLLUP_PENDING,
+                )
+            self._rollups_ready = conn.execute(
+                "SELECT 1 FROM visitor_rollups WHERE granularity = ? AND bucket = ? AND camera_id = ?",
+                ROLLUP_PENDING,
+            ).fetchone() is None
             conn.commit()
 
+    def _migrate(self, conn: sqlite3.Connection) -> None:
+        """
+        依 PRAGMA user_version 逐步升級 schema
+        v1: 事件對應錄影（camera_id / segment_file / offset_sec）
+        v2: entry_ts（epoch 毫秒）、zone 欄位與 covering index
+        v3: 舊資料的 entry_ts 已補齊（由 migrate_timestamps() 分批完成）
+        """
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            self._ensure_columns(conn, {
+                "camera_id": "TEXT",
+                "segment_file": "TEXT",
+                "offset_sec": "REAL",
+            })
+            conn.execute("PRAGMA user_version = 1")
+        if version < 2:
+            self._ensure_columns(conn, {
+                "entry_ts": "INTEGER",
+                "zone": "TEXT",
+            })
+            conn.executescript("""
+                CREATE INDEX IF NOT EXISTS idx_entries_ts
+                    ON visitor_entries(entry_ts, camera_id, segment_file, offset_sec);
+                CREATE INDEX IF NOT EXISTS idx_entries_camera_ts
+                    ON visitor_entries(camera_id, entry_ts);
+            """)
+            conn.execute("PRAGMA user_version = 2")
+        if version < 3 and not self._has_unmigrated(conn):
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._ts_ready = conn.execute("PRAGMA user_version").fetchone()[0] >= 3
+
+    @staticmethod
+    def _has_unmigrated(conn: sqlite3.Connection) -> bool:
+        return conn.execute(
+            "SELECT 1 FROM visitor_entries WHERE entry_ts IS NULL LIMIT 1"
+        ).fetchone() is not None
+
+    @staticmethod
+    def _ensure_columns(conn: sqlite3.Connection, columns: dict[str, str]) -> None:
+        """舊版資料庫補上新增的欄位"""
+        existing = {r["name"] for r in conn.execute("PRAGMA table_info(visitor_entries)")}
+        for name, decl in columns.items():
+            if name not in existing:
+                conn.execute(f"ALTER TABLE visitor_entries ADD COLUMN {name} {decl}")
+
+    def migrate_timestamps(self, batch_size: int = 5000, pause_sec: float = 0.05) -> int:
+        """
+        分批把舊資料的 entry_time（本地時間 ISO 字串）換算成 entry_ts（epoch 毫秒）
+        每批各自 commit，執行期間讀寫照常；完成前查詢仍走 entry_time。回傳更新筆數
+        """
+        if self._ts_ready:
+            return 0
+
+        with self._get_conn() as conn:
+            max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM visitor_entries").fetchone()[0]
+
+        migrated = 0
+        for lo in range(0, max_id, batch_size):
+            with self._get_conn() as conn:
+                # 'utc' 修飾詞：把本地時間換算成 UTC，與 datetime.timestamp() 一致
+                cur = conn.execute("""
+                    UPDATE visitor_entries
+                    SET entry_ts = CAST(ROUND((julianday(entry_time, 'utc') - 2440587.5) * 86400000) AS INTEGER)
+                    WHERE id > ? AND id <= ? AND entry_ts IS NULL
+                """, (lo, lo + batch_size))
+                conn.commit()
+            migrated += cur.rowcount
+            time.sleep(pause_sec)
+
+        with self._get_conn() as conn:
+            if not self._has_unmigrated(conn):
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+                conn.commit()
+                self._ts_ready = True
+
+        logger.info("Visitor entries timestamp migration: %d rows", migrated)
+        return migrated
+
     # === 寫入 API ===
 
-    def record_entry(self, entry_time: Optional[datetime] = None) -> int:
-        """記錄一次入店事件，回傳插入的 id"""
+    def add_write_listener(self, callback: Callable[[Optional[Iterable[date]]], None]) -> None:
+        """
+        註冊寫入後的通知（commit 之後、在寫入的執行緒上呼叫）
+        參數為受影響的日期；None 代表全部（例如重建彙總表）
+        """
+        self._write_listeners.append(callback)
+
+    def add_track_stats_listener(self, callback: Callable[[Optional[Iterable[date]]], None]) -> None:
+        """註冊軌跡分析直方圖寫入後的通知（與進店事件分開，每分鐘 flush 不影響訪客統計快取）"""
+        self._track_stats_listeners.append(callback)
+
+    def _notify_write(self, dates: Optional[Iterable[date]]) -> None:
+        _notify(self._write_listeners, dates)
+
+    def record_entry(
+        self,
+        entry_time: Optional[datetime] = None,
+        camera_id: Optional[str] = None,
+        segment_file: Optional[str] = None,
+        offset_sec: Optional[float] = None,
+    ) -> int:
+        """記錄一次入店事件（可附帶所在錄影分段與秒數），回傳插入的 id"""
         ts = entry_time or datetime.now()
+        return self.record_entries([(ts, camera_id, segment_file, offset_sec)])[0]
+
+    def record_entries(self, entries: Sequence[PendingEntry]) -> List[int]:
+        """
+        批次寫入入店事件（同一個 transaction，只 commit 一次），回傳插入的 id
+        entries: [(entry_time, camera_id, segment_file, offset_sec), ...]
+        """
+        if not entries:
+            return []
+
+        ids: List[int] = []
+        per_day: Dict[str, List[datetime]] = {}
         with self._get_conn() as conn:
-            cur = conn.execute(
-                "INSERT INTO visitor_entries (entry_time) VALUES (?)",
-                (ts.isoformat(),)
-            )
-            conn.commit()
+            for ts, camera_id, segment_file, offset_sec in entries:
+                cur = conn.execute(
+                    """
+                    INSERT INTO visitor_entries
+                        (entry_time, entry_ts, camera_id, segment_file, offset_sec)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    (ts.isoformat(), to_epoch_ms(ts), camera_id, segment_file, offset_sec)
+                )
+                ids.append(cur.lastrowid)
+                per_day.setdefault(ts.strftime("%Y-%m-%d"), []).append(ts)
 
-            # 同步更新 daily_stats
-            self._update_daily_stats(conn, ts)
+            # 同步更新 daily_stats（每天一筆 UPSERT）與彙總表
+            for date_str, times in per_day.items():
+                self._update_daily_stats(conn, date_str, times)
+            self._apply_rollups(conn, [(ts, camera_id) for ts, camera_id, _, _ in entries])
+            conn.commit()
+        self._notify_write({ts.date() for ts, _, _, _ in entries})
+        return ids
 
-            return cur.lastrowid
+    def record_track_stats(self, rows: Sequence[TrackStatRow]) -> None:
+        """累加軌跡分析直方圖（一次 transaction）"""
+        if not rows:
+            return
+        with self._get_conn() as conn:
+            conn.executemany("""
+                INSERT INTO track_stats (granularity, bucket, camera_id, metric, bin, count, total)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(granularity, metric, bucket, camera_id, bin) DO UPDATE SET
+                    count = count + excluded.count,
+                    total = total + excluded.total
+            """, rows)
+            conn.commit()
+        _notify(self._track_stats_listeners, {date.fromisoformat(bucket) for g, bucket, *_ in rows if g == "day"})
 
-    def _update_daily_stats(self, conn: sqlite3.Connection, ts: datetime) -> None:
-        """更新每日統計快取"""
-        date_str = ts.strftime("%Y-%m-%d")
-        time_str = ts.strftime("%H:%M:%S")
+    def _update_daily_stats(self, conn: sqlite3.Connection, date_str: str, times: List[datetime]) -> None:
+        """更新每日統計快取（由呼叫端 commit）"""
+        first = min(times).strftime("%H:%M:%S")
+        last = max(times).strftime("%H:%M:%S")
 
         conn.execute("""
             INSERT INTO daily_stats (date, total_visits, first_entry_time, last_entry_time)
-            VALUES (?, 1, ?, ?)
+            VALUES (?, ?, ?, ?)
             ON CONFLICT(date) DO UPDATE SET
-                total_visits = total_visits + 1,
-                last_entry_time = ?,
+                total_visits = total_visits + excluded.total_visits,
+                first_entry_time = MIN(COALESCE(first_entry_time, excluded.first_entry_time),
+                                       excluded.first_entry_time),
+                last_entry_time = MAX(COALESCE(last_entry_time, excluded.last_entry_time),
+                                      excluded.last_entry_time),
                 updated_at = CURRENT_TIMESTAMP
-        """, (date_str, time_str, time_str, time_str))
-        conn.commit()
+        """, (date_str, len(times), first, last))
 
-    # === 查詢 API ===
+    @staticmethod
+    def _apply_rollups(
+        conn: sqlite3.Connection,
+        entries: Sequence[Tuple[datetime, Optional[str]]],
+        sign: int = 1,
+    ) -> None:
+        """把事件計入（sign=-1 時扣除）各粒度的彙總 bucket（由呼叫端 commit）"""
+        deltas: Counter = Counter()
+        for ts, camera_id in entries:
+            for granularity, bucket in rollup_buckets(ts).items():
+                deltas[(granularity, bucket, camera_id or "")] += sign
 
-    def get_today_visits(self) -> int:
-        """取得今日訪客數"""
-        today = date.today().isoformat()
-        with self._get_conn() as conn:
-            row = conn.execute(
-                "SELECT total_visits FROM daily_stats WHERE date = ?",
-                (today,)
-            ).fetchone()
-            return row["total_visits"] if row else 0
+        conn.executemany("""
+            INSERT INTO visitor_rollups (granularity, bucket, camera_id, count)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(granularity, bucket, camera_id) DO UPDATE SET
+                count = count + excluded.count
+        """, [(*key, n) for key, n in deltas.items() if n])
 
-    def get_hourly_distribution(self, target_date: Optional[date] = None) -> List[HourlyData]:
-        """取得指定日期的每小時分布"""
-        target = target_date or date.today()
-        start = datetime.combine(target, datetime.min.time())
-        end = start + timedelta(days=1)
+    def ensure_rollups(self) -> int:
+        """
+        升級前的資料庫第一次啟動時重建彙總表（在背景執行緒呼叫，不擋 server 啟動）
+        重建完成前查詢 API 直接掃 visitor_entries；回傳重建的事件筆數（不需重建時為 0）
+        """
+        if self._rollups_ready:
+            return 0
+        return self.rebuild_rollups()
 
+    def rebuild_rollups(self) -> int:
+        """從 visitor_entries 重建整張彙總表，回傳事件筆數"""
         with self._get_conn() as conn:
-            rows = conn.execute("""
-                SELECT strftime('%H', entry_time) as hour, COUNT(*) as count
+            self._rebuild_rollups(conn)
+            conn.commit()
+            total = conn.execute("SELECT COUNT(*) FROM visitor_entries").fetchone()[0]
+        self._rollups_ready = True
+        self._notify_write(None)
+        logger.info("Visitor rollups rebuilt from %d entries", total)
+        return total
+
+    def _rebuild_rollups(self, conn: sqlite3.Connection) -> None:
+        """由呼叫端 commit；已封存月份的事件從 Parquet 計入"""
+        conn.execute("DELETE FROM visitor_rollups")
+        for granularity, expr in ROLLUP_SQL_BUCKETS.items():
+            conn.execute(f"""
+                INSERT INTO visitor_rollups (granularity, bucket, camera_id, count)
+                SELECT ?, {expr} AS bucket, COALESCE(camera_id, ''), COUNT(*)
                 FROM visitor_entries
+                GROUP BY bucket, COALESCE(camera_id, '')
+            """, (granularity,))
+
+        months = sorted(self._archived_months(conn))
+        if months and self._archive is not None:
+            conn.executemany("""
+                INSERT INTO visitor_rollups (granularity, bucket, camera_id, count)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(granularity, bucket, camera_id) DO UPDATE SET
+                    count = count + excluded.count
+            """, self._archive.rollup_rows(months))
+
+    def bulk_load(self, entries: Iterable[PendingEntry]) -> int:
+        """
+        大量匯入事件（匯入舊資料 / 產生測試資料用），回傳筆數
+        - 整批 executemany 在同一個 transaction，不逐筆更新統計
+        - daily_stats 每天一筆 UPSERT，最後重建整張彙總表
+        entries 可以是 generator，不需要一次放進記憶體
+        """
+        per_day: Dict[str, list] = {}   # 日期 → [最早, 最晚, 筆數]
+
+        def rows():
+            for ts, camera_id, segment_file, offset_sec in entries:
+                date_str = ts.strftime("%Y-%m-%d")
+                day = per_day.get(date_str)
+                if day is None:
+                    per_day[date_str] = [ts, ts, 1]
+                else:
+                    day[0] = min(day[0], ts)
+                    day[1] = max(day[1], ts)
+                    day[2] += 1
+                yield ts.isoformat(), to_epoch_ms(ts), camera_id, segment_file, offset_sec
+
+        with self._get_conn() as conn:
+            cur = conn.executemany("""
+                INSERT INTO visitor_entries (entry_time, entry_ts, camera_id, segment_file, offset_sec)
+                VALUES (?, ?, ?, ?, ?)
+            """, rows())
+            total = cur.rowcount
+            if not total:
+                conn.rollback()
+                return 0
+
+            conn.executemany("""
+                INSERT INTO daily_stats (date, total_visits, first_entry_time, last_entry_time)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(date) DO UPDATE SET
+                    total_visits = total_visits + excluded.total_visits,
+                    first_entry_time = MIN(COALESCE(first_entry_time, excluded.first_entry_time),
+                                           excluded.first_entry_time),
+                    last_entry_time = MAX(COALESCE(last_entry_time, excluded.last_entry_time),
+                                          excluded.last_entry_time),
+                    updated_at = CURRENT_TIMESTAMP
+            """, [
+                (date_str, count, first.strftime("%H:%M:%S"), last.strftime("%H:%M:%S"))
+                for date_str, (first, last, count) in per_day.items()
+            ])
+            self._rebuild_rollups(conn)
+            conn.commit()
+
+        self._rollups_ready = True
+        self._notify_write(None)
+        logger.info("Visitor bulk load: %d entries over %d days", total, len(per_day))
+        return total
+
+    def backfill_recording_offsets(
+        self,
+        index: "RecordingIndex",
+        camera_id: str,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        batch_size: int = 500,
+    ) -> int:
+        """
+        補上尚未對應到錄影的事件（舊資料 / 事件錄影模式下分段稍後才開檔）
+        找不到分段的事件維持 NULL，之後可再重跑；回傳更新筆數
+        """
+        sql = """
+            SELECT id, entry_time, camera_id FROM visitor_entries
+            WHERE id > ? AND segment_file IS NULL AND (camera_id IS NULL OR camera_id = ?)
+        """
+        params: list = [camera_id]
+        if since:
+            sql += " AND entry_time >= ?"
+            params.append(since.isoformat())
+        if until:
+            sql += " AND entry_time < ?"
+            params.append(until.isoformat())
+        sql += " ORDER BY id LIMIT ?"
+
+        updated = 0
+        last_id = 0
+        while True:
+            with self._get_conn() as conn:
+                rows = conn.execute(sql, [last_id, *params, batch_size]).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+
+            updates = []
+            moved: List[datetime] = []  # 原本沒有 camera_id 的事件，彙總要跟著搬
+            for row in rows:
+                ts = datetime.fromisoformat(row["entry_time"])
+                located = index.locate(camera_id, ts)
+                if located:
+                    seg, offset = located
+                    updates.append((camera_id, seg.filename, round(offset, 3), row["id"]))
+                    if row["camera_id"] is None:
+                        moved.append(ts)
+
+            if updates:
+                with self._get_conn() as conn:
+                    conn.executemany("""
+                        UPDATE visitor_entries
+                        SET camera_id = ?, segment_file = ?, offset_sec = ?
+                        WHERE id = ?
+                    """, updates)
+                    self._apply_rollups(conn, [(ts, None) for ts in moved], sign=-1)
+                    self._apply_rollups(conn, [(ts, camera_id) for ts in moved])
+                    conn.commit()
+                if moved:
+                    self._notify_write({ts.date() for ts in moved})
+                updated += len(updates)
+
+        if updated:
+            logger.info("Linked %d visitor entries to recordings", updated)
+        return updated
+
+    def clear_recording_links(self, camera_id: str, segment_file: str, start: datetime, end: datetime) -> int:
+        """分段被刪除後清掉事件上的錄影對應（避免回傳已不存在的分段），回傳更新筆數"""
+        with self._get_conn() as conn:
+            cur = conn.execute("""
+                UPDATE visitor_entries SET segment_file = NULL, offset_sec = NULL
+                WHERE entry_time >= ? AND entry_time < ? AND camera_id = ? AND segment_file = ?
+            """, (start.isoformat(), end.isoformat(), camera_id, segment_file))
+            conn.commit()
+        return cur.rowcount
+
+    # === 封存（冷資料）===
+
+    def attach_archive(self, reader: ColdEntryReader) -> None:
+        """掛上封存讀取端；之後查詢原始事件時會自動合併已封存月份"""
+        self._archive = reader
+
+    def _archived_months(self, conn: sqlite3.Connection) -> set:
+        if self._archived is None:
+            self._archived = {r[0] for r in conn.execute("SELECT month FROM archived_months")}
+        return self._archived
+
+    def archived_months(self) -> List[str]:
+        with self._get_conn() as conn:
+            return sorted(self._archived_months(conn))
+
+    def _cold_months(self, start: datetime, end: datetime) -> List[str]:
+        """[start, end) 內已封存的月份（沒有掛封存讀取端時為空）"""
+        if self._archive is None:
+            return []
+        with self._get_conn() as conn:
+            archived = self._archived_months(conn)
+        return [m for m in month_labels(start, end) if m in archived]
+
+    def archive_candidates(self, before: date) -> List[str]:
+        """before 之前、仍有熱資料的完整月份（YYYY-MM）"""
+        with self._get_conn() as conn:
+            row = conn.execute("SELECT MIN(entry_time) FROM visitor_entries").fetchone()
+            if row[0] is None:
+                return []
+            first = datetime.fromisoformat(row[0])
+            end = datetime(before.year, before.month, 1)
+            months = []
+            for label in month_labels(datetime(first.year, first.month, 1), end) if first < end else []:
+                month_start = datetime.strptime(label, "%Y-%m")
+                month_end = datetime(month_start.year + month_start.month // 12, month_start.month % 12 + 1, 1)
+                if conn.execute(
+                    "SELECT 1 FROM visitor_entries WHERE entry_time >= ? AND entry_time < ? LIMIT 1",
+                    (month_start.isoformat(), month_end.isoformat()),
+                ).fetchone():
+                    months.append(label)
+        return months
+
+    def get_month_rows(self, month: str) -> List[Tuple]:
+        """某月份的熱資料（封存用），欄位順序見 ARCHIVE_COLUMNS"""
+        start = datetime.strptime(month, "%Y-%m")
+        end = datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+        with self._get_conn() as conn:
+            cur = conn.execute(f"""
+                SELECT {", ".join(ARCHIVE_COLUMNS)} FROM visitor_entries
                 WHERE entry_time >= ? AND entry_time < ?
-                GROUP BY hour
-                ORDER BY hour
-            """, (start.isoformat(), end.isoformat())).fetchall()
+                ORDER BY entry_time, id
+            """, (start.isoformat(), end.isoformat()))
+            cur.row_factory = None
+            return cur.fetchall()
+
+    def complete_archive(self, month: str, max_id: int, rows: int) -> int:
+        """
+        封存檔已寫好 → 標記月份並刪除已封存的熱資料（同一個 transaction，查詢不會看到重複或缺漏）
+        只刪 id <= max_id 的列：封存期間才寫進該月份的事件留在熱資料，下次再封存。回傳刪除筆數
+        """
+        start = datetime.strptime(month, "%Y-%m")
+        end = datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+        with self._get_conn() as conn:
+            conn.execute("""
+                INSERT INTO archived_months (month, rows) VALUES (?, ?)
+                ON CONFLICT(month) DO UPDATE SET rows = excluded.rows, archived_at = CURRENT_TIMESTAMP
+            """, (month, rows))
+            cur = conn.execute("""
+                DELETE FROM visitor_entries
+                WHERE entry_time >= ? AND entry_time < ? AND id <= ?
+            """, (start.isoformat(), end.isoformat(), max_id))
+            conn.commit()
+            self._archived = None
+        return cur.rowcount
+
+    def incremental_vacuum_enabled(self) -> bool:
+        with self._get_conn() as conn:
+            return conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+    def convert_to_incremental_vacuum(self) -> None:
+        """
+        舊資料庫轉成 auto_vacuum=INCREMENTAL（完整 VACUUM，整個重寫期間鎖住資料庫）
+        只在離線時由 scripts/archive_visitors.py --convert-vacuum 執行
+        """
+        with self._get_conn() as conn:
+            conn.commit()
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+
+    def incremental_vacuum(self, max_pages: int = 2000) -> int:
+        """
+        釋放最多 max_pages 個空頁給檔案系統，回傳釋放頁數
+        舊資料庫（auto_vacuum 不是 INCREMENTAL）不做任何事，回傳 0
+        """
+        with self._get_conn() as conn:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                return 0
+            before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            conn.execute(f"PRAGMA incremental_vacuum({int(max_pages)})").fetchall()
+            conn.commit()
+            return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    # === 查詢 API ===
+
+    def get_today_visits(self, camera_id: Optional[str] = None) -> int:
+        """取得今日訪客數"""
+        return self._sum_rollup("day", date.today().isoformat(), date.today().isoformat(), camera_id)
+
+    def get_hourly_distribution(
+        self,
+        target_date: Optional[date] = None,
+        camera_id: Optional[str] = None,
+    ) -> List[HourlyData]:
+        """取得指定日期的每小時分布"""
+        day = (target_date or date.today()).isoformat()
+        buckets = self._read_rollup("hour", f"{day} 00", f"{day} 23", camera_id)
 
         # 填充完整 24 小時
-        hour_map = {int(r["hour"]): r["count"] for r in rows}
+        hour_map = {int(b[-2:]): n for b, n in buckets.items()}
         return [HourlyData(hour=h, count=hour_map.get(h, 0)) for h in range(24)]
 
-    def get_daily_trend(self, days: int = 7) -> List[DailyData]:
+    def get_daily_trend(self, days: int = 7, camera_id: Optional[str] = None) -> List[DailyData]:
         """取得最近 N 天的每日訪客數"""
         end_date = date.today()
         start_date = end_date - timedelta(days=days - 1)
+        return self.get_period_trend("day", start_date, end_date, camera_id)
 
-        with self._get_conn() as conn:
-            rows = conn.execute("""
-                SELECT date, total_visits as count
-                FROM daily_stats
-                WHERE date >= ? AND date <= ?
-                ORDER BY date
-            """, (start_date.isoformat(), end_date.isoformat())).fetchall()
+    def get_period_trend(
+        self,
+        granularity: str,
+        start_date: date,
+        end_date: date,
+        camera_id: Optional[str] = None,
+    ) -> List[DailyData]:
+        """
+        取得區間內每日 / 每週 / 每月的訪客數（缺少的 bucket 補 0）
+        granularity: day / week / month；DailyData.date 為 bucket 標籤
+        """
+        if granularity not in ("day", "week", "month"):
+            raise ValueError(f"Unsupported granularity: {granularity}")
 
-        # 填充缺失的日期
-        date_map = {r["date"]: r["count"] for r in rows}
-        result = []
+        labels: List[str] = []
         current = start_date
         while current <= end_date:
-            d_str = current.isoformat()
-            result.append(DailyData(date=d_str, count=date_map.get(d_str, 0)))
+            label = _bucket_label(granularity, current)
+            if not labels or labels[-1] != label:
+                labels.append(label)
             current += timedelta(days=1)
 
-        return result
+        counts = self._read_rollup(granularity, labels[0], labels[-1], camera_id) if labels else {}
+        return [DailyData(date=label, count=counts.get(label, 0)) for label in labels]
 
-    def get_summary(self, days: int = 30) -> Dict[str, Any]:
+    def get_summary(self, days: int = 30, camera_id: Optional[str] = None) -> Dict[str, Any]:
         """取得統計摘要"""
-        daily_data = self.get_daily_trend(days)
+        daily_data = self.get_daily_trend(days, camera_id)
         total = sum(d.count for d in daily_data)
         avg = total / len(daily_data) if daily_data else 0
 
         peak_day = max(daily_data, key=lambda d: d.count) if daily_data else None
 
-        # 計算尖峰小時（需要額外查詢）
+        # 尖峰小時：整月用 month_hour，頭尾不足一個月的部分用 hour bucket
         end_date = date.today()
         start_date = end_date - timedelta(days=days - 1)
+        by_hour: Counter = Counter()
+        for granularity, first, last in _hour_of_day_spans(start_date, end_date):
+            for bucket, n in self._read_rollup(granularity, first, last, camera_id).items():
+                by_hour[int(bucket[-2:])] += n
 
-        with self._get_conn() as conn:
-            row = conn.execute("""
-                SELECT strftime('%H', entry_time) as hour, COUNT(*) as count
-                FROM visitor_entries
-                WHERE date(entry_time) >= ? AND date(entry_time) <= ?
-                GROUP BY hour
-                ORDER BY count DESC
-                LIMIT 1
-            """, (start_date.isoformat(), end_date.isoformat())).fetchone()
-
-        peak_hour = {"hour": int(row["hour"]), "avg_count": row["count"] / days} if row else None
+        peak = max(by_hour.items(), key=lambda kv: kv[1]) if by_hour else None
+        peak_hour = {"hour": peak[0], "avg_count": peak[1] / days} if peak and peak[1] > 0 else None
 
         return {
             "total_visits": total,
@@ -207,27 +836,278 @@ class VisitorDB:
             "peak_hour": peak_hour,
         }
 
-    def get_entries_by_date(self, target_date: date) -> List[EntryRecord]:
+    def _read_rollup(
+        self,
+        granularity: str,
+        first: str,
+        last: str,
+        camera_id: Optional[str] = None,
+    ) -> Dict[str, int]:
+        """讀取 [first, last] 範圍的 bucket（未指定攝影機時加總所有攝影機）"""
+        if not self._rollups_ready:
+            return self._count_entries(granularity, first, last, camera_id)
+        sql = """
+            SELECT bucket, SUM(count) as count
+            FROM visitor_rollups
+            WHERE granularity = ? AND bucket >= ? AND bucket <= ?
+        """
+        params: list = [granularity, first, last]
+        if camera_id is not None:
+            sql += " AND camera_id = ?"
+            params.append(camera_id)
+        sql += " GROUP BY bucket"
+
+        with self._get_conn() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return {r["bucket"]: r["count"] for r in rows}
+
+    def _count_entries(
+        self,
+        granularity: str,
+        first: str,
+        last: str,
+        camera_id: Optional[str] = None,
+    ) -> Dict[str, int]:
+        """彙總表重建完成前的查詢：直接從 visitor_entries 依 bucket 分組計數（結果格式同 _read_rollup）"""
+        expr = ROLLUP_SQL_BUCKETS[granularity]
+        start, end = _bucket_span(granularity, first, last)
+        sql = f"""
+            SELECT {expr} AS bucket, COUNT(*) AS count
+            FROM visitor_entries
+            WHERE entry_time >= ? AND entry_time < ?
+        """
+        params: list = [start.isoformat(), end.isoformat()]
+        if camera_id is not None:
+            sql += " AND COALESCE(camera_id, '') = ?"
+            params.append(camera_id)
+        sql += " GROUP BY bucket"
+
+        with self._get_conn() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return {r["bucket"]: r["count"] for r in rows if first <= r["bucket"] <= last}
+
+    def _sum_rollup(self, granularity: str, first: str, last: str, camera_id: Optional[str] = None) -> int:
+        return sum(self._read_rollup(granularity, first, last, camera_id).values())
+
+    def get_track_bins(
+        self,
+        metric: str,
+        granularity: str,
+        first: str,
+        last: str,
+        camera_id: Optional[str] = None,
+    ) -> Dict[int, Tuple[int, float]]:
+        """讀取 [first, last] 範圍合併後的直方圖 {bin: (count, total)}"""
+        sql = """
+            SELECT bin, SUM(count), SUM(total)
+            FROM track_stats
+            WHERE granularity = ? AND metric = ? AND bucket >= ? AND bucket <= ?
+        """
+        params: list = [granularity, metric, first, last]
+        if camera_id is not None:
+            sql += " AND camera_id = ?"
+            params.append(camera_id)
+        sql += " GROUP BY bin"
+
+        with self._get_conn() as conn:
+            cur = conn.execute(sql, params)
+            cur.row_factory = None
+            return {b: (count, total) for b, count, total in cur.fetchall()}
+
+    def get_track_hourly(
+        self,
+        metric: str,
+        target_date: date,
+        camera_id: Optional[str] = None,
+    ) -> Dict[int, Dict[int, Tuple[int, float]]]:
+        """指定日期各小時的直方圖 {hour: {bin: (count, total)}}"""
+        day = target_date.isoformat()
+        sql = """
+            SELECT bucket, bin, SUM(count), SUM(total)
+            FROM track_stats
+            WHERE granularity = 'hour' AND metric = ? AND bucket >= ? AND bucket <= ?
+        """
+        params: list = [metric, f"{day} 00", f"{day} 23"]
+        if camera_id is not None:
+            sql += " AND camera_id = ?"
+            params.append(camera_id)
+        sql += " GROUP BY bucket, bin"
+
+        result: Dict[int, Dict[int, Tuple[int, float]]] = {}
+        with self._get_conn() as conn:
+            cur = conn.execute(sql, params)
+            cur.row_factory = None
+            for bucket, b, count, total in cur.fetchall():
+                result.setdefault(int(bucket[-2:]), {})[b] = (count, total)
+        return result
+
+    def get_entries_page(
+        self,
+        start: datetime,
+        end: datetime,
+        after: Optional[EntryCursor] = None,
+        limit: int = 500,
+        camera_id: Optional[str] = None,
+    ) -> List[EntryRecord]:
+        """
+        [start, end) 的事件，依 (entry_ts, id) 排序的 keyset 分頁（走 idx_entries_ts / idx_entries_camera_ts）
+        after: 上一頁最後一筆的游標（見 entry_cursor）；翻到越後面也不會變慢
+        entry_ts 補齊前改用 (entry_time, id) 與 idx_entry_time，游標為字串
+        """
+        by_ts = self._ts_ready
+        if after is not None:
+            after = _convert_cursor(after, by_ts)
+        if by_ts:
+            sql = """
+                SELECT entry_ts, camera_id, segment_file, offset_sec, id
+                FROM visitor_entries
+                WHERE entry_ts >= ? AND entry_ts < ?
+            """
+            params: list = [to_epoch_ms(start), to_epoch_ms(end)]
+            key = "entry_ts"
+        else:
+            sql = """
+                SELECT entry_time, camera_id, segment_file, offset_sec, id
+                FROM visitor_entries
+                WHERE entry_time >= ? AND entry_time < ?
+            """
+            params = [start.isoformat(), end.isoformat()]
+            key = "entry_time"
+        if after is not None:
+            sql += f" AND ({key}, id) > (?, ?)"
+            params.extend(after)
+        if camera_id is not None:
+            sql += " AND camera_id = ?"
+            params.append(camera_id)
+        sql += f" ORDER BY {key}, id LIMIT ?"
+        params.append(limit)
+
+        with self._get_conn() as conn:
+            cur = conn.execute(sql, params)
+            cur.row_factory = None
+            rows = cur.fetchall()
+
+        cold_months = self._cold_months(start, end)
+        if cold_months:
+            cold = self._archive.read_entries(cold_months, start, end, camera_id, after, limit, by_ts=by_ts)
+            rows = sorted(rows + cold, key=lambda r: (r[0], r[4]))[:limit]
+
+        return [
+            EntryRecord(
+                id=row_id,
+                entry_time=from_epoch_ms(ts) if by_ts else datetime.fromisoformat(ts),
+                camera_id=cam,
+                segment_file=segment_file,
+                offset_sec=offset_sec,
+                entry_ts=ts if by_ts else None,
+            )
+            for ts, cam, segment_file, offset_sec, row_id in rows
+        ]
+
+    def iter_entries(
+        self,
+        start: datetime,
+        end: datetime,
+        chunk_size: int = 5000,
+        camera_id: Optional[str] = None,
+    ) -> Iterator[List[EntryRecord]]:
+        """逐批讀出 [start, end) 的事件（匯出用，記憶體只保留一批）"""
+        after: Optional[EntryCursor] = None
+        while True:
+            chunk = self.get_entries_page(start, end, after, chunk_size, camera_id)
+            if not chunk:
+                return
+            yield chunk
+            if len(chunk) < chunk_size:
+                return
+            after = entry_cursor(chunk[-1])
+
+    def get_entry_rows(self, start: datetime, end: datetime) -> List[Tuple[str, Optional[str]]]:
+        """
+        [start, end) 的原始事件 (entry_time ISO 字串, camera_id)，給向量化分析載入用
+        （走 idx_entry_time，回傳 tuple 不建 Row 物件）
+        """
+        with self._get_conn() as conn:
+            cur = conn.execute("""
+                SELECT entry_time, camera_id FROM visitor_entries
+                WHERE entry_time >= ? AND entry_time < ?
+            """, (start.isoformat(), end.isoformat()))
+            cur.row_factory = None
+            rows = cur.fetchall()
+
+        cold_months = self._cold_months(start, end)
+        if cold_months:
+            rows += [(r[0], r[1]) for r in self._archive.read_entries(cold_months, start, end)]
+        return rows
+
+    def get_entries_by_date(self, target_date: date, camera_id: Optional[str] = None) -> List[EntryRecord]:
         """取得指定日期的所有入店事件"""
         start = datetime.combine(target_date, datetime.min.time())
         end = start + timedelta(days=1)
 
-        with self._get_conn() as conn:
-            rows = conn.execute("""
-                SELECT id, entry_time
+        if self._ts_ready:
+            # 整數範圍掃描，欄位都在 idx_entries_ts 內（不必回表）
+            sql = """
+                SELECT entry_ts, camera_id, segment_file, offset_sec, id
+                FROM visitor_entries
+                WHERE entry_ts >= ? AND entry_ts < ?
+            """
+            params: list = [to_epoch_ms(start), to_epoch_ms(end)]
+            order = " ORDER BY entry_ts"
+        else:
+            sql = """
+                SELECT entry_time, camera_id, segment_file, offset_sec, id
                 FROM visitor_entries
                 WHERE entry_time >= ? AND entry_time < ?
-                ORDER BY entry_time
-            """, (start.isoformat(), end.isoformat())).fetchall()
+            """
+            params = [start.isoformat(), end.isoformat()]
+            order = " ORDER BY entry_time"
+        if camera_id is not None:
+            sql += " AND camera_id = ?"
+            params.append(camera_id)
 
-        return [
+        with self._get_conn() as conn:
+            cur = conn.execute(sql + order, params)
+            cur.row_factory = None  # tuple 比 sqlite3.Row 便宜
+            rows = cur.fetchall()
+
+        parse = from_epoch_ms if self._ts_ready else datetime.fromisoformat
+        records = [
             EntryRecord(
-                id=row["id"],
-                entry_time=datetime.fromisoformat(row["entry_time"])
+                id=row_id,
+                entry_time=parse(ts),
+                camera_id=cam,
+                segment_file=segment_file,
+                offset_sec=offset_sec,
             )
-            for row in rows
+            for ts, cam, segment_file, offset_sec, row_id in rows
         ]
 
+        cold_months = self._cold_months(start, end)
+        if cold_months:
+            records += [
+                EntryRecord(
+                    id=row_id,
+                    entry_time=datetime.fromisoformat(ts),
+                    camera_id=cam,
+                    segment_file=segment_file,
+                    offset_sec=offset_sec,
+                )
+                for ts, cam, segment_file, offset_sec, row_id in self._archive.read_entries(
+                    cold_months, start, end, camera_id,
+                )
+            ]
+            records.sort(key=lambda e: (e.entry_time, e.id))
+        return records
+
+
+def _notify(listeners: List[Callable[[Optional[Iterable[date]]], None]], dates: Optional[Iterable[date]]) -> None:
+    for callback in listeners:
+        try:
+            callback(dates)
+        except Exception:
+            logger.exception("Visitor write listener failed")
+
 
 # 全域單例
 visitor_db = VisitorDB()
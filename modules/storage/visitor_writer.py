@@ -0,0 +1,134 @@
+# modules/storage/visitor_writer.py
+"""
+進店事件的 write-behind 寫入
+- YOLO 執行緒只把事件丟進 queue，不做任何 SQLite 操作（也不等 fsync）
+- 背景執行緒每 flush_interval_ms 收集一批，對應錄影分段後一次 transaction 寫入
+- stop() 會把 queue 內剩餘事件全部寫完才結束
+"""
+from __future__ import annotations
+
+import time
+import queue
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from modules.storage.recording_index import RecordingIndex
+    from modules.storage.visitor_db import VisitorDB, PendingEntry
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class VisitorWriterConfig:
+    flush_interval_ms: int = 500   # 一批最多等多久
+    max_batch: int = 200           # 一批最多幾筆
+    max_queue: int = 10_000        # 磁碟異常時最多暫存的事件數
+    retry_delay_sec: float = 1.0   # 寫入失敗後重試間隔
+    max_retries: int = 3
+    name: str = "VisitorWriter"
+
+
+class VisitorWriter:
+    """
+    用法：
+        writer = VisitorWriter(VisitorWriterConfig(), db=visitor_db, index=recording_index)
+        writer.start()
+        writer.submit(datetime.now(), camera_id="cam1")
+        ...
+        writer.stop()   # flush 剩餘事件
+    """
+
+    def __init__(
+        self,
+        cfg: VisitorWriterConfig,
+        db: "VisitorDB",
+        index: Optional["RecordingIndex"] = None,
+    ):
+        self.cfg = cfg
+        self.db = db
+        self.index = index
+        self._q: "queue.Queue[Tuple[datetime, Optional[str]]]" = queue.Queue(maxsize=cfg.max_queue)
+        self._stop = threading.Event()
+        self._t: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._t and self._t.is_alive():
+            return
+        self._stop.clear()
+        self._t = threading.Thread(target=self._loop, name=self.cfg.name, daemon=True)
+        self._t.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """停止並寫完 queue 內剩餘事件"""
+        self._stop.set()
+        if self._t:
+            self._t.join(timeout=timeout)
+            if self._t.is_alive():
+                logger.warning("%s did not flush in time (%d pending)", self.cfg.name, self._q.qsize())
+
+    def submit(self, entry_time: datetime, camera_id: Optional[str] = None) -> bool:
+        """排入一筆進店事件（不阻塞）；queue 滿時回傳 False"""
+        try:
+            self._q.put_nowait((entry_time, camera_id))
+            return True
+        except queue.Full:
+            logger.error("%s queue full, entry at %s dropped", self.cfg.name, entry_time)
+            return False
+
+    def pending(self) -> int:
+        return self._q.qsize()
+
+    # === 背景執行緒 ===
+
+    def _loop(self) -> None:
+        while not (self._stop.is_set() and self._q.empty()):
+            batch = self._collect()
+            if batch:
+                self._write(batch)
+
+    def _collect(self) -> List[Tuple[datetime, Optional[str]]]:
+        """等第一筆，之後最多再等 flush_interval_ms 或湊滿 max_batch"""
+        try:
+            first = self._q.get(timeout=0.2)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        deadline = time.monotonic() + self.cfg.flush_interval_ms / 1000
+        while len(batch) < self.cfg.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop.is_set():
+                # 關閉中：不再等待，直接把 queue 裡現有的拿完
+                remaining = 0
+            try:
+                batch.append(self._q.get(timeout=remaining) if remaining else self._q.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[Tuple[datetime, Optional[str]]]) -> None:
+        rows = [self._resolve(ts, camera_id) for ts, camera_id in batch]
+        for attempt in range(1, self.cfg.max_retries + 1):
+            try:
+                self.db.record_entries(rows)
+                logger.debug("%s wrote %d entries", self.cfg.name, len(rows))
+                return
+            except Exception:
+                logger.exception("%s write failed (attempt %d/%d)", self.cfg.name, attempt, self.cfg.max_retries)
+                time.sleep(self.cfg.retry_delay_sec)
+        logger.error("%s dropped %d entries after %d retries", self.cfg.name, len(rows), self.cfg.max_retries)
+
+    def _resolve(self, ts: datetime, camera_id: Optional[str]) -> "PendingEntry":
+        """對應事件當下的錄影分段（找不到時留 NULL，之後由 backfill 補上）"""
+        if camera_id and self.index is not None:
+            try:
+                located = self.index.locate(camera_id, ts)
+                if located:
+                    return ts, camera_id, located[0].filename, round(located[1], 3)
+            except Exception:
+                logger.exception("Failed to locate recording for entry")
+        return ts, camera_id, None, None
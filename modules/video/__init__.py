@@ -3,12 +3,15 @@
 
 from .rtsp_reader import RTSPReader
 from .video_recorder import VideoRecorder
+from .event_recorder import EventVideoRecorder, EventRecorderConfig
 from .recording_worker import RecordingWorker
 from .camera_recorder import CameraRecorder, CameraRecorderConfig
 
 __all__ = [
     "RTSPReader",
     "VideoRecorder",
+    "EventVideoRecorder",
+    "EventRecorderConfig",
     "RecordingWorker",
     "CameraRecorder",
     "CameraRecorderConfig",
@@ -0,0 +1,190 @@
+# modules/video/event_recorder.py
+"""
+事件觸發錄影
+- 平時只把降頻後的畫面（JPEG）放進固定長度的 ring buffer，不寫檔
+  （預設 5 fps、原解析度：事件前的畫面是最重要的證據，不降畫質）
+- 收到 trigger() 後，把 pre-roll + 之後 post-roll 秒數寫成一段影片
+  pre-roll 依取樣時間戳放到片段時間軸上，片段內的秒數與實際時間一致
+- 錄製中再次觸發只會延長結束時間（重疊事件自動合併成同一段）
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Deque, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from modules.video.video_recorder import RecorderConfig, VideoRecorder
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class EventRecorderConfig(RecorderConfig):
+    pre_roll_seconds: float = 10.0   # 事件前保留秒數
+    post_roll_seconds: float = 20.0  # 最後一次事件後繼續錄製秒數
+    jpeg_quality: int = 80           # ring buffer 內的 JPEG 品質
+    pre_roll_fps: float = 5.0        # ring buffer 取樣率（寫檔時重複幀補回 fps）
+    pre_roll_scale: float = 1.0      # ring buffer 解析度（相對錄影輸出尺寸；< 1 省 CPU 但事件前畫面較糊）
+
+
+# (timestamp, raw_jpeg, annot_jpeg)
+BufferedFrame = Tuple[float, Optional[np.ndarray], Optional[np.ndarray]]
+
+
+class EventVideoRecorder(VideoRecorder):
+    """
+    用法（與 VideoRecorder 相同，多了 trigger()）：
+        rec = EventVideoRecorder(EventRecorderConfig(save_raw=True, camera_id="cam1"))
+        rec.start()
+        rec.write(raw_frame)      # 由 RecordingWorker 定速呼叫
+        rec.trigger()             # 偵測到事件時呼叫（任何執行緒皆可）
+        rec.stop()
+    """
+
+    def __init__(self, cfg: EventRecorderConfig):
+        super().__init__(cfg)
+        self.cfg: EventRecorderConfig = cfg
+
+        buffer_fps = min(cfg.pre_roll_fps, cfg.fps)
+        maxlen = max(1, int(cfg.pre_roll_seconds * buffer_fps))
+        self._pre_roll: Deque[BufferedFrame] = deque(maxlen=maxlen)
+        self._buffer_interval = 1.0 / buffer_fps
+        self._last_buffered = 0.0
+        self._encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), cfg.jpeg_quality]
+
+        # trigger() 可能來自 YOLO 執行緒，write() 來自 RecordingWorker
+        self._trigger_lock = threading.Lock()
+        self._record_until = 0.0
+
+    # ---- public API ----
+    def trigger(self, ts: Optional[float] = None) -> None:
+        """延長錄製截止時間（重疊的事件會合併）"""
+        super().trigger(ts)
+        until = (ts or time.time()) + self.cfg.post_roll_seconds
+        with self._trigger_lock:
+            if until > self._record_until:
+                self._record_until = until
+
+    def write(self, raw_frame=None, annotated_frame=None) -> None:
+        if not self.recording:
+            return
+        if raw_frame is None and annotated_frame is None:
+            return
+
+        now = time.time()
+        with self._trigger_lock:
+            record_until = self._record_until
+
+        clip_active = self.raw_writer is not None or self.annot_writer is not None
+        if not clip_active and now > record_until:
+            # 閒置：只有取樣到的幀才縮小 + 編碼，其餘直接丟掉
+            self._buffer(now, raw_frame, annotated_frame)
+            return
+
+        if self.cfg.target_size is not None:
+            if raw_frame is not None:
+                raw_frame = cv2.resize(raw_frame, self.cfg.target_size)
+            if annotated_frame is not None:
+                annotated_frame = cv2.resize(annotated_frame, self.cfg.target_size)
+
+        if clip_active and now > record_until:
+            # post-roll 結束 → 關檔，交給 faststart/HLS 後處理
+            self._release_writers()
+            self.segment_start_time = None
+            clip_active = False
+            logger.info("事件錄影結束 (%s)", self.cfg.camera_id)
+
+        if not clip_active:
+            if now <= record_until:
+                self._open_clip(now, raw_frame, annotated_frame)
+            else:
+                self._buffer(now, raw_frame, annotated_frame)
+            return
+
+        # 錄製中：單段過長時切新檔（不帶 pre-roll）
+        assert self.segment_start_time is not None
+        if now - self.segment_start_time >= self.segment_seconds:
+            self._init_writers(raw_frame if raw_frame is not None else annotated_frame)
+            self._segment_has_activity = True
+
+        self._write_frames(raw_frame, annotated_frame)
+
+    def stop(self, wait_faststart: bool = False) -> None:
+        super().stop(wait_faststart=wait_faststart)
+        self._pre_roll.clear()
+
+    # ---- internal helpers ----
+    def _buffer(self, ts: float, raw_frame, annotated_frame) -> None:
+        # 容許半幀的時間誤差，避免 fps 抖動讓取樣間隔多跳一幀
+        if ts - self._last_buffered < self._buffer_interval - 0.5 / self.cfg.fps:
+            return
+        raw_jpg = self._encode(raw_frame) if self.cfg.save_raw else None
+        annot_jpg = self._encode(annotated_frame) if self.cfg.save_annot else None
+        if raw_jpg is None and annot_jpg is None:
+            return
+        self._last_buffered = ts
+        self._pre_roll.append((ts, raw_jpg, annot_jpg))
+
+    def _encode(self, frame) -> Optional[np.ndarray]:
+        if frame is None:
+            return None
+        h, w = frame.shape[:2]
+        if self.cfg.target_size is not None:
+            w, h = self.cfg.target_size
+        size = (max(1, int(w * self.cfg.pre_roll_scale)), max(1, int(h * self.cfg.pre_roll_scale)))
+        # 原始幀直接縮到 buffer 尺寸（不先縮到輸出尺寸）
+        if (frame.shape[1], frame.shape[0]) != size:
+            frame = cv2.resize(frame, size)
+        ok, buf = cv2.imencode(".jpg", frame, self._encode_params)
+        return buf if ok else None
+
+    @staticmethod
+    def _decode(jpg: Optional[np.ndarray], size: Tuple[int, int]) -> Optional[np.ndarray]:
+        if jpg is None:
+            return None
+        frame = cv2.imdecode(jpg, cv2.IMREAD_COLOR)
+        if (frame.shape[1], frame.shape[0]) != size:
+            frame = cv2.resize(frame, size)
+        return frame
+
+    def _open_clip(self, now: float, raw_frame, annotated_frame) -> None:
+        """
+        開新檔，先寫入 pre-roll 再寫當前幀
+        每個取樣幀依時間戳放到片段時間軸上（重複到下一個取樣時間），片段內秒數 = 實際經過時間
+        """
+        # 超過 pre_roll_seconds 的取樣（例如 write 中斷過）不放進片段，避免片段開頭被拉長
+        buffered = [f for f in self._pre_roll if now - f[0] <= self.cfg.pre_roll_seconds]
+        self._pre_roll.clear()
+        self._last_buffered = 0.0
+
+        started_ts = buffered[0][0] if buffered else time.time()
+        frame_for_size = raw_frame if raw_frame is not None else annotated_frame
+        self._init_writers(frame_for_size, started_at=datetime.fromtimestamp(started_ts))
+        self._segment_has_activity = True  # 事件片段一律視為有活動
+        logger.info(
+            "事件錄影開始 (%s)，pre-roll %d 幀",
+            self.cfg.camera_id, len(buffered),
+        )
+
+        size = (frame_for_size.shape[1], frame_for_size.shape[0])
+        written = 0
+        for i, (ts, raw_jpg, annot_jpg) in enumerate(buffered):
+            next_ts = buffered[i + 1][0] if i + 1 < len(buffered) else now
+            # 寫到下一個取樣時間對應的幀號為止（以累計幀數對齊，不累積四捨五入誤差）
+            repeat = round((next_ts - started_ts) * self.cfg.fps) - written
+            if repeat <= 0:
+                continue
+            raw = self._decode(raw_jpg, size)
+            annot = self._decode(annot_jpg, size)
+            for _ in range(repeat):
+                self._write_frames(raw, annot)
+            written += repeat
+
+        self._write_frames(raw_frame, annotated_frame)
@@ -0,0 +1,256 @@
+# modules/video/hls_ladder.py
+"""
+多碼率 HLS（延遲產生）
+- 原本的 playlist.m3u8 當作原生畫質，不重新編碼
+- 較低畫質（360p 等）只在有人請求該分段時才轉，轉完留在 HLS 目錄當快取
+- 同一個 rendition 同時只會有一個 ffmpeg（single-flight），全域同時轉檔數有上限
+- 以 -hls_playlist_type event 輸出，轉檔中播放器即可開始播放
+- 原生畫質的解析度 / 碼率在轉檔完成後寫進 stream.json，主清單不必每次 ffprobe
+- 轉檔失敗的 rendition 冷卻一段時間後才再試
+
+輸出結構：
+20260129_143000_raw/
+├── master.m3u8        # 多碼率主清單
+├── playlist.m3u8      # 原生畫質
+├── stream.json        # 原生畫質的寬高 / 碼率
+└── r360/
+    ├── playlist.m3u8
+    └── seg_000.ts ...
+"""
+from __future__ import annotations
+
+import json
+import time
+import shutil
+import logging
+import subprocess
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from modules.video.hls_playlist import parse_media_playlist
+from modules.video.thumbnails import probe_size
+
+logger = logging.getLogger(__name__)
+
+MASTER_PLAYLIST_NAME = "master.m3u8"
+NATIVE_PLAYLIST_NAME = "playlist.m3u8"
+STREAM_INFO_NAME = "stream.json"
+RENDITION_MAX_CONCURRENT = 1  # 邊緣裝置 CPU 有限，一次只轉一個
+FAILED_RETRY_SEC = 600.0      # 轉檔失敗後多久才再試
+FAILED_MAX_ENTRIES = 256      # 失敗記錄上限（超過時丟掉最舊的）
+
+
+@dataclass(frozen=True)
+class Rendition:
+    name: str        # 子目錄名稱，例如 r360
+    height: int
+    bitrate: str     # 例如 "400k"
+
+    @property
+    def bandwidth(self) -> int:
+        """EXT-X-STREAM-INF BANDWIDTH（峰值，含 maxrate 與 TS 封裝開銷）"""
+        return int(self.bitrate.rstrip("k")) * 1000 * 12 // 10
+
+
+LADDER: List[Rendition] = [
+    Rendition("r360", 360, "400k"),
+    Rendition("r540", 540, "900k"),
+]
+LADDER_BY_NAME: Dict[str, Rendition] = {r.name: r for r in LADDER}
+
+_lock = threading.Lock()
+_encode_slots = threading.Semaphore(RENDITION_MAX_CONCURRENT)
+_running: Dict[Path, threading.Thread] = {}
+_failed: Dict[Path, float] = {}   # out_dir → 失敗時間（monotonic）
+
+
+# === 主清單 ===
+
+def build_master_playlist(hls_dir: Path, ladder_enabled: bool = True) -> Optional[str]:
+    """
+    產生 master.m3u8 內容；只列出比原生畫質低的 rendition。
+    原生清單不存在時回傳 None。
+    """
+    native_playlist = hls_dir / NATIVE_PLAYLIST_NAME
+    if not native_playlist.exists():
+        return None
+
+    info = read_stream_info(hls_dir)
+    if info is None:
+        # 舊的分段沒有 stream.json → 第一次請求時補寫
+        info = write_stream_info(hls_dir)
+    size = (info["width"], info["height"]) if info.get("width") else None
+    native_height = size[1] if size else 0
+
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+    native_inf = f"#EXT-X-STREAM-INF:BANDWIDTH={info['bandwidth']}"
+    if size:
+        native_inf += f",RESOLUTION={size[0]}x{size[1]}"
+    lines += [native_inf, NATIVE_PLAYLIST_NAME]
+
+    if ladder_enabled and native_height:
+        for r in LADDER:
+            if r.height >= native_height:
+                continue
+            width = _even(size[0] * r.height // native_height)
+            lines += [
+                f"#EXT-X-STREAM-INF:BANDWIDTH={r.bandwidth},RESOLUTION={width}x{r.height}",
+                f"{r.name}/{NATIVE_PLAYLIST_NAME}",
+            ]
+    return "\n".join(lines) + "\n"
+
+
+def write_stream_info(hls_dir: Path) -> Dict[str, Any]:
+    """
+    原生 HLS 轉完後呼叫：ffprobe 第一個片段的寬高、由片段大小估算碼率，寫入 stream.json
+    寫檔失敗時仍回傳結果（下次請求再試）
+    """
+    first_ts = next(iter(sorted(hls_dir.glob("seg_*.ts"))), None)
+    size = probe_size(first_ts) if first_ts else None
+    info: Dict[str, Any] = {
+        "width": size[0] if size else None,
+        "height": size[1] if size else None,
+        "bandwidth": _native_bandwidth(hls_dir),
+    }
+    if size:  # 量不到尺寸時不寫，避免把暫時性的 ffprobe 失敗存下來
+        try:
+            tmp = hls_dir / (STREAM_INFO_NAME + ".tmp")
+            tmp.write_text(json.dumps(info), encoding="utf-8")
+            tmp.replace(hls_dir / STREAM_INFO_NAME)
+        except OSError:
+            logger.warning("stream.json 寫入失敗: %s", hls_dir.name)
+    return info
+
+
+def read_stream_info(hls_dir: Path) -> Optional[Dict[str, Any]]:
+    try:
+        info = json.loads((hls_dir / STREAM_INFO_NAME).read_text(encoding="utf-8"))
+        return info if "bandwidth" in info else None
+    except (OSError, ValueError):
+        return None
+
+
+def _native_bandwidth(hls_dir: Path) -> int:
+    """原生畫質以實際 TS 大小 / 長度估算（CRF 編碼沒有固定碼率）"""
+    try:
+        entries = parse_media_playlist(hls_dir / NATIVE_PLAYLIST_NAME)
+        seconds = sum(d for d, _ in entries)
+        total = sum((hls_dir / uri).stat().st_size for _, uri in entries)
+        peak = max((hls_dir / uri).stat().st_size * 8 / d for d, uri in entries if d > 0)
+        return int(max(peak, total * 8 / seconds if seconds else 0))
+    except (OSError, ValueError):
+        return 800_000
+
+
+def _even(n: int) -> int:
+    return n - n % 2
+
+
+# === 延遲轉檔 ===
+
+def ensure_rendition(hls_dir: Path, rendition: Rendition) -> Optional[Path]:
+    """
+    確保 rendition 已存在或正在產生，回傳其 playlist 路徑。
+    最近轉檔失敗（冷卻中）或來源不存在時回傳 None。
+    """
+    out_dir = hls_dir / rendition.name
+    playlist = out_dir / NATIVE_PLAYLIST_NAME
+    mp4_path = hls_dir.with_suffix(".mp4")
+
+    with _lock:
+        if out_dir in _running:
+            return playlist
+        if _recently_failed(out_dir) or not mp4_path.exists():
+            return None
+        if playlist.exists() and "#EXT-X-ENDLIST" in playlist.read_text(encoding="utf-8"):
+            return playlist
+
+        t = threading.Thread(
+            target=_encode,
+            args=(mp4_path, out_dir, rendition),
+            name=f"HLS-{rendition.name}-{hls_dir.name}",
+            daemon=True,
+        )
+        _running[out_dir] = t
+        t.start()
+    return playlist
+
+
+def _recently_failed(out_dir: Path) -> bool:
+    """呼叫端需持有 _lock；冷卻時間過了就移除記錄，允許重新轉檔"""
+    failed_at = _failed.get(out_dir)
+    if failed_at is None:
+        return False
+    if time.monotonic() - failed_at < FAILED_RETRY_SEC:
+        return True
+    del _failed[out_dir]
+    return False
+
+
+def _mark_failed(out_dir: Path) -> None:
+    """呼叫端需持有 _lock；超過上限時先清掉冷卻結束的，再丟掉最舊的"""
+    now = time.monotonic()
+    _failed.pop(out_dir, None)
+    if len(_failed) >= FAILED_MAX_ENTRIES:
+        for path in [p for p, t in _failed.items() if now - t >= FAILED_RETRY_SEC]:
+            del _failed[path]
+        while len(_failed) >= FAILED_MAX_ENTRIES:
+            del _failed[next(iter(_failed))]  # dict 依插入順序 → 最舊的在前面
+    _failed[out_dir] = now
+
+
+def is_encoding(hls_dir: Path, rendition: Rendition) -> bool:
+    with _lock:
+        return (hls_dir / rendition.name) in _running
+
+
+def _encode(mp4_path: Path, out_dir: Path, rendition: Rendition) -> None:
+    ok = False
+    try:
+        with _encode_slots:
+            # 上次中斷留下的半成品
+            if out_dir.exists():
+                shutil.rmtree(out_dir)
+            out_dir.mkdir(parents=True)
+
+            result = subprocess.run(
+                [
+                    "ffmpeg", "-y", "-i", str(mp4_path),
+                    "-vf", f"scale=-2:{rendition.height}",
+                    "-c:v", "libx264",
+                    "-preset", "veryfast",
+                    "-b:v", rendition.bitrate,
+                    "-maxrate", rendition.bitrate,
+                    "-bufsize", rendition.bitrate,
+                    "-force_key_frames", "expr:gte(t,n_forced*2)",  # 每 2 秒一個關鍵幀，切片對齊
+                    "-an",
+                    "-hls_time", "2",
+                    "-hls_list_size", "0",
+                    "-hls_playlist_type", "event",  # 邊轉邊寫，播放器可先播
+                    "-hls_segment_filename", str(out_dir / "seg_%03d.ts"),
+                    "-f", "hls",
+                    str(out_dir / NATIVE_PLAYLIST_NAME),
+                ],
+                capture_output=True,
+                timeout=300,
+            )
+        ok = result.returncode == 0
+        if ok:
+            logger.info("HLS rendition 完成: %s/%s", mp4_path.stem, rendition.name)
+        else:
+            logger.warning(
+                "HLS rendition 失敗: %s/%s - %s",
+                mp4_path.stem, rendition.name, result.stderr.decode()[-300:],
+            )
+    except subprocess.TimeoutExpired:
+        logger.warning("HLS rendition 逾時: %s/%s", mp4_path.stem, rendition.name)
+    except Exception:
+        logger.exception("HLS rendition 錯誤: %s/%s", mp4_path.stem, rendition.name)
+    finally:
+        with _lock:
+            _running.pop(out_dir, None)
+            if not ok:
+                _mark_failed(out_dir)
+                shutil.rmtree(out_dir, ignore_errors=True)
@@ -0,0 +1,160 @@
+# modules/video/hls_playlist.py
+"""
+整天（日期目錄）的 HLS 播放清單
+- 直接引用各分段既有的 seg_xxx.ts，不重新切片
+- 每段開頭加 EXT-X-PROGRAM-DATE-TIME，分段之間加 EXT-X-DISCONTINUITY
+- 分段轉檔完成時增量附加；順序不對或 target duration 變大時整份重建
+
+輸出：recordings/{camera_id}/{date}/day.m3u8
+片段 URI 為相對路徑 {stem}/seg_000.ts，與單段 HLS 端點共用
+"""
+from __future__ import annotations
+
+import math
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DAY_PLAYLIST_NAME = "day.m3u8"
+SEGMENT_PLAYLIST_NAME = "playlist.m3u8"
+MIN_TARGET_DURATION = 10  # 預留空間，避免之後附加的片段超過 target duration
+
+_lock = threading.Lock()
+
+
+def parse_media_playlist(path: Path) -> List[Tuple[float, str]]:
+    """解析單段 playlist.m3u8，回傳 [(duration, uri), ...]"""
+    entries: List[Tuple[float, str]] = []
+    duration: Optional[float] = None
+    for line in path.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if line.startswith("#EXTINF:"):
+            duration = float(line[len("#EXTINF:"):].split(",", 1)[0])
+        elif line and not line.startswith("#") and duration is not None:
+            entries.append((duration, line))
+            duration = None
+    return entries
+
+
+def _stem_start_time(stem: str) -> Optional[datetime]:
+    """20260129_143000_raw → datetime"""
+    try:
+        return datetime.strptime(stem[:15], "%Y%m%d_%H%M%S")
+    except ValueError:
+        return None
+
+
+def _segment_block(stem: str, entries: List[Tuple[float, str]], discontinuity: bool) -> str:
+    start = _stem_start_time(stem)
+    lines = []
+    if discontinuity:
+        lines.append("#EXT-X-DISCONTINUITY")
+    if start is not None:
+        # 帶時區，播放器才能換算成正確的牆上時間
+        pdt = start.astimezone().isoformat(timespec="milliseconds")
+        lines.append(f"#EXT-X-PROGRAM-DATE-TIME:{pdt}")
+    for duration, uri in entries:
+        lines.append(f"#EXTINF:{duration:.3f},")
+        lines.append(f"{stem}/{uri}")
+    return "\n".join(lines) + "\n"
+
+
+def _header(target_duration: int) -> str:
+    return (
+        "#EXTM3U\n"
+        "#EXT-X-VERSION:3\n"
+        f"#EXT-X-TARGETDURATION:{target_duration}\n"
+        "#EXT-X-MEDIA-SEQUENCE:0\n"
+        "#EXT-X-PLAYLIST-TYPE:EVENT\n"
+    )
+
+
+def _read_target_duration(text: str) -> int:
+    for line in text.splitlines():
+        if line.startswith("#EXT-X-TARGETDURATION:"):
+            return int(line.split(":", 1)[1])
+    return 0
+
+
+def rebuild_day_playlist(date_dir: Path) -> Optional[Path]:
+    """依目錄內已完成的 HLS 分段重建整份 day.m3u8"""
+    with _lock:
+        return _rebuild(date_dir)
+
+
+def _rebuild(date_dir: Path) -> Optional[Path]:
+    segments = []
+    for playlist in sorted(date_dir.glob(f"*_raw/{SEGMENT_PLAYLIST_NAME}")):
+        try:
+            entries = parse_media_playlist(playlist)
+        except (OSError, ValueError):
+            logger.warning("無法解析 HLS playlist: %s", playlist)
+            continue
+        if entries:
+            segments.append((playlist.parent.name, entries))
+
+    out_path = date_dir / DAY_PLAYLIST_NAME
+    if not segments:
+        out_path.unlink(missing_ok=True)
+        return None
+
+    max_duration = max(d for _, entries in segments for d, _ in entries)
+    target = max(MIN_TARGET_DURATION, math.ceil(max_duration))
+
+    body = "".join(
+        _segment_block(stem, entries, discontinuity=i > 0)
+        for i, (stem, entries) in enumerate(segments)
+    )
+
+    # 過去日期不會再有新分段 → 加上 ENDLIST
+    day = _stem_start_time(segments[-1][0])
+    footer = "#EXT-X-ENDLIST\n" if day and day.date() < datetime.now().date() else ""
+
+    tmp_path = out_path.with_suffix(".m3u8.tmp")
+    tmp_path.write_text(_header(target) + body + footer, encoding="utf-8")
+    tmp_path.replace(out_path)
+    return out_path
+
+
+def append_segment(mp4_path: Path) -> None:
+    """
+    分段 HLS 轉檔完成後呼叫：
+    依時間順序附加到 day.m3u8；否則（補轉檔 / 片段過長 / 清單不存在）整份重建
+    """
+    date_dir = mp4_path.parent
+    stem = mp4_path.with_suffix("").name
+    segment_playlist = date_dir / stem / SEGMENT_PLAYLIST_NAME
+    day_path = date_dir / DAY_PLAYLIST_NAME
+
+    with _lock:
+        if not segment_playlist.exists():
+            return
+        if not day_path.exists():
+            _rebuild(date_dir)
+            return
+
+        text = day_path.read_text(encoding="utf-8")
+        entries = parse_media_playlist(segment_playlist)
+        if not entries:
+            return
+
+        last_stem = _last_stem(text)
+        in_order = last_stem is None or stem > last_stem
+        fits = max(d for d, _ in entries) <= _read_target_duration(text)
+        if not (in_order and fits) or "#EXT-X-ENDLIST" in text:
+            _rebuild(date_dir)
+            return
+
+        with open(day_path, "a", encoding="utf-8") as f:
+            f.write(_segment_block(stem, entries, discontinuity=last_stem is not None))
+
+
+def _last_stem(text: str) -> Optional[str]:
+    for line in reversed(text.splitlines()):
+        if line and not line.startswith("#") and "/" in line:
+            return line.split("/", 1)[0]
+    return None
@@ -0,0 +1,112 @@
+# modules/video/thumbnails.py
+"""
+錄影時間軸縮圖（sprite sheet）
+- 只解碼關鍵幀（-skip_frame nokey），每 interval 秒取一張低解析度縮圖
+- 拼成一張 JPEG sprite，另存一份小 JSON 索引，讓前端不用載影片就能 scrub
+
+輸出結構（與 HLS 同目錄，保留策略刪分段時一併刪除）：
+20260129_143000_raw/
+├── playlist.m3u8
+├── sprite.jpg
+└── sprite.json
+"""
+from __future__ import annotations
+
+import json
+import math
+import logging
+import subprocess
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+THUMB_INTERVAL_SEC = 10     # 每幾秒一張
+THUMB_WIDTH = 160           # 縮圖寬度（高度依比例）
+SPRITE_COLUMNS = 6          # sprite 每列張數
+SPRITE_NAME = "sprite.jpg"
+SPRITE_INDEX_NAME = "sprite.json"
+
+
+def generate_sprite(
+    mp4_path: Path,
+    duration_seconds: Optional[float],
+    interval: int = THUMB_INTERVAL_SEC,
+    width: int = THUMB_WIDTH,
+    columns: int = SPRITE_COLUMNS,
+) -> Optional[Dict[str, Any]]:
+    """
+    產生 sprite.jpg + sprite.json，成功回傳索引內容（dict），失敗回傳 None
+    """
+    if not duration_seconds or duration_seconds <= 0:
+        return None
+
+    out_dir = mp4_path.with_suffix("")
+    out_dir.mkdir(exist_ok=True)
+    sprite_path = out_dir / SPRITE_NAME
+
+    count = max(1, math.ceil(duration_seconds / interval))
+    rows = math.ceil(count / columns)
+
+    try:
+        result = subprocess.run(
+            [
+                "ffmpeg", "-y",
+                "-skip_frame", "nokey",          # 只解碼關鍵幀
+                "-i", str(mp4_path),
+                "-an",
+                "-vf", f"fps=1/{interval},scale={width}:-2,tile={columns}x{rows}",
+                "-frames:v", "1",
+                "-q:v", "5",
+                str(sprite_path),
+            ],
+            capture_output=True,
+            timeout=60,
+        )
+        if result.returncode != 0 or not sprite_path.exists():
+            logger.warning("Sprite 產生失敗: %s - %s", mp4_path.name, result.stderr.decode()[-300:])
+            return None
+
+        size = probe_size(sprite_path)
+        if size is None:
+            return None
+        sprite_w, sprite_h = size
+
+        index = {
+            "sprite": SPRITE_NAME,
+            "interval": interval,
+            "count": count,
+            "columns": columns,
+            "rows": rows,
+            "tile_width": sprite_w // columns,
+            "tile_height": sprite_h // rows,
+        }
+        (out_dir / SPRITE_INDEX_NAME).write_text(json.dumps(index), encoding="utf-8")
+        logger.debug("Sprite 產生完成: %s (%d 張)", mp4_path.name, count)
+        return index
+
+    except subprocess.TimeoutExpired:
+        logger.warning("Sprite 產生逾時: %s", mp4_path.name)
+    except Exception:
+        logger.exception("Sprite 產生錯誤: %s", mp4_path.name)
+    return None
+
+
+def probe_size(image_path: Path) -> Optional[tuple[int, int]]:
+    """用 ffprobe 取得圖片 / 影片尺寸 (width, height)"""
+    try:
+        result = subprocess.run(
+            [
+                "ffprobe", "-v", "error",
+                "-select_streams", "v:0",
+                "-show_entries", "stream=width,height",
+                "-of", "json",
+                str(image_path),
+            ],
+            capture_output=True,
+            timeout=10,
+        )
+        stream = json.loads(result.stdout)["streams"][0]
+        return int(stream["width"]), int(stream["height"])
+    except (subprocess.TimeoutExpired, OSError, KeyError, IndexError, ValueError):
+        return None
@@ -13,24 +13,39 @@ from typing import Optional, Tuple, Union
 
 import cv2
 
+from modules.storage.recording_index import recording_index, dir_size, probe_duration
+from modules.storage.visitor_db import visitor_db
+from modules.video.thumbnails import generate_sprite
+from modules.video import hls_playlist
+from modules.video.hls_ladder import write_stream_info
+
 logger = logging.getLogger(__name__)
 
 
-def _faststart_worker(queue: Queue, enable_hls: bool = True):
+def _faststart_worker(
+    queue: Queue,
+    enable_hls: bool = True,
+    enable_thumbnails: bool = True,
+    link_visitor_entries: bool = False,
+):
     """
     背景執行緒：處理 ffmpeg 佇列
     1. 將 moov atom 移到檔案開頭（faststart）
     2. 轉換成 HLS 格式（可選）
+    3. 產生時間軸縮圖 sprite（可選）
+    4. 把分段期間還沒對應到錄影的進店事件連到這段（可選）
     """
     while True:
         file_path = queue.get()
         if file_path is None:  # 結束信號
             break
 
+        hls_status = "failed"  # 檔案不存在 / 例外時的狀態
         try:
             path = Path(file_path)
             if not path.exists():
                 continue
+            hls_status = "none"
 
             # === Step 1: Faststart ===
             temp_path = path.with_suffix(".tmp.mp4")
@@ -51,23 +66,88 @@ def _faststart_worker(queue: Queue, enable_hls: bool = True):
             else:
                 temp_path.unlink(missing_ok=True)
                 logger.warning("faststart 處理失敗: %s", path.name)
+                hls_status = "failed"
                 continue  # 跳過 HLS 轉換
 
             # === Step 2: HLS 轉換 ===
             if enable_hls:
-                _convert_to_hls(path)
+                hls_status = "ready" if _convert_to_hls(path) else "failed"
+                if hls_status == "ready":
+                    _update_day_playlist(path)
+                    _write_stream_info(path)
+
+            # === Step 3: 時間軸縮圖 ===
+            if enable_thumbnails:
+                _make_thumbnails(path)
 
         except subprocess.TimeoutExpired:
             logger.warning("處理逾時: %s", file_path)
+            hls_status = "failed"
         except Exception as e:
             logger.exception("處理錯誤: %s", e)
+            hls_status = "failed"
         finally:
+            _index_processed(Path(file_path), hls_status)
+            if link_visitor_entries:
+                _link_visitor_entries(Path(file_path))
             queue.task_done()
 
 
-def _convert_to_hls(mp4_path: Path):
+def _index_processed(path: Path, hls_status: str) -> None:
+    """更新錄影索引的後處理狀態（索引失敗不影響錄影）"""
+    try:
+        size = path.stat().st_size if path.exists() else None
+        hls_bytes = dir_size(path.with_suffix(""))
+        recording_index.segment_processed(path, hls_status, size, hls_bytes)
+    except Exception:
+        logger.exception("Recording index update failed: %s", path.name)
+
+
+def _link_visitor_entries(path: Path) -> None:
+    """
+    事件錄影的 pre-roll 期間發生的進店事件，寫入時分段還沒開檔 → 關檔後補上對應
+    只查這段的時間範圍；找不到的事件維持 NULL（查詢 API 不再回頭補）
+    """
+    try:
+        seg = recording_index.get_segment(path)
+        if seg is None or seg.end_time is None:
+            return
+        visitor_db.backfill_recording_offsets(recording_index, seg.camera_id, seg.start_time, seg.end_time)
+    except Exception:
+        logger.exception("Visitor entry linking failed: %s", path.name)
+
+
+def _update_day_playlist(path: Path) -> None:
+    """把新分段附加到整天的 day.m3u8（失敗不影響單段回放）"""
+    try:
+        hls_playlist.append_segment(path)
+    except Exception:
+        logger.exception("Day playlist update failed: %s", path.name)
+
+
+def _write_stream_info(path: Path) -> None:
+    """記下原生畫質的寬高 / 碼率，主清單請求時不必再 ffprobe（失敗時由主清單請求補寫）"""
+    try:
+        write_stream_info(path.with_suffix(""))
+    except Exception:
+        logger.exception("Stream info write failed: %s", path.name)
+
+
+def _make_thumbnails(path: Path) -> None:
+    """產生 sprite 並寫入索引（長度優先用索引記錄的實際長度）"""
+    try:
+        seg = recording_index.get_segment(path)
+        duration = seg.duration_seconds if seg and seg.duration_seconds else probe_duration(path)
+        thumbnails = generate_sprite(path, duration)
+        if thumbnails:
+            recording_index.set_thumbnails(path, thumbnails)
+    except Exception:
+        logger.exception("Thumbnail generation failed: %s", path.name)
+
+
+def _convert_to_hls(mp4_path: Path) -> bool:
     """
-    將 MP4 轉換成 HLS 格式（重新編碼為 H.264）
+    將 MP4 轉換成 HLS 格式（重新編碼為 H.264），成功回傳 True
 
     輸出結構：
     20260129_143000_raw.mp4
@@ -108,13 +188,14 @@ def _convert_to_hls(mp4_path: Path):
 
         if result.returncode == 0:
             logger.info("HLS 轉換完成: %s", hls_dir.name)
-        else:
-            logger.warning("HLS 轉換失敗: %s - %s", mp4_path.name, result.stderr.decode()[-500:])
+            return True
+        logger.warning("HLS 轉換失敗: %s - %s", mp4_path.name, result.stderr.decode()[-500:])
 
     except subprocess.TimeoutExpired:
         logger.warning("HLS 轉換逾時: %s", mp4_path.name)
     except Exception as e:
         logger.exception("HLS 轉換錯誤: %s", e)
+    return False
 
 
 @dataclass(frozen=True)
@@ -129,6 +210,9 @@ class RecorderConfig:
     target_size: Optional[Tuple[int, int]] = (960, 540)  # (width, height)
     enable_faststart: bool = True  # 啟用 ffmpeg faststart 後處理
     enable_hls: bool = True  # 啟用 HLS 轉換（需要 enable_faststart）
+    enable_index: bool = True  # 寫入錄影索引（需要 camera_id）
+    enable_thumbnails: bool = True  # 產生時間軸縮圖 sprite（需要 enable_faststart）
+    link_visitor_entries: bool = False  # 後處理時把進店事件連到分段（只給產生進店事件的攝影機）
 
 
 class VideoRecorder:
@@ -158,6 +242,8 @@ class VideoRecorder:
         # 追蹤當前錄製的檔案路徑（用於 faststart 後處理）
         self._current_raw_path: Optional[Path] = None
         self._current_annot_path: Optional[Path] = None
+        self._frames_written = 0  # 當前分段實際寫入幀數（用於計算真實長度）
+        self._segment_has_activity = False  # 當前分段是否收過 trigger()（保留策略用）
 
         # faststart + HLS 後處理佇列
         self._faststart_queue: Optional[Queue] = None
@@ -166,15 +252,15 @@ class VideoRecorder:
             self._faststart_queue = Queue()
             self._faststart_thread = threading.Thread(
                 target=_faststart_worker,
-                args=(self._faststart_queue, cfg.enable_hls),
+                args=(self._faststart_queue, cfg.enable_hls, cfg.enable_thumbnails, cfg.link_visitor_entries),
                 daemon=True,
                 name="FaststartWorker"
             )
             self._faststart_thread.start()
 
     # ---- internal helpers ----
-    def _make_today_dir(self) -> Path:
-        today = datetime.now().strftime("%Y%m%d")
+    def _make_today_dir(self, when: Optional[datetime] = None) -> Path:
+        today = (when or datetime.now()).strftime("%Y%m%d")
         # 若有 camera_id，使用 {output_dir}/{camera_id}/{date}/ 結構
         if self.cfg.camera_id:
             day_dir = self.output_dir / self.cfg.camera_id / today
@@ -199,6 +285,9 @@ class VideoRecorder:
         self._current_raw_path = None
         self._current_annot_path = None
 
+        if raw_path and raw_path.exists():
+            self._index_closed(raw_path)
+
         # 佇列 faststart 後處理
         if self._faststart_queue is not None:
             if raw_path and raw_path.exists():
@@ -206,14 +295,16 @@ class VideoRecorder:
             if annot_path and annot_path.exists():
                 self._faststart_queue.put(str(annot_path))
 
-    def _init_writers(self, frame_for_size) -> None:
+    def _init_writers(self, frame_for_size, started_at: Optional[datetime] = None) -> None:
+        """開新分段；started_at 用於檔名（事件錄影時為 pre-roll 第一幀的時間）"""
         self._release_writers()
 
         fourcc = cv2.VideoWriter_fourcc(*self.cfg.fourcc)
         self.segment_start_time = time.time()
 
-        day_dir = self._make_today_dir()
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        started_at = started_at or datetime.now()
+        day_dir = self._make_today_dir(started_at)
+        timestamp = started_at.strftime("%Y%m%d_%H%M%S")
 
         # 決定輸出尺寸
         if self.cfg.target_size is not None:
@@ -221,12 +312,16 @@ class VideoRecorder:
         else:
             frame_h, frame_w = frame_for_size.shape[:2]
 
+        self._frames_written = 0
+        self._segment_has_activity = False
+
         if self.cfg.save_raw:
             raw_path = day_dir / f"{timestamp}_raw.mp4"
             self._current_raw_path = raw_path
             self.raw_writer = cv2.VideoWriter(
                 str(raw_path), fourcc, self.cfg.fps, (frame_w, frame_h)
             )
+            self._index_opened(raw_path, started_at)
 
         if self.cfg.save_annot:
             annot_path = day_dir / f"{timestamp}_annot.mp4"
@@ -235,11 +330,37 @@ class VideoRecorder:
                 str(annot_path), fourcc, self.cfg.fps, (frame_w, frame_h)
             )
 
+    def _index_opened(self, raw_path: Path, started_at: datetime) -> None:
+        if not (self.cfg.enable_index and self.cfg.camera_id):
+            return
+        try:
+            recording_index.segment_opened(
+                self.cfg.camera_id, raw_path, started_at, codec=self.cfg.fourcc)
+        except Exception:
+            logger.exception("Recording index update failed: %s", raw_path.name)
+
+    def _index_closed(self, raw_path: Path) -> None:
+        if not (self.cfg.enable_index and self.cfg.camera_id):
+            return
+        try:
+            recording_index.segment_closed(
+                raw_path,
+                duration_seconds=self._frames_written / self.cfg.fps,
+                size_bytes=raw_path.stat().st_size,
+                has_activity=self._segment_has_activity,
+            )
+        except Exception:
+            logger.exception("Recording index update failed: %s", raw_path.name)
+
     # ---- public API ----
     def start(self) -> None:
         self.recording = True
         self.segment_start_time = None  # 讓下一幀觸發 init
 
+    def trigger(self, ts: Optional[float] = None) -> None:
+        """通知有事件發生：連續錄影只標記當前分段有活動（保留較久）"""
+        self._segment_has_activity = True
+
     def write(self, raw_frame=None, annotated_frame=None) -> None:
         if not self.recording:
             return
@@ -266,8 +387,12 @@ class VideoRecorder:
                 annotated_frame = cv2.resize(
                     annotated_frame, self.cfg.target_size)
 
+        self._write_frames(raw_frame, annotated_frame)
+
+    def _write_frames(self, raw_frame, annotated_frame) -> None:
         if self.cfg.save_raw and self.raw_writer is not None and raw_frame is not None:
             self.raw_writer.write(raw_frame)
+            self._frames_written += 1
 
         if self.cfg.save_annot and self.annot_writer is not None and annotated_frame is not None:
             self.annot_writer.write(annotated_frame)
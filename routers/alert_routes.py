@@ -4,6 +4,7 @@ from __future__ import annotations
 from fastapi import APIRouter, HTTPException, Depends
 
 from modules.notifications.alert_manager import alert_manager
+from modules.storage.async_access import data_access
 from pydantic import BaseModel
 from routers.dashboard_routes import verify_token
 
@@ -41,7 +42,8 @@ async def get_user_alert(user_id: str):
 async def update_user_alert(user_id: str, body: AlertUpdate):
     """更新某個 user 的通知開關"""
     try:
-        alert_manager.set_notifications(user_id, body.enabled)
+        # 會重寫 users.json → 放到檔案系統 pool，不卡 event loop
+        await data_access.fs(alert_manager.set_notifications, user_id, body.enabled)
     except KeyError:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -13,6 +13,13 @@ from fastapi import APIRouter, HTTPException, Query, Request, Depends
 from pydantic import BaseModel
 
 from modules.storage.visitor_db import visitor_db
+from modules.storage.async_access import data_access
+from modules.storage.query_cache import query_cache, paths_cache
+from modules.storage.visitor_analytics import visitor_analytics
+from modules.storage.r2_uploader import upload_metrics
+from modules.storage.r2_inventory import get_r2_inventory
+from modules.core.loop_monitor import loop_monitor
+from modules.core.track_analytics import summarize_hourly, summarize_range
 from modules.core.shop_state_manager import shop_state_manager
 from modules.core.shop_config import get_shop_config
 
@@ -36,6 +43,11 @@ _login_attempts: dict[str, list[float]] = {}  # IP → [attempt_timestamps]
 RATE_LIMIT_WINDOW = 60  # 60 秒視窗
 RATE_LIMIT_MAX_ATTEMPTS = 5  # 視窗內最多 5 次嘗試
 
+# === 統計查詢結果快取：有新事件寫入時只丟掉涵蓋該日期的結果 ===
+visitor_db.add_write_listener(query_cache.invalidate_dates)
+# 軌跡分析每分鐘 flush 一次，分開快取才不會一直丟掉訪客統計
+visitor_db.add_track_stats_listener(paths_cache.invalidate_dates)
+
 
 def _get_settings(request: Request):
     settings = getattr(request.app.state, "settings", None)
@@ -298,9 +310,60 @@ class SummaryResponse(BaseModel):
     peak_hour: Optional[PeakHour]
 
 
+class TrackMetric(BaseModel):
+    count: int
+    mean: Optional[float]  # 秒
+    p50: Optional[float]
+    p90: Optional[float]
+    p99: Optional[float]
+
+
+class PathsResponse(BaseModel):
+    range: str
+    start_date: str
+    end_date: str
+    dwell: TrackMetric          # 店內停留時間
+    time_to_enter: TrackMetric  # 門口 → 進店耗時
+    door_pass: TrackMetric      # 路過門口未進店（count = 人次，數值為門口停留時間）
+
+
+class PathsHourlyItem(BaseModel):
+    hour: int
+    dwell: Optional[TrackMetric]
+    time_to_enter: Optional[TrackMetric]
+    door_pass: Optional[TrackMetric]
+
+
+class PathsHourlyResponse(BaseModel):
+    date: str
+    hourly_data: list[PathsHourlyItem]
+
+
+class WeeklyPatternResponse(BaseModel):
+    range: str
+    start_date: str
+    end_date: str
+    weekday_avg: list[float]        # 週一..週日 平均每天人次
+    hour_avg: list[float]           # 0..23 點 平均每天人次
+    matrix: list[list[float]]       # [weekday][hour] 平均人次
+
+
+class YearSeries(BaseModel):
+    year: int
+    counts: list[int]
+
+
+class YearOverYearResponse(BaseModel):
+    granularity: str
+    series: list[YearSeries]
+
+
 # === Range Type ===
 RangeType = Literal["7d", "14d", "30d", "90d", "365d"]
 
+# 趨勢圖的 bucket 粒度（week 以週一日期標示，month 為 YYYY-MM）
+GranularityType = Literal["day", "week", "month"]
+
 RANGE_DAYS = {
     "7d": 7,
     "14d": 14,
@@ -340,7 +403,10 @@ async def get_hourly(
     """取得指定日期的每小時分布"""
 
     d = date.fromisoformat(target_date) if target_date else date.today()
-    hourly = visitor_db.get_hourly_distribution(d)
+    hourly = await query_cache.get_or_load(
+        ("hourly", d), d, d,
+        lambda: data_access.read(visitor_db.get_hourly_distribution, d),
+    )
 
     return HourlyResponse(
         date=d.isoformat(),
@@ -353,14 +419,24 @@ async def get_daily(
     request: Request,
     token: str = Depends(verify_token),
     range: RangeType = Query("7d"),
+    granularity: GranularityType = Query("day"),
 ):
-    """取得每日訪客趨勢"""
+    """取得訪客趨勢（每日 / 每週 / 每月，讀取彙總表）"""
 
     days = RANGE_DAYS[range]
-    daily = visitor_db.get_daily_trend(days)
-
     end_date = date.today()
     start_date = end_date - timedelta(days=days - 1)
+    # 第一個週 / 月 bucket 可能從 start_date 之前開始
+    if granularity == "week":
+        first_day = start_date - timedelta(days=start_date.weekday())
+    elif granularity == "month":
+        first_day = start_date.replace(day=1)
+    else:
+        first_day = start_date
+    daily = await query_cache.get_or_load(
+        ("daily", granularity, start_date, end_date), first_day, end_date,
+        lambda: data_access.read(visitor_db.get_period_trend, granularity, start_date, end_date),
+    )
 
     return DailyResponse(
         range=range,
@@ -379,7 +455,11 @@ async def get_summary(
     """取得統計摘要"""
 
     days = RANGE_DAYS[range]
-    summary = visitor_db.get_summary(days)
+    end_date = date.today()
+    summary = await query_cache.get_or_load(
+        ("summary", days, end_date), end_date - timedelta(days=days - 1), end_date,
+        lambda: data_access.read(visitor_db.get_summary, days),
+    )
 
     return SummaryResponse(
         range=range,
@@ -388,3 +468,124 @@ async def get_summary(
         peak_day=PeakDay(**summary["peak_day"]) if summary["peak_day"] else None,
         peak_hour=PeakHour(**summary["peak_hour"]) if summary["peak_hour"] else None,
     )
+
+
+@router.get("/paths", response_model=PathsResponse)
+async def get_paths(
+    request: Request,
+    token: str = Depends(verify_token),
+    range: RangeType = Query("30d"),
+):
+    """取得停留時間 / 進店耗時 / 路過未進店統計（讀取軌跡分析彙總）"""
+
+    days = RANGE_DAYS[range]
+    end_date = date.today()
+    start_date = end_date - timedelta(days=days - 1)
+    stats = await paths_cache.get_or_load(
+        ("paths", start_date, end_date), start_date, end_date,
+        lambda: data_access.read(summarize_range, visitor_db, start_date, end_date),
+    )
+
+    return PathsResponse(
+        range=range,
+        start_date=start_date.isoformat(),
+        end_date=end_date.isoformat(),
+        **{metric: TrackMetric(**summary) for metric, summary in stats.items()},
+    )
+
+
+@router.get("/paths/hourly", response_model=PathsHourlyResponse)
+async def get_paths_hourly(
+    request: Request,
+    token: str = Depends(verify_token),
+    target_date: Optional[str] = Query(
+        None, alias="date", pattern=r"^\d{4}-\d{2}-\d{2}$"),
+):
+    """取得指定日期每小時的軌跡分析統計（沒有資料的小時為 null）"""
+
+    d = date.fromisoformat(target_date) if target_date else date.today()
+    stats = await paths_cache.get_or_load(
+        ("paths_hourly", d), d, d,
+        lambda: data_access.read(summarize_hourly, visitor_db, d),
+    )
+
+    return PathsHourlyResponse(
+        date=d.isoformat(),
+        hourly_data=[
+            PathsHourlyItem(
+                hour=h,
+                **{
+                    metric: TrackMetric(**by_hour[h]) if h in by_hour else None
+                    for metric, by_hour in stats.items()
+                },
+            )
+            for h in range(24)
+        ],
+    )
+
+
+@router.get("/analytics/weekly", response_model=WeeklyPatternResponse)
+async def get_weekly_pattern(
+    request: Request,
+    token: str = Depends(verify_token),
+    range: RangeType = Query("90d"),
+):
+    """取得週間 × 時段來客型態（polars 分析，月分區快取）"""
+
+    days = RANGE_DAYS[range]
+    end_date = date.today()
+    start_date = end_date - timedelta(days=days - 1)
+    pattern = await query_cache.get_or_load(
+        ("weekly", start_date, end_date), start_date, end_date,
+        lambda: data_access.read(visitor_analytics.weekly_pattern, start_date, end_date),
+    )
+
+    return WeeklyPatternResponse(
+        range=range,
+        start_date=start_date.isoformat(),
+        end_date=end_date.isoformat(),
+        weekday_avg=pattern["weekday"],
+        hour_avg=pattern["hour"],
+        matrix=pattern["matrix"],
+    )
+
+
+@router.get("/analytics/yoy", response_model=YearOverYearResponse)
+async def get_year_over_year(
+    request: Request,
+    token: str = Depends(verify_token),
+    years: int = Query(2, ge=2, le=5),
+    granularity: Literal["month", "week"] = Query("month"),
+):
+    """取得年同期比較（近 N 年每月 / 每週人次）"""
+
+    today = date.today()
+    series = await query_cache.get_or_load(
+        ("yoy", years, granularity, today), date(today.year - years + 1, 1, 1), today,
+        lambda: data_access.read(visitor_analytics.year_over_year, years, granularity, today),
+    )
+
+    return YearOverYearResponse(
+        granularity=granularity,
+        series=[YearSeries(year=y, counts=counts) for y, counts in series.items()],
+    )
+
+
+@router.get("/metrics")
+async def get_metrics(
+    request: Request,
+    token: str = Depends(verify_token),
+):
+    """執行期指標：event loop 延遲、資料存取 pool 使用狀況、R2 上傳延遲 / 物件清單"""
+    settings = _get_settings(request)
+    metrics = {
+        "event_loop": loop_monitor.stats(),
+        "data_access": data_access.stats(),
+        "query_cache": query_cache.stats(),
+        "paths_cache": paths_cache.stats(),
+        "visitor_analytics": visitor_analytics.stats(),
+        "r2_uploads": upload_metrics.stats(),
+    }
+    if settings.r2_inventory_enabled:
+        metrics["r2_inventory"] = await data_access.read(get_r2_inventory().stats)
+    return metrics
@@ -3,16 +3,34 @@
 from __future__ import annotations
 
 import re
+import base64
+import asyncio
 import logging
 from pathlib import Path
 from datetime import datetime, date
-from typing import Optional, List
+from typing import AsyncIterator, Optional, List
 
 from fastapi import APIRouter, HTTPException, Query, Request, Depends
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from pydantic import BaseModel
 
-from modules.storage.visitor_db import visitor_db
+from modules.storage.visitor_db import visitor_db, entry_cursor, EntryCursor
+from modules.storage.event_export import EXPORT_FORMATS, make_event_writer, parquet_available
+from modules.storage.async_access import data_access
+from modules.storage.recording_index import recording_index, RecordingSegment
+from modules.storage.detection_store import ZONES, query_ranges
+from modules.storage.heatmap_store import render_heatmap_png
+from modules.storage.occupancy_store import RESOLUTIONS, ZONES as OCCUPANCY_ZONES, query_occupancy
+from modules.video.thumbnails import SPRITE_NAME, SPRITE_INDEX_NAME
+from modules.video.hls_ladder import (
+    LADDER_BY_NAME,
+    MASTER_PLAYLIST_NAME,
+    build_master_playlist,
+    ensure_rendition,
+    is_encoding,
+)
+from modules.video.hls_playlist import DAY_PLAYLIST_NAME, rebuild_day_playlist
+from modules.video.clip_export import CLIP_MAX_SECONDS, build_concat_list, stream_clip
 from routers.dashboard_routes import verify_token
 
 logger = logging.getLogger(__name__)
@@ -27,6 +45,12 @@ HLS_DIR_PATTERN = re.compile(r"^\d{8}_\d{6}_raw$")  # YYYYMMDD_HHMMSS_raw (HLS 
 TS_FILE_PATTERN = re.compile(r"^seg_\d{3}\.ts$")  # seg_000.ts
 CAMERA_ID_PATTERN = re.compile(r"^[a-zA-Z0-9_-]{1,20}$")  # 安全的 camera_id
 DEFAULT_CAMERA_ID = "cam1"
+RENDITION_WAIT_SEC = 15  # 延遲轉檔時，等待第一個片段寫出的上限
+EXPORT_CHUNK_SIZE = 5000  # 匯出時每次查詢 / 編碼的事件數
+
+# 產生後內容不會再變的檔案（縮圖 sprite）
+# token 在 query string 內，用 private 避免被 CDN 共用快取
+IMMUTABLE_CACHE_HEADERS = {"Cache-Control": "private, max-age=31536000, immutable"}
 
 
 # === Response Models ===
@@ -34,9 +58,12 @@ DEFAULT_CAMERA_ID = "cam1"
 class RecordingItem(BaseModel):
     filename: str
     start_time: str  # ISO format
+    end_time: Optional[str] = None  # ISO format
     duration_seconds: int
     size_bytes: int
     hls_available: bool = False  # HLS 版本是否可用
+    thumbnails_available: bool = False  # 時間軸縮圖 sprite 是否可用
+    date: Optional[str] = None  # YYYYMMDD（跨日查詢時用來組 URL）
 
 
 class RecordingsResponse(BaseModel):
@@ -46,9 +73,41 @@ class RecordingsResponse(BaseModel):
     total_size_mb: float
 
 
+class RecordingRangeResponse(BaseModel):
+    camera_id: str
+    start: str
+    end: str
+    recordings: List[RecordingItem]
+    total_count: int
+    total_size_mb: float
+
+
+class ThumbnailItem(BaseModel):
+    filename: str
+    start_time: str  # ISO format
+    duration_seconds: int
+    sprite_url: str
+    interval: int       # 每張縮圖間隔秒數
+    count: int          # 縮圖張數
+    columns: int
+    rows: int
+    tile_width: int
+    tile_height: int
+
+
+class ThumbnailsResponse(BaseModel):
+    date: str
+    camera_id: str
+    thumbnails: List[ThumbnailItem]
+
+
 class EventItem(BaseModel):
     id: int
     entry_time: str  # ISO format
+    camera_id: Optional[str] = None
+    segment_date: Optional[str] = None  # YYYYMMDD（分段所在目錄，跨日時與事件日期不同）
+    segment_file: Optional[str] = None  # 事件所在的錄影分段
+    offset_sec: Optional[float] = None  # 事件在分段內的秒數
 
 
 class EventsResponse(BaseModel):
@@ -56,6 +115,41 @@ class EventsResponse(BaseModel):
     events: List[EventItem]
 
 
+class EventsPageResponse(BaseModel):
+    events: List[EventItem]
+    next_cursor: Optional[str] = None  # 沒有下一頁時為 null
+
+
+class DetectionRangeItem(BaseModel):
+    start_time: str  # ISO format
+    end_time: str  # ISO format
+    duration_seconds: float
+    peak_count: int  # 區間內單幀最多符合人數
+
+
+class DetectionSearchResponse(BaseModel):
+    camera_id: str
+    start: str
+    end: str
+    ranges: List[DetectionRangeItem]
+    total_count: int
+
+
+class OccupancyPointItem(BaseModel):
+    time: str  # ISO format（bucket 起點）
+    zone: str
+    avg: float
+    max: int
+
+
+class OccupancyResponse(BaseModel):
+    camera_id: str
+    start: str
+    end: str
+    resolution_seconds: int
+    points: List[OccupancyPointItem]
+
+
 # === 輔助函式 ===
 
 def parse_filename_to_datetime(filename: str) -> Optional[datetime]:
@@ -93,6 +187,57 @@ def validate_camera_id(camera_id: str) -> str:
     return camera_id
 
 
+def parse_datetime_param(value: str) -> datetime:
+    """解析 ISO 日期時間參數"""
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid datetime format")
+
+
+def encode_cursor(cursor: EntryCursor) -> str:
+    """(entry_ts 或 entry_time, id) → 不透明的 URL-safe 字串"""
+    raw = f"{cursor[0]}|{cursor[1]}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(value: str) -> EntryCursor:
+    try:
+        raw = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)).decode()
+        position, row_id = raw.rsplit("|", 1)
+        if position.lstrip("-").isdigit():
+            return int(position), int(row_id)
+        # entry_ts 補齊前發出的游標
+        datetime.fromisoformat(position)
+        return position, int(row_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def entry_to_item(e) -> EventItem:
+    return EventItem(
+        id=e.id,
+        entry_time=e.entry_time.isoformat(),
+        camera_id=e.camera_id,
+        segment_date=e.segment_file[:8] if e.segment_file else None,
+        segment_file=e.segment_file,
+        offset_sec=e.offset_sec,
+    )
+
+
+def segment_to_item(seg: RecordingSegment) -> RecordingItem:
+    return RecordingItem(
+        filename=seg.filename,
+        start_time=seg.start_time.isoformat(),
+        end_time=seg.end_time.isoformat() if seg.end_time else None,
+        duration_seconds=int(round(seg.duration_seconds or 0)),
+        size_bytes=seg.size_bytes or 0,
+        hls_available=seg.hls_status == "ready",
+        thumbnails_available=seg.thumbnails is not None,
+        date=seg.date,
+    )
+
+
 def get_recording_dir(camera_id: str, date_str: str) -> Path:
     """取得指定攝影機和日期的錄影目錄，含路徑遍歷防護"""
     # 新結構: recordings/{camera_id}/{date_str}
@@ -128,61 +273,236 @@ async def list_recordings(
     date: str = Query(..., alias="date", description="日期 (YYYY-MM-DD 或 YYYYMMDD)"),
     camera_id: str = Query(DEFAULT_CAMERA_ID, description="攝影機 ID"),
 ):
-    """列出指定日期和攝影機的所有錄影檔案"""
+    """列出指定日期和攝影機的所有錄影檔案（只回傳 HLS 轉檔完成的分段）"""
     date_str = validate_date_param(date)
     camera_id = validate_camera_id(camera_id)
-    date_dir = get_recording_dir(camera_id, date_str)
 
-    if not date_dir.exists():
-        return RecordingsResponse(
-            date=date_str,
-            recordings=[],
-            total_count=0,
-            total_size_mb=0.0,
-        )
+    segments = await data_access.read(recording_index.list_by_date, camera_id, date_str, hls_only=True)
+    recordings = [segment_to_item(seg) for seg in segments]
+    total_size = sum(r.size_bytes for r in recordings)
 
-    recordings = []
-    total_size = 0
+    return RecordingsResponse(
+        date=date_str,
+        recordings=recordings,
+        total_count=len(recordings),
+        total_size_mb=round(total_size / (1024 * 1024), 2),
+    )
 
-    for f in sorted(date_dir.glob("*_raw.mp4")):
-        if not FILENAME_PATTERN.match(f.name):
-            continue
 
-        start_time = parse_filename_to_datetime(f.name)
-        if not start_time:
-            continue
+@router.get("/recordings/range", response_model=RecordingRangeResponse)
+async def list_recordings_range(
+    request: Request,
+    token: str = Depends(verify_token),
+    start: str = Query(..., description="開始時間 (ISO 8601)"),
+    end: str = Query(..., description="結束時間 (ISO 8601)"),
+    camera_id: str = Query(DEFAULT_CAMERA_ID, description="攝影機 ID"),
+):
+    """列出與時間區間重疊的錄影（可跨多天，一次索引查詢）"""
+    camera_id = validate_camera_id(camera_id)
+    start_dt = parse_datetime_param(start)
+    end_dt = parse_datetime_param(end)
+    if end_dt <= start_dt:
+        raise HTTPException(status_code=400, detail="end must be after start")
+
+    segments = await data_access.read(recording_index.list_range, camera_id, start_dt, end_dt, hls_only=True)
+    recordings = [segment_to_item(seg) for seg in segments]
+    total_size = sum(r.size_bytes for r in recordings)
+
+    return RecordingRangeResponse(
+        camera_id=camera_id,
+        start=start_dt.isoformat(),
+        end=end_dt.isoformat(),
+        recordings=recordings,
+        total_count=len(recordings),
+        total_size_mb=round(total_size / (1024 * 1024), 2),
+    )
 
-        # 檢查 HLS 版本是否存在（轉檔完成）
-        hls_dir = f.with_suffix("")  # 去掉 .mp4 變成目錄名
-        hls_available = (hls_dir / "playlist.m3u8").exists()
 
-        # 只返回 HLS 轉檔完成的錄影，避免播放正在處理中的檔案
-        if not hls_available:
-            continue
+@router.get("/recordings/clip")
+async def export_clip(
+    request: Request,
+    token: str = Depends(verify_token),
+    start: str = Query(..., description="開始時間 (ISO 8601)"),
+    end: str = Query(..., description="結束時間 (ISO 8601)"),
+    camera_id: str = Query(DEFAULT_CAMERA_ID, description="攝影機 ID"),
+):
+    """
+    匯出時間區間的影片片段（可跨分段）。
+    只做 stream copy 接合，不重新編碼；邊產生邊回傳 fragmented MP4。
+    """
+    camera_id = validate_camera_id(camera_id)
+    start_dt = parse_datetime_param(start)
+    end_dt = parse_datetime_param(end)
+    if end_dt <= start_dt:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    if (end_dt - start_dt).total_seconds() > CLIP_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"Clip longer than {CLIP_MAX_SECONDS} seconds")
+
+    # 只取已關檔的分段（錄製中的 MP4 還沒有 moov，無法讀取）
+    segments = [
+        seg for seg in await data_access.read(
+            recording_index.list_range, camera_id, start_dt, end_dt, hls_only=False,
+        )
+        if seg.status == "closed" and seg.duration_seconds
+    ]
+    concat_list = build_concat_list(segments, start_dt, end_dt)
+    if concat_list is None:
+        raise HTTPException(status_code=404, detail="No recordings in range")
+
+    filename = f"{camera_id}_{start_dt:%Y%m%d_%H%M%S}_{int((end_dt - start_dt).total_seconds())}s.mp4"
+    return StreamingResponse(
+        stream_clip(concat_list),
+        media_type="video/mp4",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
-        stat = f.stat()
-        size = stat.st_size
-        total_size += size
 
-        # 預設每段 60 秒（實際可從影片 metadata 取得，但這裡簡化處理）
-        duration = 60
+@router.get("/recordings/thumbnails", response_model=ThumbnailsResponse)
+async def list_thumbnails(
+    request: Request,
+    token: str = Depends(verify_token),
+    date: str = Query(..., alias="date", description="日期 (YYYY-MM-DD 或 YYYYMMDD)"),
+    camera_id: str = Query(DEFAULT_CAMERA_ID, description="攝影機 ID"),
+):
+    """列出某日所有分段的縮圖 sprite 索引（整天 scrub 只需要這個 + 各 sprite.jpg）"""
+    date_str = validate_date_param(date)
+    camera_id = validate_camera_id(camera_id)
 
-        recordings.append(RecordingItem(
-            filename=f.name,
-            start_time=start_time.isoformat(),
-            duration_seconds=duration,
-            size_bytes=size,
-            hls_available=True,
+    segments = await data_access.read(recording_index.list_by_date, camera_id, date_str, hls_only=False)
+    thumbnails = []
+    for seg in segments:
+        if not seg.thumbnails:
+            continue
+        stem = seg.filename.removesuffix(".mp4")
+        thumbnails.append(ThumbnailItem(
+            filename=seg.filename,
+            start_time=seg.start_time.isoformat(),
+            duration_seconds=int(round(seg.duration_seconds or 0)),
+            sprite_url=f"{router.prefix}/recordings/{camera_id}/{date_str}/{stem}/{SPRITE_NAME}",
+            interval=seg.thumbnails["interval"],
+            count=seg.thumbnails["count"],
+            columns=seg.thumbnails["columns"],
+            rows=seg.thumbnails["rows"],
+            tile_width=seg.thumbnails["tile_width"],
+            tile_height=seg.thumbnails["tile_height"],
         ))
 
-    return RecordingsResponse(
-        date=date_str,
-        recordings=recordings,
-        total_count=len(recordings),
-        total_size_mb=round(total_size / (1024 * 1024), 2),
+    return ThumbnailsResponse(date=date_str, camera_id=camera_id, thumbnails=thumbnails)
+
+
+@router.get("/detections/search", response_model=DetectionSearchResponse)
+async def search_detections(
+    request: Request,
+    token: str = Depends(verify_token),
+    start: str = Query(..., description="開始時間 (ISO 8601)"),
+    end: str = Query(..., description="結束時間 (ISO 8601)"),
+    camera_id: str = Query(DEFAULT_CAMERA_ID, description="攝影機 ID"),
+    zone: Optional[str] = Query(None, description="區域：door / inside / none（不填 = 任何位置）"),
+    min_count: int = Query(1, ge=1, le=50, description="單幀至少幾人"),
+    min_duration: float = Query(0.0, ge=0, description="區間最短秒數"),
+    max_gap: float = Query(1.0, gt=0, le=60, description="相鄰偵測間隔超過幾秒視為不同區間"),
+):
+    """
+    依偵測 sidecar 搜尋符合條件的時間區間（不重跑推論），
+    例如 zone=door 找門口有人、zone=inside&min_count=2 找店內至少兩人
+    """
+    camera_id = validate_camera_id(camera_id)
+    start_dt = parse_datetime_param(start)
+    end_dt = parse_datetime_param(end)
+    if end_dt <= start_dt:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    if zone is not None and zone not in ZONES:
+        raise HTTPException(status_code=400, detail=f"zone must be one of {ZONES}")
+
+    ranges = await data_access.fs(
+        query_ranges, camera_id, start_dt, end_dt, zone, min_count, min_duration, max_gap,
+    )
+    items = [
+        DetectionRangeItem(
+            start_time=datetime.fromtimestamp(r.start).isoformat(),
+            end_time=datetime.fromtimestamp(r.end).isoformat(),
+            duration_seconds=round(r.end - r.start, 2),
+            peak_count=r.peak_count,
+        )
+        for r in ranges
+    ]
+    return DetectionSearchResponse(
+        camera_id=camera_id,
+        start=start_dt.isoformat(),
+        end=end_dt.isoformat(),
+        ranges=items,
+        total_count=len(items),
+    )
+
+
+@router.get("/occupancy", response_model=OccupancyResponse)
+async def get_occupancy(
+    request: Request,
+    token: str = Depends(verify_token),
+    start: str = Query(..., description="開始時間 (ISO 8601)"),
+    end: str = Query(..., description="結束時間 (ISO 8601)"),
+    camera_id: str = Query(DEFAULT_CAMERA_ID, description="攝影機 ID"),
+    zone: Optional[str] = Query(None, description="區域：inside / door（不填 = 全部）"),
+    max_points: int = Query(1500, ge=10, le=20000, description="每個區域最多幾個資料點（自動挑解析度）"),
+    resolution: Optional[int] = Query(None, description="指定解析度秒數：1 / 60 / 900 / 3600"),
+):
+    """取得店內 / 門口人數時間序列（依範圍自動使用 1 秒或 1m/15m/1h 金字塔）"""
+    camera_id = validate_camera_id(camera_id)
+    start_dt = parse_datetime_param(start)
+    end_dt = parse_datetime_param(end)
+    if end_dt <= start_dt:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    if zone is not None and zone not in OCCUPANCY_ZONES:
+        raise HTTPException(status_code=400, detail=f"zone must be one of {OCCUPANCY_ZONES}")
+    if resolution is not None and resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"resolution must be one of {RESOLUTIONS}")
+
+    resolution_sec, points = await data_access.fs(
+        query_occupancy, camera_id, start_dt, end_dt, zone, max_points, resolution,
+    )
+    return OccupancyResponse(
+        camera_id=camera_id,
+        start=start_dt.isoformat(),
+        end=end_dt.isoformat(),
+        resolution_seconds=resolution_sec,
+        points=[
+            OccupancyPointItem(
+                time=datetime.fromtimestamp(p.ts).isoformat(),
+                zone=p.zone,
+                avg=p.avg,
+                max=p.max,
+            )
+            for p in points
+        ],
     )
 
 
+@router.get("/heatmap.png")
+async def get_heatmap(
+    request: Request,
+    token: str = Depends(verify_token),
+    start: str = Query(..., description="開始時間 (ISO 8601)"),
+    end: str = Query(..., description="結束時間 (ISO 8601)"),
+    camera_id: str = Query(DEFAULT_CAMERA_ID, description="攝影機 ID"),
+    width: int = Query(960, ge=160, le=1920, description="輸出寬度（高度依 16:9）"),
+):
+    """
+    取得時間範圍內的位置熱度圖（半透明 PNG，可直接疊在畫面上）
+    以小時為單位合併；已渲染過且資料沒變的範圍直接回傳快取
+    """
+    camera_id = validate_camera_id(camera_id)
+    start_dt = parse_datetime_param(start)
+    end_dt = parse_datetime_param(end)
+    if end_dt <= start_dt:
+        raise HTTPException(status_code=400, detail="end must be after start")
+
+    height = width * 9 // 16
+    path = await data_access.fs(render_heatmap_png, camera_id, start_dt, end_dt, width, height)
+    if path is None:
+        raise HTTPException(status_code=404, detail="No heatmap data in range")
+    return FileResponse(path=path, media_type="image/png", headers={"Cache-Control": "no-cache"})
+
+
 @router.get("/events", response_model=EventsResponse)
 async def list_events(
     request: Request,
@@ -198,17 +518,127 @@ async def list_events(
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date")
 
-    entries = visitor_db.get_entries_by_date(target_date)
+    entries = await data_access.read(visitor_db.get_entries_by_date, target_date)
+    return EventsResponse(date=date_str, events=[entry_to_item(e) for e in entries])
 
-    return EventsResponse(
-        date=date_str,
-        events=[
-            EventItem(id=e.id, entry_time=e.entry_time.isoformat())
-            for e in entries
-        ],
+
+@router.get("/events/page", response_model=EventsPageResponse)
+async def list_events_page(
+    request: Request,
+    token: str = Depends(verify_token),
+    start: str = Query(..., description="開始時間 (ISO 8601)"),
+    end: str = Query(..., description="結束時間 (ISO 8601)"),
+    camera_id: Optional[str] = Query(None, description="攝影機 ID（不指定 = 全部）"),
+    cursor: Optional[str] = Query(None, description="上一頁回傳的 next_cursor"),
+    limit: int = Query(500, ge=1, le=5000),
+):
+    """
+    時間範圍內的訪客事件（游標分頁，依時間排序）
+    游標記住上一頁最後一筆的位置，翻到多後面查詢成本都一樣
+    """
+    start_dt = parse_datetime_param(start)
+    end_dt = parse_datetime_param(end)
+    if end_dt <= start_dt:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    if camera_id is not None:
+        camera_id = validate_camera_id(camera_id)
+    after = decode_cursor(cursor) if cursor else None
+
+    entries = await data_access.read(
+        visitor_db.get_entries_page, start_dt, end_dt, after, limit, camera_id,
+    )
+    return EventsPageResponse(
+        events=[entry_to_item(e) for e in entries],
+        next_cursor=encode_cursor(entry_cursor(entries[-1])) if len(entries) == limit else None,
+    )
+
+
+@router.get("/events/export")
+async def export_events(
+    request: Request,
+    token: str = Depends(verify_token),
+    start: str = Query(..., description="開始時間 (ISO 8601)"),
+    end: str = Query(..., description="結束時間 (ISO 8601)"),
+    format: str = Query("csv", pattern="^(csv|parquet)$", description="csv 或 parquet"),
+    camera_id: Optional[str] = Query(None, description="攝影機 ID（不指定 = 全部）"),
+):
+    """
+    匯出時間範圍內的訪客事件（邊查邊送，不會把整份結果放進記憶體）
+    parquet 需要伺服器安裝 pyarrow
+    """
+    start_dt = parse_datetime_param(start)
+    end_dt = parse_datetime_param(end)
+    if end_dt <= start_dt:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    if camera_id is not None:
+        camera_id = validate_camera_id(camera_id)
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+
+    filename = f"events_{start_dt:%Y%m%d_%H%M%S}_{end_dt:%Y%m%d_%H%M%S}.{format}"
+    return StreamingResponse(
+        _stream_events(format, start_dt, end_dt, camera_id),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+async def _stream_events(
+    fmt: str,
+    start_dt: datetime,
+    end_dt: datetime,
+    camera_id: Optional[str],
+) -> AsyncIterator[bytes]:
+    # 每批查詢都走讀取池（有逾時保護），不長時間佔住同一條連線
+    writer = make_event_writer(fmt)
+    chunks = visitor_db.iter_entries(start_dt, end_dt, EXPORT_CHUNK_SIZE, camera_id)
+    while True:
+        chunk = await data_access.read(next, chunks, None)
+        if chunk is None:
+            break
+        data = writer.write(chunk)
+        if data:
+            yield data
+    tail = writer.close()
+    if tail:
+        yield tail
+
+
+# === 整天 HLS 播放清單（需在 {filename} 路由之前註冊）===
+
+@router.get("/recordings/{camera_id}/{date_str}/" + DAY_PLAYLIST_NAME)
+async def get_day_playlist(
+    camera_id: str,
+    date_str: str,
+    token: str = Depends(verify_token),
+):
+    """
+    取得整天的 HLS 播放清單（所有分段串成一份，含 EXT-X-PROGRAM-DATE-TIME）
+    片段 URI 為相對路徑，會落到既有的 {segment_name}/{ts_file} 端點
+    """
+    camera_id = validate_camera_id(camera_id)
+    date_str = validate_date_param(date_str)
+
+    playlist_path = await data_access.fs(_resolve_day_playlist, camera_id, date_str)
+    return FileResponse(
+        path=playlist_path,
+        media_type="application/vnd.apple.mpegurl",
+        filename=DAY_PLAYLIST_NAME,
+        headers={"Cache-Control": "no-cache"},
     )
 
 
+def _resolve_day_playlist(camera_id: str, date_str: str) -> Path:
+    date_dir = get_recording_dir(camera_id, date_str)
+    playlist_path = date_dir / DAY_PLAYLIST_NAME
+
+    # 升級前的舊日期沒有 day.m3u8 → 第一次請求時產生
+    if not playlist_path.exists():
+        if not date_dir.is_dir() or not rebuild_day_playlist(date_dir):
+            raise HTTPException(status_code=404, detail="Day playlist not found")
+    return playlist_path
+
+
 @router.get("/recordings/{camera_id}/{date_str}/{filename}")
 async def stream_recording(
     request: Request,
@@ -223,9 +653,19 @@ async def stream_recording(
     date_str = validate_date_param(date_str)
     validate_filename(filename)
 
-    # 建構檔案路徑
-    date_dir = get_recording_dir(camera_id, date_str)
-    file_path = date_dir / filename
+    file_path = await data_access.fs(_resolve_recording_file, camera_id, date_str, filename)
+
+    # 使用 FileResponse 自動處理 Range Requests
+    return FileResponse(
+        path=file_path,
+        media_type="video/mp4",
+        filename=filename,
+    )
+
+
+def _resolve_recording_file(camera_id: str, date_str: str, filename: str) -> Path:
+    """建構錄影檔路徑並確認存在（會碰檔案系統，經由 data_access.fs 呼叫）"""
+    file_path = get_recording_dir(camera_id, date_str) / filename
 
     # 二次確認路徑安全
     try:
@@ -239,13 +679,7 @@ async def stream_recording(
 
     if not file_path.is_file():
         raise HTTPException(status_code=400, detail="Not a file")
-
-    # 使用 FileResponse 自動處理 Range Requests
-    return FileResponse(
-        path=file_path,
-        media_type="video/mp4",
-        filename=filename,
-    )
+    return file_path
 
 
 # === HLS 串流端點 ===
@@ -259,68 +693,191 @@ async def get_hls_playlist(
     token: str = Depends(verify_token),
 ):
     """取得 HLS 播放清單"""
-    camera_id = validate_camera_id(camera_id)
-    date_str = validate_date_param(date_str)
+    playlist_path = await data_access.fs(
+        _get_segment_file, camera_id, date_str, segment_name, "playlist.m3u8", "HLS playlist not found",
+    )
+    return FileResponse(
+        path=playlist_path,
+        media_type="application/vnd.apple.mpegurl",
+        filename="playlist.m3u8",
+    )
 
-    # 驗證 segment_name 格式
-    if not HLS_DIR_PATTERN.match(segment_name):
-        raise HTTPException(status_code=400, detail="Invalid segment name")
 
-    # 建構路徑
-    date_dir = get_recording_dir(camera_id, date_str)
-    hls_dir = date_dir / segment_name
-    playlist_path = hls_dir / "playlist.m3u8"
+# === 多碼率（需在 {ts_file} 路由之前註冊）===
 
-    # 安全檢查
-    try:
-        resolved = playlist_path.resolve()
-        resolved.relative_to(RECORDINGS_DIR.resolve())
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid path")
+@router.get("/recordings/{camera_id}/{date_str}/{segment_name}/" + MASTER_PLAYLIST_NAME)
+async def get_hls_master_playlist(
+    request: Request,
+    camera_id: str,
+    date_str: str,
+    segment_name: str,
+    token: str = Depends(verify_token),
+):
+    """取得多碼率主清單（原生畫質 + 較低畫質 rendition）"""
+    hls_dir = await data_access.fs(_get_hls_dir, camera_id, date_str, segment_name)
+    settings = getattr(request.app.state, "settings", None)
+    ladder_enabled = bool(settings and settings.hls_ladder_enabled)
 
-    if not playlist_path.exists():
+    content = await data_access.fs(build_master_playlist, hls_dir, ladder_enabled)
+    if content is None:
         raise HTTPException(status_code=404, detail="HLS playlist not found")
+    return Response(content=content, media_type="application/vnd.apple.mpegurl")
+
+
+@router.get("/recordings/{camera_id}/{date_str}/{segment_name}/{rendition}/playlist.m3u8")
+async def get_rendition_playlist(
+    camera_id: str,
+    date_str: str,
+    segment_name: str,
+    rendition: str,
+    token: str = Depends(verify_token),
+):
+    """
+    取得較低畫質的播放清單；尚未產生時觸發背景轉檔，
+    等到第一批片段寫出就回傳（轉檔中為 EVENT 清單，播放器會自行重新載入）
+    """
+    spec = LADDER_BY_NAME.get(rendition)
+    if spec is None:
+        raise HTTPException(status_code=404, detail="Unknown rendition")
+    hls_dir = await data_access.fs(_get_hls_dir, camera_id, date_str, segment_name)
+
+    playlist_path = await data_access.fs(ensure_rendition, hls_dir, spec)
+    if playlist_path is None:
+        raise HTTPException(status_code=404, detail="Rendition not available")
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + RENDITION_WAIT_SEC
+    while not await data_access.fs(_has_media_segment, playlist_path):
+        if not is_encoding(hls_dir, spec) or loop.time() > deadline:
+            raise HTTPException(
+                status_code=503,
+                detail="Rendition not ready",
+                headers={"Retry-After": "2"},
+            )
+        await asyncio.sleep(0.5)
 
     return FileResponse(
         path=playlist_path,
         media_type="application/vnd.apple.mpegurl",
         filename="playlist.m3u8",
+        headers={"Cache-Control": "no-cache"},
     )
 
 
-@router.get("/recordings/{camera_id}/{date_str}/{segment_name}/{ts_file}")
-async def get_hls_segment(
-    request: Request,
+@router.get("/recordings/{camera_id}/{date_str}/{segment_name}/{rendition}/{ts_file}")
+async def get_rendition_segment(
     camera_id: str,
     date_str: str,
     segment_name: str,
+    rendition: str,
     ts_file: str,
     token: str = Depends(verify_token),
 ):
-    """取得 HLS 影片片段 (.ts)"""
+    """取得較低畫質的 HLS 片段 (.ts)"""
+    if rendition not in LADDER_BY_NAME:
+        raise HTTPException(status_code=404, detail="Unknown rendition")
+    if not TS_FILE_PATTERN.match(ts_file):
+        raise HTTPException(status_code=400, detail="Invalid ts file name")
+
+    ts_path = await data_access.fs(
+        _get_segment_file, camera_id, date_str, segment_name, f"{rendition}/{ts_file}", "HLS segment not found",
+    )
+    return FileResponse(path=ts_path, media_type="video/mp2t", filename=ts_file)
+
+
+def _get_hls_dir(camera_id: str, date_str: str, segment_name: str) -> Path:
+    """驗證參數並回傳分段的 HLS 目錄（會碰檔案系統，經由 data_access.fs 呼叫）"""
     camera_id = validate_camera_id(camera_id)
     date_str = validate_date_param(date_str)
-
-    # 驗證格式
     if not HLS_DIR_PATTERN.match(segment_name):
         raise HTTPException(status_code=400, detail="Invalid segment name")
-    if not TS_FILE_PATTERN.match(ts_file):
-        raise HTTPException(status_code=400, detail="Invalid ts file name")
 
-    # 建構路徑
-    date_dir = get_recording_dir(camera_id, date_str)
-    ts_path = date_dir / segment_name / ts_file
+    hls_dir = get_recording_dir(camera_id, date_str) / segment_name
+    try:
+        hls_dir.resolve().relative_to(RECORDINGS_DIR.resolve())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid path")
+    return hls_dir
+
 
-    # 安全檢查
+def _has_media_segment(playlist_path: Path) -> bool:
     try:
-        resolved = ts_path.resolve()
-        resolved.relative_to(RECORDINGS_DIR.resolve())
+        return "#EXTINF:" in playlist_path.read_text(encoding="utf-8")
+    except OSError:
+        return False
+
+
+# === 時間軸縮圖（需在 {ts_file} 路由之前註冊）===
+
+@router.get("/recordings/{camera_id}/{date_str}/{segment_name}/" + SPRITE_NAME)
+async def get_sprite(
+    request: Request,
+    camera_id: str,
+    date_str: str,
+    segment_name: str,
+    token: str = Depends(verify_token),
+):
+    """取得分段縮圖 sprite（JPEG）"""
+    path = await data_access.fs(_get_segment_file, camera_id, date_str, segment_name, SPRITE_NAME)
+    return FileResponse(path=path, media_type="image/jpeg", headers=IMMUTABLE_CACHE_HEADERS)
+
+
+@router.get("/recordings/{camera_id}/{date_str}/{segment_name}/" + SPRITE_INDEX_NAME)
+async def get_sprite_index(
+    request: Request,
+    camera_id: str,
+    date_str: str,
+    segment_name: str,
+    token: str = Depends(verify_token),
+):
+    """取得分段縮圖 sprite 索引（JSON）"""
+    path = await data_access.fs(_get_segment_file, camera_id, date_str, segment_name, SPRITE_INDEX_NAME)
+    return FileResponse(path=path, media_type="application/json", headers=IMMUTABLE_CACHE_HEADERS)
+
+
+def _get_segment_file(
+    camera_id: str,
+    date_str: str,
+    segment_name: str,
+    name: str,
+    not_found: str = "File not found",
+) -> Path:
+    """
+    取得 HLS 分段目錄內的檔案路徑，含格式驗證與路徑遍歷防護
+    （會碰檔案系統，路由內經由 data_access.fs 呼叫）
+    """
+    camera_id = validate_camera_id(camera_id)
+    date_str = validate_date_param(date_str)
+    if not HLS_DIR_PATTERN.match(segment_name):
+        raise HTTPException(status_code=400, detail="Invalid segment name")
+
+    path = get_recording_dir(camera_id, date_str) / segment_name / name
+    try:
+        path.resolve().relative_to(RECORDINGS_DIR.resolve())
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid path")
 
-    if not ts_path.exists():
-        raise HTTPException(status_code=404, detail="HLS segment not found")
+    if not path.exists():
+        raise HTTPException(status_code=404, detail=not_found)
+    return path
 
+
+@router.get("/recordings/{camera_id}/{date_str}/{segment_name}/{ts_file}")
+async def get_hls_segment(
+    request: Request,
+    camera_id: str,
+    date_str: str,
+    segment_name: str,
+    ts_file: str,
+    token: str = Depends(verify_token),
+):
+    """取得 HLS 影片片段 (.ts)"""
+    if not TS_FILE_PATTERN.match(ts_file):
+        raise HTTPException(status_code=400, detail="Invalid ts file name")
+
+    ts_path = await data_access.fs(
+        _get_segment_file, camera_id, date_str, segment_name, ts_file, "HLS segment not found",
+    )
     return FileResponse(
         path=ts_path,
         media_type="video/mp2t",
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+把舊的訪客原始事件搬到 Parquet 封存檔並釋放 visitors.db 空間
+（server 內的 VisitorArchiver 會定期自動執行，這裡是手動觸發）
+用法: python scripts/archive_visitors.py [--keep-days 365] [--convert-vacuum]
+      --convert-vacuum: 舊資料庫轉成 incremental auto-vacuum（完整 VACUUM，請先停止 server）
+"""
+
+import sys
+from pathlib import Path
+
+# 加入專案根目錄
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from modules.storage.visitor_archive import VisitorArchiver, VisitorArchiverConfig
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="封存舊的訪客原始事件")
+    parser.add_argument("--keep-days", type=int, default=365, help="SQLite 保留天數 (預設: 365)")
+    parser.add_argument("--convert-vacuum", action="store_true",
+                        help="轉成 incremental auto-vacuum（一次性完整 VACUUM，請先停止 server）")
+    args = parser.parse_args()
+
+    archiver = VisitorArchiver(VisitorArchiverConfig(keep_days=args.keep_days))
+    db = archiver.archive.db
+    size_before = db.db_path.stat().st_size
+    moved = archiver.run_once()
+    if not db.incremental_vacuum_enabled():
+        if args.convert_vacuum:
+            # 完整 VACUUM 同時釋放剛搬走的空間
+            print("轉換成 incremental auto-vacuum（完整 VACUUM）...")
+            db.convert_to_incremental_vacuum()
+        else:
+            print("visitors.db 尚未啟用 incremental auto-vacuum，空間不會釋放；停止 server 後加 --convert-vacuum 執行一次")
+    size_after = db.db_path.stat().st_size
+
+    print(f"完成！搬移 {moved} 筆事件，已封存月份: {len(db.archived_months())}")
+    print(f"visitors.db: {size_before / 1024 ** 2:.1f} MB → {size_after / 1024 ** 2:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+R2 上傳延遲基準測試：每次新建 client（舊做法） vs 共用 client vs 上傳佇列
+預設在本機啟動 moto S3 模擬伺服器（pip install "moto[server]"），也可以指定任何 S3 相容端點（例如 MinIO）
+
+用法:
+    python scripts/bench_r2.py
+    python scripts/bench_r2.py --count 200 --size 200
+    python scripts/bench_r2.py --endpoint http://127.0.0.1:9000 --access-key minioadmin --secret-key minioadmin
+"""
+
+import sys
+import time
+import statistics
+from pathlib import Path
+
+# 加入專案根目錄
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import os
+
+import boto3
+from botocore.client import Config
+from botocore.exceptions import ClientError
+
+from modules.storage.cloudflare_r2 import CloudflareR2, R2Config
+from modules.storage.r2_uploader import R2Uploader, R2UploaderConfig, UploadMetrics
+
+
+def start_moto() -> str:
+    from moto.server import ThreadedMotoServer
+
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    return f"http://{host}:{port}"
+
+
+def summarize(name: str, latencies: list, total_sec: float) -> None:
+    ordered = sorted(latencies)
+    print(
+        f"{name:<28} n={len(ordered):<4} "
+        f"p50={ordered[len(ordered) // 2] * 1000:7.1f}ms "
+        f"p95={ordered[int(len(ordered) * 0.95)] * 1000:7.1f}ms "
+        f"mean={statistics.fmean(ordered) * 1000:7.1f}ms "
+        f"total={total_sec:6.2f}s"
+    )
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="R2 上傳延遲基準測試")
+    parser.add_argument("--endpoint", default=None, help="S3 相容端點（預設啟動本機 moto）")
+    parser.add_argument("--access-key", default="testing")
+    parser.add_argument("--secret-key", default="testing")
+    parser.add_argument("--bucket", default="bench")
+    parser.add_argument("--count", type=int, default=100, help="每種模式上傳次數 (預設: 100)")
+    parser.add_argument("--size", type=int, default=100, help="每個物件大小 KB (預設: 100，約一張通知截圖)")
+    parser.add_argument("--concurrency", type=int, default=4, help="上傳佇列 worker 數 (預設: 4)")
+    args = parser.parse_args()
+
+    endpoint = args.endpoint or start_moto()
+    cfg = R2Config(
+        access_key=args.access_key,
+        secret_key=args.secret_key,
+        bucket=args.bucket,
+        endpoint=endpoint,
+        public_url="https://example.invalid",
+    )
+    r2 = CloudflareR2(cfg)
+    s3 = r2.get_client()
+    try:
+        s3.head_bucket(Bucket=args.bucket)
+    except ClientError:
+        s3.create_bucket(Bucket=args.bucket, CreateBucketConfiguration={"LocationConstraint": "auto"})
+
+    payload = os.urandom(args.size * 1024)
+    print(f"端點: {endpoint}, 物件: {args.size} KB x {args.count}\n")
+
+    # 1) 舊做法：每次上傳都建新的 client（重新解析憑證、新連線池）
+    latencies = []
+    t_all = time.perf_counter()
+    for i in range(args.count):
+        t0 = time.perf_counter()
+        client = boto3.client(
+            "s3",
+            endpoint_url=endpoint,
+            aws_access_key_id=args.access_key,
+            aws_secret_access_key=args.secret_key,
+            config=Config(signature_version="s3v4"),
+            region_name="auto",
+        )
+        client.put_object(Bucket=args.bucket, Key=f"bench/new/{i}.bin", Body=payload, ContentType="image/jpeg")
+        latencies.append(time.perf_counter() - t0)
+    summarize("new client per upload", latencies, time.perf_counter() - t_all)
+
+    # 2) 共用 client（連線保持）
+    latencies = []
+    t_all = time.perf_counter()
+    for i in range(args.count):
+        t0 = time.perf_counter()
+        r2.upload_bytes(payload, key=f"bench/shared/{i}.bin", content_type="image/jpeg")
+        latencies.append(time.perf_counter() - t0)
+    summarize("shared client", latencies, time.perf_counter() - t_all)
+
+    # 3) 上傳佇列（多 worker 共用 client）；延遲含排隊時間
+    metrics = UploadMetrics(window=args.count)
+    uploader = R2Uploader(R2UploaderConfig(max_concurrency=args.concurrency, max_queue=args.count), r2, metrics)
+    uploader.start()
+    t_all = time.perf_counter()
+    submitted = []
+    for i in range(args.count):
+        submitted.append((time.perf_counter(), uploader.submit_bytes(payload, f"bench/queue/{i}.bin", "image/jpeg")))
+    latencies = []
+    for t0, future in submitted:
+        future.result()
+        latencies.append(time.perf_counter() - t0)
+    summarize(f"upload queue x{args.concurrency} (burst)", latencies, time.perf_counter() - t_all)
+    uploader.stop()
+    print(f"\n佇列指標: {metrics.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,8 @@
+"""
+依日期刪除整個錄影資料夾（外部排程用）。
+server 內已有 RetentionManager（modules/storage/retention.py）按容量 / 活動逐段清理，
+此腳本保留給未啟用 RETENTION_ENABLED 或需要手動清理的情況。
+"""
 from __future__ import annotations
 
 import argparse
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+掃描 recordings/ 目錄，補建錄影索引（data/recordings.db），
+並把尚未對應錄影的進店事件補上分段與秒數
+用法: python scripts/index_recordings.py [--root recordings] [--thumbnails]
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+# 加入專案根目錄
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from modules.storage.recording_index import recording_index
+from modules.storage.visitor_db import visitor_db
+from modules.video.thumbnails import generate_sprite
+
+
+def main():
+    parser = argparse.ArgumentParser(description="補建錄影索引")
+    parser.add_argument("--root", default="recordings", help="recordings 根目錄")
+    parser.add_argument("--default-camera", default="cam1", help="舊結構 recordings/{date}/ 對應的攝影機")
+    parser.add_argument("--thumbnails", action="store_true", help="為尚無縮圖的分段產生 sprite")
+    args = parser.parse_args()
+
+    root = Path(args.root).expanduser().resolve()
+    added = recording_index.backfill(root, default_camera_id=args.default_camera)
+    print(f"完成！新增 {added} 筆錄影索引")
+
+    linked = visitor_db.backfill_recording_offsets(recording_index, args.default_camera)
+    print(f"完成！{linked} 筆進店事件對應到錄影")
+
+    if args.thumbnails:
+        generated = 0
+        for seg in recording_index.list_missing_thumbnails(limit=100_000):
+            thumbnails = generate_sprite(Path(seg.path), seg.duration_seconds)
+            if thumbnails:
+                recording_index.set_thumbnails(Path(seg.path), thumbnails)
+                generated += 1
+        print(f"完成！產生 {generated} 個縮圖 sprite")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+R2 物件清單管理：與 bucket 對帳、查詢各資料夾容量、列出物件
+（server 內的 R2Reconciler 會定期自動對帳，這裡是手動觸發 / 查詢）
+
+用法:
+    python scripts/r2_inventory.py reconcile [--prefix recordings/]
+    python scripts/r2_inventory.py usage [--prefix recordings/]
+    python scripts/r2_inventory.py ls recordings/cam1/ [--limit 50]
+"""
+
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# 加入專案根目錄
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from modules.settings import get_settings
+from modules.storage.cloudflare_r2 import CloudflareR2, R2Config
+from modules.storage.r2_inventory import get_r2_inventory
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="R2 物件清單")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("reconcile", help="以分頁列表與 bucket 對帳")
+    p.add_argument("--prefix", default="", help="只對帳此 prefix (預設: 整個 bucket)")
+    p = sub.add_parser("usage", help="各資料夾的物件數 / 容量（查本機清單，不掃 bucket）")
+    p.add_argument("--prefix", default="")
+    p = sub.add_parser("ls", help="列出物件（查本機清單）")
+    p.add_argument("prefix")
+    p.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+    r2_inventory = get_r2_inventory()
+
+    if args.command == "reconcile":
+        settings = get_settings()
+        r2 = CloudflareR2(R2Config(
+            access_key=settings.r2_access_key,
+            secret_key=settings.r2_secret_key,
+            bucket=settings.r2_bucket,
+            endpoint=settings.r2_endpoint,
+            public_url=settings.r2_public_url,
+        ))
+        result = r2_inventory.reconcile(r2, args.prefix)
+        print(f"完成！{result['objects']} 個物件 ({result['bytes'] / 1024 ** 2:.1f} MB)，"
+              f"新增 {result['added']}，移除 {result['removed']}")
+
+    elif args.command == "usage":
+        for folder, u in r2_inventory.usage(args.prefix, delimiter="/").items():
+            print(f"{folder:<50} {u['objects']:>8} 個 {u['bytes'] / 1024 ** 2:>10.1f} MB")
+
+    elif args.command == "ls":
+        for obj in r2_inventory.list_objects(args.prefix, limit=args.limit):
+            modified = datetime.fromtimestamp(obj.last_modified).strftime("%Y-%m-%d %H:%M:%S")
+            print(f"{modified}  {obj.size:>12}  {obj.key}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+"""
+從 visitor_entries 重建訪客彙總表（visitor_rollups）
+匯入 / 刪除原始事件後，或懷疑彙總不一致時執行
+用法: python scripts/rebuild_rollups.py
+"""
+
+import sys
+from pathlib import Path
+
+# 加入專案根目錄
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from modules.storage.visitor_db import visitor_db
+
+
+def main():
+    total = visitor_db.rebuild_rollups()
+    print(f"完成！已從 {total} 筆事件重建彙總表")
+
+
+if __name__ == "__main__":
+    main()
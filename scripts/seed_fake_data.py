@@ -53,6 +53,7 @@ def generate_fake_data(days: int = 30, base_daily_visitors: int = 25):
     """
     today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
     total_entries = 0
+    entries = []
 
     print(f"開始生成 {days} 天的假資料...")
     print(f"基準每日訪客數: {base_daily_visitors}")
@@ -79,13 +80,16 @@ def generate_fake_data(days: int = 30, base_daily_visitors: int = 25):
                 second = random.randint(0, 59)
                 entry_time = target_date.replace(hour=hour, minute=minute, second=second)
 
-                visitor_db.record_entry(entry_time)
+                entries.append((entry_time, None, None, None))
                 entries_today += 1
 
         total_entries += entries_today
         weekday_name = ['一', '二', '三', '四', '五', '六', '日'][weekday]
         print(f"  {target_date.strftime('%Y-%m-%d')} (週{weekday_name}): {entries_today} 位訪客")
 
+    # 一次匯入（單一 transaction，最後重算統計與彙總表）
+    visitor_db.bulk_load(entries)
+
     print("-" * 50)
     print(f"完成！總共插入 {total_entries} 筆記錄")
 
@@ -115,6 +119,7 @@ if __name__ == "__main__":
         with visitor_db._get_conn() as conn:
             conn.execute("DELETE FROM visitor_entries")
             conn.execute("DELETE FROM daily_stats")
+            conn.execute("DELETE FROM visitor_rollups")
             conn.commit()
         print("已清除\n")
 
@@ -2,6 +2,8 @@
 from pathlib import Path
 from contextlib import asynccontextmanager
 import logging
+import threading
+from datetime import datetime
 
 from fastapi import FastAPI, Request, Response
 from fastapi.staticfiles import StaticFiles
@@ -11,6 +13,15 @@ from modules.core.yolo_runtime import YoloRuntime
 from modules.settings import get_settings
 from modules.core.shop_state_manager import shop_state_manager  # instance
 from modules.video.camera_recorder import CameraRecorder, CameraRecorderConfig
+from modules.storage.recording_index import recording_index
+from modules.storage.visitor_db import visitor_db
+from modules.storage.retention import RetentionManager, RetentionConfig, GB
+from modules.storage.visitor_archive import VisitorArchiver, VisitorArchiverConfig
+from modules.storage.cloudflare_r2 import CloudflareR2, R2Config
+from modules.storage.r2_inventory import R2Reconciler, R2ReconcilerConfig, get_r2_inventory
+from modules.storage.recording_sync import RecordingSync, RecordingSyncConfig, MB
+from modules.storage.async_access import data_access
+from modules.core.loop_monitor import loop_monitor
 
 from routers.alert_routes import router as alert_router
 from routers.state_routes import router as state_router
@@ -26,6 +37,8 @@ from utils.logging import setup_logging
 
 settings = get_settings()
 
+RECORDINGS_DIR = Path(__file__).parent / "recordings"
+
 
 # === 安全 Headers 中間件 ===
 class SecurityHeadersMiddleware(BaseHTTPMiddleware):
@@ -78,6 +91,52 @@ for cam in settings.get_cameras():
         ))
         camera_recorders.append(recorder)
 
+# === 錄影保留策略 ===
+retention_manager: RetentionManager | None = None
+if settings.retention_enabled:
+    retention_manager = RetentionManager(RetentionConfig(
+        root=RECORDINGS_DIR,
+        keep_days=settings.retention_keep_days,
+        activity_keep_days=settings.retention_activity_keep_days,
+        max_bytes_per_camera=int(settings.retention_max_gb_per_camera * GB),
+        min_free_bytes=int(settings.retention_min_free_gb * GB),
+        require_synced=settings.recording_sync_enabled,
+        sync_activity_only=settings.recording_sync_mode != "all",
+    ))
+
+# === 訪客事件冷熱分層 ===
+visitor_archiver: VisitorArchiver | None = None
+if settings.visitor_archive_enabled:
+    visitor_archiver = VisitorArchiver(VisitorArchiverConfig(
+        keep_days=settings.visitor_archive_keep_days,
+    ))
+
+# === R2 錄影異地備份 / 物件清單對帳（共用一個 client）===
+r2_storage = CloudflareR2(R2Config(
+    access_key=settings.r2_access_key,
+    secret_key=settings.r2_secret_key,
+    bucket=settings.r2_bucket,
+    endpoint=settings.r2_endpoint,
+    public_url=settings.r2_public_url,
+    max_pool_connections=max(settings.recording_sync_concurrency, 4),
+))
+
+r2_reconciler: R2Reconciler | None = None
+if settings.r2_inventory_enabled:
+    r2_storage.attach_inventory(get_r2_inventory())
+    r2_reconciler = R2Reconciler(R2ReconcilerConfig(
+        interval_sec=settings.r2_inventory_reconcile_hours * 3600,
+    ), r2_storage)
+
+recording_sync: RecordingSync | None = None
+if settings.recording_sync_enabled:
+    recording_sync = RecordingSync(RecordingSyncConfig(
+        activity_only=settings.recording_sync_mode != "all",
+        max_mbps=settings.recording_sync_max_mbps,
+        concurrency=settings.recording_sync_concurrency,
+        part_size=settings.recording_sync_part_mb * MB,
+    ), r2_storage)
+
 # 根據 settings.debug 決定 logging level
 setup_logging(
     level=logging.DEBUG if settings.debug else logging.INFO,
@@ -87,9 +146,37 @@ setup_logging(
 logger = logging.getLogger(__name__)
 
 
+def backfill_indexes() -> None:
+    """
+    補建錄影索引（尚未建立索引的舊檔案）、分批遷移舊事件的時間欄位、
+    重建升級前資料庫的訪客彙總表，再把尚未對應的進店事件連到錄影
+    """
+    try:
+        recording_index.backfill(RECORDINGS_DIR)
+        visitor_db.migrate_timestamps()
+        visitor_db.ensure_rollups()
+        visitor_db.backfill_recording_offsets(recording_index, "cam1")
+    except Exception:
+        logger.exception("Index backfill failed")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # === Startup ===
+    loop_monitor.start()
+
+    # 上次中斷時還在錄的分段先關掉（同步執行，必須在開始錄影之前）
+    closed = recording_index.close_interrupted(before=datetime.now())
+    if closed:
+        logger.info("Closed %d segments interrupted by the last shutdown", closed)
+
+    # 補建索引，背景執行不擋啟動
+    threading.Thread(
+        target=backfill_indexes,
+        name="RecordingIndexBackfill",
+        daemon=True,
+    ).start()
+
     runtime.start()
     logger.info("YoloRuntime started (cam1)")
 
@@ -97,15 +184,46 @@ async def lifespan(app: FastAPI):
         recorder.start()
         logger.info("CameraRecorder started (%s)", recorder.camera.camera_id)
 
+    if retention_manager:
+        retention_manager.start()
+        logger.info("RetentionManager started")
+
+    if visitor_archiver:
+        visitor_archiver.start()
+
+    if recording_sync:
+        recording_sync.start()
+
+    if r2_reconciler:
+        r2_reconciler.start()
+
     yield
 
     # === Shutdown ===
+    if retention_manager:
+        retention_manager.stop()
+
+    if visitor_archiver:
+        visitor_archiver.stop()
+
+    if recording_sync:
+        recording_sync.stop()
+
+    if r2_reconciler:
+        r2_reconciler.stop()
+
     for recorder in camera_recorders:
         recorder.stop()
 
     runtime.stop()
     logger.info("All recorders stopped")
 
+    # 寫完尚在佇列中的進店事件
+    shop_state_manager.close()
+
+    await loop_monitor.stop()
+    data_access.shutdown()
+
 
 app = FastAPI(
     title="TCM Shop CCTV System",
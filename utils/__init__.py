@@ -11,6 +11,8 @@ from .constants import (
     TRACK_HISTORY_MAX_LEN,
     RECORDER_FPS,
     RECORDER_SEGMENT_MINUTES,
+    RECORDER_PRE_ROLL_SECONDS,
+    RECORDER_POST_ROLL_SECONDS,
     EVENT_WORKER_MAX_QUEUE,
     ENTRY_ROI,
     ENTRY_ROI_PTS,
@@ -31,6 +33,8 @@ __all__ = [
     "TRACK_HISTORY_MAX_LEN",
     "RECORDER_FPS",
     "RECORDER_SEGMENT_MINUTES",
+    "RECORDER_PRE_ROLL_SECONDS",
+    "RECORDER_POST_ROLL_SECONDS",
     "EVENT_WORKER_MAX_QUEUE",
     "ENTRY_ROI",
     "ENTRY_ROI_PTS",
@@ -37,11 +37,14 @@ TRACK_HISTORY_MAX_LEN = 20      # 軌跡點最大數量
 # =========================
 RECORDER_FPS = 30
 RECORDER_SEGMENT_MINUTES = 3
+RECORDER_PRE_ROLL_SECONDS = 10      # 事件錄影：事件前保留秒數
+RECORDER_POST_ROLL_SECONDS = 20     # 事件錄影：最後一次事件後續錄秒數
 
 # =========================
 # 事件佇列
 # =========================
 EVENT_WORKER_MAX_QUEUE = 10
+NOTIFY_UPLOAD_TIMEOUT_SEC = 5       # 通知截圖上傳最多等幾秒（逾時就先送文字，截圖在背景繼續上傳）
 
 # =========================
 # ROI 區域
@@ -623,13 +623,13 @@ const recording = {
         // 優先使用 HLS（如果可用且瀏覽器支援）
         if (rec.hls_available && Hls.isSupported()) {
             const segmentName = rec.filename.replace(".mp4", "");
-            const hlsUrl = `${API_BASE}/recordings/${this.currentCameraId}/${dateStr}/${segmentName}/playlist.m3u8?token=${encodeURIComponent(token)}`;
+            const hlsUrl = `${API_BASE}/recordings/${this.currentCameraId}/${dateStr}/${segmentName}/master.m3u8?token=${encodeURIComponent(token)}`;
 
             this.hls = new Hls({
                 // 優化載入速度
                 maxBufferLength: 10,        // 最多緩衝 10 秒
                 maxMaxBufferLength: 30,     // 最大緩衝 30 秒
-                startLevel: 0,              // 立即從第一個品質開始
+                startLevel: -1,             // 由 MANIFEST_PARSED 指定起始畫質
                 maxLoadingDelay: 4,         // 最大載入延遲 4 秒
                 lowLatencyMode: true,       // 低延遲模式
                 xhrSetup: (xhr, url) => {
@@ -660,8 +660,10 @@ const recording = {
 
             this.hls.loadSource(hlsUrl);
             this.hls.attachMedia(this.els.video);
-            this.hls.on(Hls.Events.MANIFEST_PARSED, () => {
+            this.hls.on(Hls.Events.MANIFEST_PARSED, (event, data) => {
                 console.log("HLS manifest 載入成功");
+                // 從原生畫質開始（不需轉檔），網路慢時再由 ABR 降級觸發低畫質轉檔
+                this.hls.startLevel = data.levels.length - 1;
                 if (autoPlay) {
                     this.els.video.play().catch(e => console.log("Auto-play blocked:", e));
                 }
@@ -771,7 +773,15 @@ const recording = {
         let targetIndex = -1;
         let seekTime = 0;
 
-        for (let i = 0; i < this.recordings.length; i++) {
+        // 伺服器已記錄事件所在分段與秒數 → 直接跳轉
+        if (evt.segment_file) {
+            targetIndex = this.recordings.findIndex(rec => rec.filename === evt.segment_file);
+            if (targetIndex >= 0) {
+                seekTime = evt.offset_sec || 0;
+            }
+        }
+
+        for (let i = 0; targetIndex === -1 && i < this.recordings.length; i++) {
             const rec = this.recordings[i];
             const recStart = new Date(rec.start_time);
             const recEnd = new Date(recStart.getTime() + rec.duration_seconds * 1000);